@@ -0,0 +1,65 @@
+"""Import-time regression check: each import below runs in a fresh
+interpreter, which reports how long it took and which heavy modules
+it loaded. Exits with status 1 if any import loads a module it
+shouldn't (or, with a budget, takes longer than it).
+
+Usage: python benchmarks/import_time.py [budget_ms]
+"""
+import json
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ('numpy', 'osgeo', 'osgeo.gdal_array', 'PIL', 'shapely')
+
+# (statement, heavy modules it's allowed to load)
+CHECKS = (
+    ('import powerlibs.gdal.utils.gdal2tiles', ()),
+    ('from powerlibs.gdal.utils.gdal2tiles.global_mercator import GlobalMercator', ()),
+    ('from powerlibs.gdal.utils.gdal2tiles.global_geodetic import GlobalGeodetic', ()),
+    ('from powerlibs.gdal.utils.raster import RasterFile', ('osgeo',)),
+    ('from powerlibs.gdal.utils.gdal2tiles import Mercator', ('numpy', 'osgeo')),
+)
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "loaded": [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+def probe(statement):
+    code = PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(budget_ms=None):
+    failures = 0
+    for statement, allowed in CHECKS:
+        result = probe(statement)
+        unexpected = [name for name in result['loaded'] if name not in allowed]
+        too_slow = budget_ms is not None and result['ms'] > float(budget_ms)
+
+        status = 'ok'
+        if unexpected:
+            status = f'LOADED {", ".join(unexpected)}'
+        elif too_slow:
+            status = 'TOO SLOW'
+        if status != 'ok':
+            failures += 1
+        print(f'{result["ms"]:8.1f} ms  {status:<24} {statement}')
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,85 @@
+"""Benchmark: overview tiles built from child tiles vs read directly
+from the input overviews (overview_query=True).
+
+Both modes run with the same number of worker threads, for each of the
+comma-separated `workers` counts, so only the way overviews are built
+differs. Reports the wall time of each mode and count and, for each
+overview zoom level, the mean absolute difference and PSNR between both
+outputs (of the first count).
+
+Usage: python benchmarks/overview_query.py [work_dir] [size] [workers]
+"""
+import math
+import sys
+import tempfile
+import time
+from pathlib import PosixPath
+
+import numpy
+from osgeo import gdal
+from PIL import Image
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator
+
+from synthetic import create_synthetic_raster
+
+
+def run(source, output_dir, **kwargs):
+    tiler = Mercator(source, output_dir, **kwargs)
+    started = time.perf_counter()
+    tiler.process()
+    return tiler, time.perf_counter() - started
+
+
+def compare_level(dir_a, dir_b, tz):
+    differences = []
+    for path_a in (PosixPath(dir_a) / str(tz)).rglob('*.png'):
+        path_b = PosixPath(dir_b) / path_a.relative_to(dir_a)
+        if not path_b.exists():
+            continue
+        a = numpy.asarray(Image.open(str(path_a)).convert('RGBA'), numpy.float64)
+        b = numpy.asarray(Image.open(str(path_b)).convert('RGBA'), numpy.float64)
+        differences.append(numpy.abs(a - b))
+    if not differences:
+        return None, None
+    difference = numpy.stack(differences)
+    mse = (difference ** 2).mean()
+    psnr = float('inf') if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+    return difference.mean(), psnr
+
+
+def main(work_dir=None, size=8192, workers='1,4'):
+    work_dir = PosixPath(work_dir or tempfile.mkdtemp(prefix='g2t-bench-'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    source = work_dir / 'source.tif'
+    create_synthetic_raster(source, int(size), int(size))
+
+    # Internal overviews, so overview queries don't read the full resolution:
+    ds = gdal.Open(str(source), gdal.GA_Update)
+    ds.BuildOverviews('AVERAGE', [2, 4, 8, 16, 32, 64])
+    ds = None
+
+    worker_counts = [int(count) for count in str(workers).split(',')]
+    for count in worker_counts:
+        tiler, children_time = run(
+            source, work_dir / f'children-{count}', workers=count
+        )
+        _, query_time = run(
+            source, work_dir / f'overview-query-{count}',
+            overview_query=True, workers=count
+        )
+        print(
+            f'{count:>2} workers: child tiles {children_time:8.2f} s, '
+            f'overview query {query_time:8.2f} s'
+        )
+
+    children_dir = work_dir / f'children-{worker_counts[0]}'
+    query_dir = work_dir / f'overview-query-{worker_counts[0]}'
+    for tz in range(tiler.max_zoom - 1, tiler.min_zoom - 1, -1):
+        mean_difference, psnr = compare_level(children_dir, query_dir, tz)
+        if mean_difference is not None:
+            print(f'zoom {tz:>2}: mean abs difference {mean_difference:6.2f}  PSNR {psnr:6.2f} dB')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,254 @@
+"""Benchmark suite: every profile with every resampling method over a
+set of synthetic rasters (sizes, band counts, nodata/alpha layouts,
+block layouts, rotation and reference systems).
+
+Each case runs in a fresh process and records tiles/s, peak RSS, output
+bytes, the per-stage timings of the run report and a digest of the
+decoded tile pixels. Results can be saved as a baseline and later
+compared against it: slower cases (beyond --tolerance) and cases whose
+pixels changed are reported, and the exit status is 1 if there's any.
+
+With --reference-dir the tiles of each case are kept there (--save) or
+compared pixel by pixel against the ones kept there, so faster engines
+can be validated against the current output even when the digests
+differ (mean absolute difference and PSNR per case).
+
+Usage:
+    python benchmarks/suite.py [--quick] [--sizes 1024,4096]
+        [--profiles mercator,raster] [--resampling average,near]
+        [--work-dir DIR] [--output results.json] [--baseline baseline.json]
+        [--tolerance 0.1] [--reference-dir DIR [--save]]
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import math
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import PosixPath
+
+import numpy
+from osgeo import gdal
+from PIL import Image
+
+from powerlibs.gdal.utils.gdal2tiles.defines import RESAMPLING_METHODS
+
+from synthetic import create_synthetic_raster
+
+
+PROFILES = ('mercator', 'geodetic', 'raster', 'leaflet')
+
+SCENARIOS = {
+    'rgb-utm-tiled': {'bands': 3},
+    'rgb-utm-striped-nodata': {'bands': 3, 'nodata': 0, 'block_size': None},
+    'rgba-utm-alpha': {'bands': 3, 'alpha': True},
+    'rgb-utm-rotated': {'bands': 3, 'rotation': 30},
+    'gray-wgs84': {
+        'bands': 1, 'epsg': 4326,
+        'origin': (-47.9, -15.7), 'pixel_size': 0.0000005,
+    },
+    'float-dsm': {'bands': 1, 'data_type': gdal.GDT_Float32, 'nodata': -9999},
+}
+
+QUICK_SCENARIOS = ('rgb-utm-tiled', 'rgba-utm-alpha')
+
+
+def get_profile_class(name):
+    from powerlibs.gdal.utils.gdal2tiles import Geodetic, Mercator, Raster
+    from powerlibs.gdal.utils.gdal2tiles.raster import Leaflet
+    return {
+        'mercator': Mercator,
+        'geodetic': Geodetic,
+        'raster': Raster,
+        'leaflet': Leaflet,
+    }[name]
+
+
+def get_case_name(scenario, size, profile, resampling):
+    return f'{scenario}-{size}/{profile}/{resampling}'
+
+
+def get_pixels_digest(directory):
+    """Digest of the decoded pixels (not of the PNG bytes, which change
+    with the encoder) of every tile, in path order."""
+    digest = hashlib.sha1()
+    directory = PosixPath(directory)
+    for path in sorted(directory.rglob('*.png')):
+        digest.update(str(path.relative_to(directory)).encode())
+        digest.update(Image.open(str(path)).convert('RGBA').tobytes())
+    return digest.hexdigest()
+
+
+def compare_pixels(directory, reference_dir):
+    """Mean absolute difference, PSNR and missing/extra tile counts
+    between two tile directories."""
+    directory, reference_dir = PosixPath(directory), PosixPath(reference_dir)
+    paths = {path.relative_to(directory) for path in directory.rglob('*.png')}
+    reference_paths = {path.relative_to(reference_dir) for path in reference_dir.rglob('*.png')}
+
+    total, squares, count = 0.0, 0.0, 0
+    for relative_path in sorted(paths & reference_paths):
+        a = numpy.asarray(Image.open(str(directory / relative_path)).convert('RGBA'), numpy.float64)
+        b = numpy.asarray(Image.open(str(reference_dir / relative_path)).convert('RGBA'), numpy.float64)
+        difference = a - b
+        total += numpy.abs(difference).sum()
+        squares += (difference ** 2).sum()
+        count += difference.size
+
+    mse = squares / count if count else 0
+    return {
+        'mean_abs_difference': total / count if count else 0,
+        'psnr': None if mse == 0 else 10 * math.log10(255 ** 2 / mse),
+        'missing': len(reference_paths - paths),
+        'extra': len(paths - reference_paths),
+    }
+
+
+def run_case(source, output_dir, profile, resampling):
+    """Run a single case (inside its own worker process)."""
+    tiler = get_profile_class(profile)(
+        source, output_dir, resampling_method=resampling
+    )
+    started = time.perf_counter()
+    report = tiler.process()
+    seconds = time.perf_counter() - started
+
+    counters = report['counters']
+    return {
+        'seconds': seconds,
+        'tiles': counters.get('tiles', 0),
+        'tiles_per_second': counters.get('tiles', 0) / seconds if seconds else 0,
+        # (kilobytes, on Linux)
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'output_bytes': counters.get('bytes_written', 0),
+        'stages': {
+            stage: values['seconds']
+            for stage, values in report['stages'].items()
+        },
+        'min_zoom': report['min_zoom'],
+        'max_zoom': report['max_zoom'],
+        'pixels_digest': get_pixels_digest(output_dir),
+    }
+
+
+def run_suite(args, work_dir):
+    scenarios = QUICK_SCENARIOS if args.quick else tuple(SCENARIOS)
+    results = {}
+
+    for scenario in scenarios:
+        for size in args.sizes:
+            source = work_dir / f'{scenario}-{size}.tif'
+            if not source.exists():
+                create_synthetic_raster(source, size, size, **SCENARIOS[scenario])
+
+            for profile in args.profiles:
+                for resampling in args.resampling:
+                    name = get_case_name(scenario, size, profile, resampling)
+                    output_dir = work_dir / 'tiles' / name
+                    shutil.rmtree(str(output_dir), ignore_errors=True)
+
+                    # A new process per case, so peak RSS isn't cumulative:
+                    with ProcessPoolExecutor(max_workers=1) as executor:
+                        result = executor.submit(
+                            run_case, str(source), str(output_dir),
+                            profile, resampling
+                        ).result()
+
+                    if args.reference_dir:
+                        reference = PosixPath(args.reference_dir) / name
+                        if args.save:
+                            shutil.rmtree(str(reference), ignore_errors=True)
+                            shutil.copytree(str(output_dir), str(reference))
+                        elif reference.exists():
+                            result['reference'] = compare_pixels(output_dir, reference)
+
+                    results[name] = result
+                    print(
+                        f'{name:<55} {result["tiles"]:>7} tiles '
+                        f'{result["tiles_per_second"]:>9.1f} tiles/s '
+                        f'{result["peak_rss_kb"] / 1024:>8.1f} MB '
+                        f'{result["output_bytes"] / 1024:>10.1f} KB'
+                    )
+                    shutil.rmtree(str(output_dir), ignore_errors=True)
+
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Print the differences against a baseline and return
+    how many cases regressed or changed their output."""
+    problems = 0
+    for name, result in sorted(results.items()):
+        expected = baseline['results'].get(name)
+        if expected is None:
+            print(f'{name:<55} (not in the baseline)')
+            continue
+
+        ratio = result['tiles_per_second'] / (expected['tiles_per_second'] or 1)
+        notes = []
+        if ratio < 1 - tolerance:
+            notes.append('SLOWER')
+        if result['pixels_digest'] != expected['pixels_digest']:
+            notes.append('PIXELS CHANGED')
+        if notes:
+            problems += 1
+
+        rss_ratio = result['peak_rss_kb'] / (expected['peak_rss_kb'] or 1)
+        print(
+            f'{name:<55} speed x{ratio:5.2f}  rss x{rss_ratio:5.2f}  '
+            f'{" ".join(notes)}'
+        )
+    return problems
+
+
+def get_environment():
+    return {
+        'gdal': gdal.__version__,
+        'numpy': numpy.__version__,
+        'python': sys.version.split()[0],
+    }
+
+
+def parse_list(value, cast=str):
+    return tuple(cast(item) for item in value.split(',') if item)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--sizes', type=lambda v: parse_list(v, int), default=(1024, 4096))
+    parser.add_argument('--profiles', type=parse_list, default=PROFILES)
+    parser.add_argument('--resampling', type=parse_list, default=RESAMPLING_METHODS)
+    parser.add_argument('--work-dir', default=None)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--reference-dir', default=None)
+    parser.add_argument('--save', action='store_true')
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes = args.sizes[:1]
+
+    work_dir = PosixPath(args.work_dir or tempfile.mkdtemp(prefix='g2t-suite-'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    results = run_suite(args, work_dir)
+    document = {'environment': get_environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+
+    problems = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = compare_with_baseline(results, baseline, args.tolerance)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Synthetic GeoTIFFs for the benchmarks."""
+import math
+
+import numpy
+from osgeo import gdal, osr
+
+
+def get_creation_options(block_size=256, compress='DEFLATE'):
+    """GTiff options for a tiled (block_size x block_size) or,
+    with block_size=None, a striped layout."""
+    options = []
+    if block_size:
+        options += ['TILED=YES', f'BLOCKXSIZE={block_size}', f'BLOCKYSIZE={block_size}']
+    if compress:
+        options.append(f'COMPRESS={compress}')
+    return options
+
+
+def create_synthetic_raster(
+    path, width, height, bands=3, epsg=32723,
+    origin=(500000.0, 7500000.0), pixel_size=0.05,
+    data_type=gdal.GDT_Byte, nodata=None, seed=0,
+    creation_options=None, alpha=False, block_size=256, rotation=0
+):
+    """Write a georeferenced raster filled with smooth gradients plus
+    noise (so it compresses and resamples like real imagery).
+
+    With `nodata`, the top-left triangle of the raster is set to it; with
+    `alpha`, an extra alpha band makes everything outside an ellipse
+    transparent. The block layout comes from `block_size` unless explicit
+    `creation_options` are given. A `rotation` (in degrees) gives the
+    geotransform rotation terms, like a rotated drone mosaic."""
+    random = numpy.random.RandomState(seed)
+    if creation_options is None:
+        creation_options = get_creation_options(block_size)
+
+    driver = gdal.GetDriverByName('GTiff')
+    ds = driver.Create(
+        str(path), width, height, bands + (1 if alpha else 0), data_type,
+        options=list(creation_options)
+    )
+    cos = math.cos(math.radians(rotation)) * pixel_size
+    sin = math.sin(math.radians(rotation)) * pixel_size
+    ds.SetGeoTransform((origin[0], cos, -sin, origin[1], -sin, -cos))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    ds.SetProjection(srs.ExportToWkt())
+
+    rows = 512
+    for yoff in range(0, height, rows):
+        h = min(rows, height - yoff)
+        y, x = numpy.mgrid[yoff:yoff + h, 0:width]
+        for i in range(1, bands + 1):
+            values = (x * (i + 1) + y * (bands - i + 1)) % 256
+            values = values + random.randint(0, 16, values.shape)
+            if data_type == gdal.GDT_Byte:
+                values = numpy.clip(values, 0, 255).astype(numpy.uint8)
+            if nodata is not None:
+                values = numpy.where(x * height + y * width < width * height // 2, nodata, values)
+            ds.GetRasterBand(i).WriteArray(values, 0, yoff)
+
+        if alpha:
+            inside = (
+                ((x - width / 2) / (width / 2)) ** 2
+                + ((y - height / 2) / (height / 2)) ** 2
+            ) <= 1
+            ds.GetRasterBand(bands + 1).WriteArray(
+                numpy.where(inside, 255, 0).astype(numpy.uint8), 0, yoff
+            )
+
+    if nodata is not None:
+        for i in range(1, bands + 1):
+            ds.GetRasterBand(i).SetNoDataValue(nodata)
+    if alpha:
+        ds.GetRasterBand(bands + 1).SetRasterColorInterpretation(gdal.GCI_AlphaBand)
+
+    ds.FlushCache()
+    return path
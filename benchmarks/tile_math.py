@@ -0,0 +1,80 @@
+"""Micro-benchmark: scalar vs vectorized GlobalMercator/GlobalGeodetic math.
+
+Usage: python benchmarks/tile_math.py [zoom]
+"""
+import sys
+import timeit
+
+import numpy
+
+from powerlibs.gdal.utils.gdal2tiles.global_geodetic import GlobalGeodetic
+from powerlibs.gdal.utils.gdal2tiles.global_mercator import GlobalMercator
+
+
+def tile_grid(zoom, side):
+    origin = 2 ** zoom // 2
+    tx, ty = numpy.meshgrid(
+        numpy.arange(origin, origin + side), numpy.arange(origin, origin + side)
+    )
+    return tx.ravel(), ty.ravel()
+
+
+def compare(name, scalar, vectorized, repeat=3):
+    scalar_time = min(timeit.repeat(scalar, number=1, repeat=repeat))
+    vectorized_time = min(timeit.repeat(vectorized, number=1, repeat=repeat))
+    print(
+        f'{name:<28} scalar: {scalar_time * 1000:9.2f} ms  '
+        f'vectorized: {vectorized_time * 1000:9.2f} ms  '
+        f'speedup: {scalar_time / vectorized_time:7.1f}x'
+    )
+
+
+def main(zoom=18, side=300):
+    mercator = GlobalMercator()
+    geodetic = GlobalGeodetic()
+    tx, ty = tile_grid(zoom, side)
+    txs, tys = tx.tolist(), ty.tolist()
+    print(f'{len(txs)} tiles at zoom {zoom}')
+
+    # Sanity check: both versions must agree.
+    bounds = numpy.stack(mercator.tile_bounds_array(tx, ty, zoom), axis=1)
+    expected = numpy.array([mercator.TileBounds(x, y, zoom) for x, y in zip(txs, tys)])
+    assert numpy.allclose(bounds, expected)
+    keys = mercator.quad_tree_array(tx, ty, zoom)
+    assert keys.tolist() == [mercator.QuadTree(x, y, zoom) for x, y in zip(txs, tys)]
+
+    compare(
+        'GlobalMercator.TileBounds',
+        lambda: [mercator.TileBounds(x, y, zoom) for x, y in zip(txs, tys)],
+        lambda: mercator.tile_bounds_array(tx, ty, zoom),
+    )
+    compare(
+        'GlobalMercator.QuadTree',
+        lambda: [mercator.QuadTree(x, y, zoom) for x, y in zip(txs, tys)],
+        lambda: mercator.quad_tree_array(tx, ty, zoom),
+    )
+
+    minx, miny, maxx, maxy = (b.tolist() for b in mercator.tile_bounds_array(tx, ty, zoom))
+    compare(
+        'GlobalMercator.MetersToTile',
+        lambda: [mercator.MetersToTile(x, y, zoom) for x, y in zip(minx, miny)],
+        lambda: mercator.meters_to_tile_array(numpy.array(minx), numpy.array(miny), zoom),
+    )
+
+    lat, lon = mercator.meters_to_lat_lon_array(numpy.array(maxx), numpy.array(maxy))
+    lats, lons = lat.tolist(), lon.tolist()
+    compare(
+        'GlobalMercator.LatLonToMeters',
+        lambda: [mercator.LatLonToMeters(a, o) for a, o in zip(lats, lons)],
+        lambda: mercator.lat_lon_to_meters_array(lat, lon),
+    )
+
+    compare(
+        'GlobalGeodetic.TileBounds',
+        lambda: [geodetic.TileBounds(x, y, zoom) for x, y in zip(txs, tys)],
+        lambda: geodetic.tile_bounds_array(tx, ty, zoom),
+    )
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,50 @@
+"""Benchmark: tiling a reprojected raster with on-the-fly warping vs
+a materialized warped intermediate (materialize_warp=True).
+
+Usage: python benchmarks/warp_intermediate.py [work_dir]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import PosixPath
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator
+
+from synthetic import create_synthetic_raster
+
+
+SIZES = (
+    ('small', 2048),
+    ('large', 12288),
+)
+
+
+def count_tiles(directory):
+    return sum(1 for _ in PosixPath(directory).rglob('*.png'))
+
+
+def run(source, output_dir, **kwargs):
+    started = time.perf_counter()
+    Mercator(source, output_dir, **kwargs).process()
+    return time.perf_counter() - started, count_tiles(output_dir)
+
+
+def main(work_dir=None):
+    work_dir = PosixPath(work_dir or tempfile.mkdtemp(prefix='g2t-bench-'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, size in SIZES:
+        source = create_synthetic_raster(work_dir / f'{name}.tif', size, size)
+        for materialize in (False, True):
+            output_dir = work_dir / f'{name}-{materialize}'
+            elapsed, tiles = run(source, output_dir, materialize_warp=materialize)
+            print(
+                f'{name:<6} {size:>6}px  materialize_warp={materialize!s:<5}  '
+                f'{elapsed:8.2f} s  {tiles / elapsed:8.1f} tiles/s'
+            )
+            shutil.rmtree(str(output_dir))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
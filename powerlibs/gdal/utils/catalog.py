@@ -0,0 +1,294 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import os
+from pathlib import PosixPath
+import sqlite3
+
+from osgeo import osr
+from shapely import wkt
+from shapely.geometry import box
+from shapely.strtree import STRtree
+
+from .raster import RasterFile
+
+
+logger = logging.getLogger(__name__)
+
+RASTER_PATTERNS = ('*.tif', '*.tiff', '*.vrt', '*.jp2')
+
+COLUMNS = (
+    ('path', 'TEXT PRIMARY KEY'),
+    ('mtime_ns', 'INTEGER'),
+    ('size', 'INTEGER'),
+    ('epsg', 'INTEGER'),
+    ('gsd', 'REAL'),
+    ('width', 'INTEGER'),
+    ('height', 'INTEGER'),
+    ('center_x', 'REAL'),
+    ('center_y', 'REAL'),
+    ('lower_altitude', 'REAL'),
+    ('higher_altitude', 'REAL'),
+    ('mean_altitude', 'REAL'),
+    ('altitude_std_deviation', 'REAL'),
+    ('no_data_value', 'REAL'),
+    ('footprint', 'TEXT'),
+    ('error', 'TEXT'),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+
+
+def get_footprint(raster):
+    """Bounding box, in EPSG:4326 (longitude, latitude), of the four
+    corners of a `RasterFile`."""
+    source_reference_system = osr.SpatialReference()
+    source_reference_system.ImportFromWkt(raster.wkt)
+    target_reference_system = osr.SpatialReference()
+    target_reference_system.ImportFromEPSG(4326)
+
+    # GDAL 3 follows the authority's axis order (latitude first for 4326):
+    if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+        for reference_system in (source_reference_system, target_reference_system):
+            reference_system.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    transformation = osr.CoordinateTransformation(
+        source_reference_system, target_reference_system
+    )
+    ulx, xres, xskew, uly, yskew, yres = raster.geotransform
+    corners = [
+        (ulx + px * xres + py * xskew, uly + px * yskew + py * yres)
+        for px, py in ((0, 0), (raster.width, 0), (raster.width, raster.height), (0, raster.height))
+    ]
+    points = [transformation.TransformPoint(x, y)[:2] for x, y in corners]
+    xs, ys = zip(*points)
+    return box(min(xs), min(ys), max(xs), max(ys))
+
+
+def extract_metadata(path):
+    """Read the `RasterFile` metadata of a file as a catalog row.
+
+    Runs inside the worker processes, so it must stay a module-level
+    function returning only picklable values."""
+    stat = os.stat(path)
+    raster = RasterFile(path)
+    footprint = get_footprint(raster)
+    return {
+        'path': path,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'epsg': raster.epsg,
+        'gsd': raster.gsd,
+        'width': raster.width,
+        'height': raster.height,
+        'center_x': raster.center_coordinates[0],
+        'center_y': raster.center_coordinates[1],
+        'lower_altitude': raster.lower_altitude,
+        'higher_altitude': raster.higher_altitude,
+        'mean_altitude': raster.mean_altitude,
+        'altitude_std_deviation': raster.altitude_std_deviation,
+        'no_data_value': raster.no_data_value,
+        'footprint': footprint.wkt,
+        'error': None,
+    }
+
+
+def safe_extract_metadata(path):
+    try:
+        return path, extract_metadata(path), None
+    except Exception as ex:
+        return path, None, str(ex)
+
+
+def find_rasters(root, patterns=RASTER_PATTERNS):
+    root = PosixPath(root)
+    found = set()
+    for pattern in patterns:
+        found.update(str(path.resolve()) for path in root.rglob(pattern))
+    return sorted(found)
+
+
+class RasterCatalog:
+    """SQLite index of raster metadata with a spatial lookup
+    over the footprints (in EPSG:4326).
+
+    Files that couldn't be read are kept too, with only their signature
+    and the `error`, so they're not read again until they change."""
+
+    def __init__(self, database_path):
+        self.database_path = str(database_path)
+        self.connection = sqlite3.connect(self.database_path)
+        self.connection.row_factory = sqlite3.Row
+        columns = ', '.join(f'{name} {kind}' for name, kind in COLUMNS)
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS rasters ({columns})'
+        )
+
+        # (catalogs created before some column existed)
+        existing = {
+            row['name'] for row in self.connection.execute('PRAGMA table_info(rasters)')
+        }
+        for name, kind in COLUMNS:
+            if name not in existing:
+                self.connection.execute(f'ALTER TABLE rasters ADD COLUMN {name} {kind}')
+        self.connection.commit()
+
+        self._tree = None
+        self._tree_paths = None
+        self._tree_footprints = None
+
+    def close(self):
+        self.connection.close()
+
+    # -------------------------------------------------------------------------
+    def get_signatures(self):
+        cursor = self.connection.execute(
+            'SELECT path, mtime_ns, size FROM rasters'
+        )
+        return {row['path']: (row['mtime_ns'], row['size']) for row in cursor}
+
+    def scan(self, root, patterns=RASTER_PATTERNS, workers=None, prune=True):
+        """Index every raster under `root`, skipping the files whose
+        mtime and size didn't change since the last scan (including the
+        ones that failed then).
+
+        Returns a dict with the `indexed`, `skipped`, `removed` and
+        `failed` (path -> error message) files."""
+
+        known = self.get_signatures()
+        paths = find_rasters(root, patterns)
+
+        pending = []
+        skipped = []
+        signatures = {}
+        for path in paths:
+            stat = os.stat(path)
+            signatures[path] = (stat.st_mtime_ns, stat.st_size)
+            if known.get(path) == signatures[path]:
+                skipped.append(path)
+            else:
+                pending.append(path)
+
+        indexed = []
+        failed = {}
+        placeholders = ', '.join('?' for _ in COLUMN_NAMES)
+        insert = (
+            f'INSERT OR REPLACE INTO rasters ({", ".join(COLUMN_NAMES)}) '
+            f'VALUES ({placeholders})'
+        )
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(safe_extract_metadata, pending, chunksize=4)
+            for path, row, error in results:
+                if error is not None:
+                    logger.warning(f'Could not index {path}: {error}')
+                    failed[path] = error
+                    mtime_ns, size = signatures[path]
+                    row = {'path': path, 'mtime_ns': mtime_ns, 'size': size, 'error': error}
+                    self.connection.execute(
+                        insert, tuple(row.get(name) for name in COLUMN_NAMES)
+                    )
+                    continue
+                self.connection.execute(
+                    insert, tuple(row[name] for name in COLUMN_NAMES)
+                )
+                indexed.append(path)
+
+        removed = []
+        if prune:
+            root_prefix = str(PosixPath(root).resolve()) + os.sep
+            existing = set(paths)
+            for path in known:
+                if path.startswith(root_prefix) and path not in existing:
+                    removed.append(path)
+            self.connection.executemany(
+                'DELETE FROM rasters WHERE path = ?',
+                ((path,) for path in removed)
+            )
+
+        self.connection.commit()
+        if indexed or removed or failed:
+            self._tree = None
+
+        return {
+            'indexed': indexed,
+            'skipped': skipped,
+            'removed': removed,
+            'failed': failed,
+        }
+
+    # -------------------------------------------------------------------------
+    def get(self, path):
+        cursor = self.connection.execute(
+            'SELECT * FROM rasters WHERE path = ?', (str(path),)
+        )
+        row = cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    def __iter__(self):
+        cursor = self.connection.execute(
+            'SELECT * FROM rasters WHERE error IS NULL ORDER BY path'
+        )
+        for row in cursor:
+            yield dict(row)
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM rasters WHERE error IS NULL'
+        ).fetchone()[0]
+
+    def get_failures(self):
+        """Path -> error message of the files that couldn't be indexed."""
+        cursor = self.connection.execute(
+            'SELECT path, error FROM rasters WHERE error IS NOT NULL ORDER BY path'
+        )
+        return {row['path']: row['error'] for row in cursor}
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            cursor = self.connection.execute(
+                'SELECT path, footprint FROM rasters '
+                'WHERE error IS NULL ORDER BY path'
+            )
+            rows = cursor.fetchall()
+            self._tree_paths = [row['path'] for row in rows]
+            self._tree_footprints = [wkt.loads(row['footprint']) for row in rows]
+            self._tree = STRtree(self._tree_footprints)
+        return self._tree
+
+    def covering(self, geometry):
+        """Paths of the rasters whose footprint intersects `geometry`
+        (a shapely Point, Polygon, etc, in EPSG:4326)."""
+        tree = self.tree
+        indexes = tree.query(geometry, predicate='intersects')
+        return [self._tree_paths[i] for i in sorted(indexes)]
+
+
+def index_directory(root, database_path, workers=None, patterns=RASTER_PATTERNS):
+    """Scan `root` into the catalog at `database_path`."""
+    catalog = RasterCatalog(database_path)
+    result = catalog.scan(root, patterns=patterns, workers=workers)
+    return catalog, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Index the metadata of every raster inside a directory.'
+    )
+    parser.add_argument('root')
+    parser.add_argument('database')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    catalog, result = index_directory(args.root, args.database, args.workers)
+    catalog.close()
+    print(
+        f'indexed: {len(result["indexed"])}, '
+        f'skipped: {len(result["skipped"])}, '
+        f'removed: {len(result["removed"])}, '
+        f'failed: {len(result["failed"])}'
+    )
+
+
+if __name__ == '__main__':
+    main()
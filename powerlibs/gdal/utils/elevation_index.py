@@ -0,0 +1,360 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import threading
+
+import numpy
+from osgeo import gdal
+
+
+INDEX_SUFFIX = '.mmidx.npz'
+INDEX_VERSION = 1
+
+# How many blocks (horizontally) each build task reads at once:
+BLOCKS_PER_TASK = 16
+
+
+class RegionStatistics(namedtuple('RegionStatistics', 'minimum maximum sum count')):
+    """Statistics of the valid pixels inside a region."""
+
+    __slots__ = ()
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+
+def get_index_path(source_path):
+    return str(source_path) + INDEX_SUFFIX
+
+
+def get_source_signature(source_path):
+    stat = os.stat(str(source_path))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_valid(data, nodata):
+    """The window as float64, with the mask of its valid pixels."""
+    data = data.astype(numpy.float64)
+    valid = numpy.isfinite(data)
+    if nodata is not None:
+        valid &= data != nodata
+    return data, valid
+
+
+def window_statistics(data, nodata):
+    """Reduce a whole window of a band into min/max/sum/count scalars,
+    without padding it to blocks (e.g. a thin strip of a wide query)."""
+    data, valid = get_valid(data, nodata)
+    return (
+        numpy.where(valid, data, numpy.inf).min(),
+        numpy.where(valid, data, -numpy.inf).max(),
+        data[valid].sum(),
+        int(valid.sum()),
+    )
+
+
+def block_statistics(data, block_size, nodata):
+    """Reduce a window of a band into per-block min/max/sum/count arrays.
+
+    The window is padded up to a multiple of `block_size` with NaN, so
+    partial blocks at the raster borders only count their real pixels."""
+
+    data, valid = get_valid(data, nodata)
+
+    height, width = data.shape
+    nby = int(math.ceil(height / block_size))
+    nbx = int(math.ceil(width / block_size))
+    shape = (nby * block_size, nbx * block_size)
+
+    padded = numpy.zeros(shape, numpy.float64)
+    padded_valid = numpy.zeros(shape, bool)
+    padded[:height, :width] = data
+    padded_valid[:height, :width] = valid
+
+    padded = padded.reshape(nby, block_size, nbx, block_size)
+    padded_valid = padded_valid.reshape(nby, block_size, nbx, block_size)
+
+    minimum = numpy.where(padded_valid, padded, numpy.inf).min(axis=(1, 3))
+    maximum = numpy.where(padded_valid, padded, -numpy.inf).max(axis=(1, 3))
+    total = numpy.where(padded_valid, padded, 0).sum(axis=(1, 3))
+    count = padded_valid.sum(axis=(1, 3)).astype(numpy.int64)
+    return minimum, maximum, total, count
+
+
+def merge_level(level):
+    """Merge 2x2 cells of a pyramid level into the next (coarser) one."""
+    minimum, maximum, total, count = level
+    height, width = minimum.shape
+    pad = ((0, height % 2), (0, width % 2))
+
+    def reduce(array, neutral, function):
+        array = numpy.pad(array, pad, 'constant', constant_values=neutral)
+        h, w = array.shape
+        return function(array.reshape(h // 2, 2, w // 2, 2), axis=(1, 3))
+
+    return (
+        reduce(minimum, numpy.inf, numpy.min),
+        reduce(maximum, -numpy.inf, numpy.max),
+        reduce(total, 0, numpy.sum),
+        reduce(count, 0, numpy.sum),
+    )
+
+
+class ElevationIndex:
+    """Multi-resolution min/max/sum/count pyramid over a raster band.
+
+    Level 0 holds the statistics of each `block_size` x `block_size` block
+    of the band and every following level merges 2x2 cells of the previous
+    one, up to a single cell covering the whole raster. Region queries
+    collect the biggest cells fully inside the region and only read the
+    partially covered border blocks at full resolution."""
+
+    def __init__(
+        self, source_path, band_index, block_size,
+        width, height, nodata, signature, levels
+    ):
+        self.source_path = str(source_path)
+        self.band_index = band_index
+        self.block_size = block_size
+        self.width = width
+        self.height = height
+        self.nodata = nodata
+        self.signature = signature
+        self.levels = levels
+
+        self._band = None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def open(cls, source_path, band_index=1, block_size=256, workers=None):
+        """Load the sidecar index of `source_path`, (re)building and
+        saving it if it's missing or stale."""
+
+        index_path = get_index_path(source_path)
+        if os.path.exists(index_path):
+            index = cls.load(index_path)
+            if (
+                not index.is_stale()
+                and index.band_index == band_index
+                and index.block_size == block_size
+            ):
+                return index
+
+        index = cls.build(source_path, band_index, block_size, workers)
+        index.save(index_path)
+        return index
+
+    @classmethod
+    def build(cls, source_path, band_index=1, block_size=256, workers=None):
+        source_path = str(source_path)
+        signature = get_source_signature(source_path)
+
+        ds = gdal.Open(source_path, gdal.GA_ReadOnly)
+        band = ds.GetRasterBand(band_index)
+        width, height = ds.RasterXSize, ds.RasterYSize
+        nodata = band.GetNoDataValue()
+
+        nbx = int(math.ceil(width / block_size))
+        nby = int(math.ceil(height / block_size))
+        task_width = BLOCKS_PER_TASK * block_size
+
+        # Each worker thread reads through its own dataset handle:
+        local = threading.local()
+
+        def read_blocks(task):
+            by, bx = task
+            if not hasattr(local, 'band'):
+                local.ds = gdal.Open(source_path, gdal.GA_ReadOnly)
+                local.band = local.ds.GetRasterBand(band_index)
+
+            xoff, yoff = bx * block_size, by * block_size
+            xsize = min(task_width, width - xoff)
+            ysize = min(block_size, height - yoff)
+            data = local.band.ReadAsArray(xoff, yoff, xsize, ysize)
+            return task, block_statistics(data, block_size, nodata)
+
+        base = (
+            numpy.full((nby, nbx), numpy.inf),
+            numpy.full((nby, nbx), -numpy.inf),
+            numpy.zeros((nby, nbx), numpy.float64),
+            numpy.zeros((nby, nbx), numpy.int64),
+        )
+
+        tasks = [
+            (by, bx)
+            for by in range(nby)
+            for bx in range(0, nbx, BLOCKS_PER_TASK)
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for (by, bx), stats in executor.map(read_blocks, tasks):
+                for target, values in zip(base, stats):
+                    target[by, bx:bx + values.shape[1]] = values[0]
+
+        levels = [base]
+        while levels[-1][0].shape != (1, 1):
+            levels.append(merge_level(levels[-1]))
+
+        return cls(
+            source_path, band_index, block_size,
+            width, height, nodata, signature, levels
+        )
+
+    @classmethod
+    def load(cls, index_path):
+        with numpy.load(str(index_path)) as data:
+            meta = data['meta']
+            version, band_index, block_size, width, height, mtime, size = (
+                int(value) for value in meta
+            )
+            if version != INDEX_VERSION:
+                raise Exception(
+                    f'Unsupported elevation index version {version} '
+                    f'in "{index_path}".'
+                )
+            nodata = data['nodata']
+            nodata = None if numpy.isnan(nodata) else float(nodata)
+
+            levels = []
+            for i in range(int(data['levels_count'])):
+                levels.append(tuple(
+                    data[f'level_{i}_{name}']
+                    for name in ('min', 'max', 'sum', 'count')
+                ))
+
+        source_path = str(index_path)[:-len(INDEX_SUFFIX)]
+        return cls(
+            source_path, band_index, block_size,
+            width, height, nodata, (mtime, size), levels
+        )
+
+    def save(self, index_path=None):
+        index_path = index_path or get_index_path(self.source_path)
+        arrays = {
+            'meta': numpy.array((
+                INDEX_VERSION, self.band_index, self.block_size,
+                self.width, self.height,
+                self.signature[0], self.signature[1]
+            ), numpy.int64),
+            'nodata': numpy.float64(
+                numpy.nan if self.nodata is None else self.nodata
+            ),
+            'levels_count': numpy.int64(len(self.levels)),
+        }
+        for i, level in enumerate(self.levels):
+            for name, array in zip(('min', 'max', 'sum', 'count'), level):
+                arrays[f'level_{i}_{name}'] = array
+
+        # Write to a temporary file first so readers never see a partial index:
+        temporary_path = f'{index_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'wb') as f:
+            numpy.savez_compressed(f, **arrays)
+        os.replace(temporary_path, index_path)
+
+    def is_stale(self):
+        try:
+            return get_source_signature(self.source_path) != self.signature
+        except FileNotFoundError:
+            return True
+
+    # -------------------------------------------------------------------------
+    @property
+    def band(self):
+        if self._band is None:
+            self._ds = gdal.Open(self.source_path, gdal.GA_ReadOnly)
+            self._band = self._ds.GetRasterBand(self.band_index)
+        return self._band
+
+    def query(self, xoff, yoff, xsize, ysize):
+        """Return the `RegionStatistics` of the given pixel window."""
+
+        x0, y0 = max(0, xoff), max(0, yoff)
+        x1 = min(self.width, xoff + xsize)
+        y1 = min(self.height, yoff + ysize)
+
+        accumulator = [numpy.inf, -numpy.inf, 0.0, 0]
+        if x1 <= x0 or y1 <= y0:
+            return RegionStatistics(None, None, 0.0, 0)
+
+        # Range of blocks fully covered by the window:
+        bs = self.block_size
+        bx0 = -(-x0 // bs)
+        by0 = -(-y0 // bs)
+        bx1 = x1 // bs if x1 < self.width else len(self.levels[0][0][0])
+        by1 = y1 // bs if y1 < self.height else len(self.levels[0][0])
+
+        if bx0 >= bx1 or by0 >= by1:
+            self._accumulate_pixels(accumulator, x0, y0, x1, y1)
+        else:
+            top_level = len(self.levels) - 1
+            self._accumulate_cells(
+                accumulator, top_level, 0, 0, bx0, by0, bx1, by1
+            )
+
+            # Covered blocks end at raster borders, not at multiples of bs:
+            fx0, fy0 = bx0 * bs, by0 * bs
+            fx1, fy1 = min(bx1 * bs, self.width), min(by1 * bs, self.height)
+
+            # Border strips: top, bottom, left and right
+            self._accumulate_pixels(accumulator, x0, y0, x1, fy0)
+            self._accumulate_pixels(accumulator, x0, fy1, x1, y1)
+            self._accumulate_pixels(accumulator, x0, fy0, fx0, fy1)
+            self._accumulate_pixels(accumulator, fx1, fy0, x1, fy1)
+
+        minimum, maximum, total, count = accumulator
+        if not count:
+            return RegionStatistics(None, None, 0.0, 0)
+        return RegionStatistics(float(minimum), float(maximum), float(total), int(count))
+
+    def query_bounds(self, geotransform, minx, miny, maxx, maxy):
+        """Same as `query`, but with the window given in the
+        raster's native coordinates."""
+        ulx, xres, _, uly, _, yres = geotransform
+        px = sorted(((minx - ulx) / xres, (maxx - ulx) / xres))
+        py = sorted(((miny - uly) / yres, (maxy - uly) / yres))
+        xoff, yoff = int(math.floor(px[0])), int(math.floor(py[0]))
+        xend, yend = int(math.ceil(px[1])), int(math.ceil(py[1]))
+        return self.query(xoff, yoff, xend - xoff, yend - yoff)
+
+    def _accumulate_cells(self, accumulator, level, i, j, bx0, by0, bx1, by1):
+        """Walk the pyramid from the top, collecting the cells fully
+        contained in the [bx0, bx1) x [by0, by1) range of base blocks."""
+        span = 1 << level
+        cx0, cy0 = i * span, j * span
+        cx1, cy1 = cx0 + span, cy0 + span
+
+        if cx1 <= bx0 or cx0 >= bx1 or cy1 <= by0 or cy0 >= by1:
+            return
+
+        minimum, maximum, total, count = self.levels[level]
+        if j >= minimum.shape[0] or i >= minimum.shape[1]:
+            return
+
+        # (Base blocks are either fully inside the range or outside of it)
+        inside = bx0 <= cx0 and cx1 <= bx1 and by0 <= cy0 and cy1 <= by1
+        if inside or level == 0:
+            accumulator[0] = min(accumulator[0], minimum[j, i])
+            accumulator[1] = max(accumulator[1], maximum[j, i])
+            accumulator[2] += total[j, i]
+            accumulator[3] += count[j, i]
+            return
+
+        for cj in (2 * j, 2 * j + 1):
+            for ci in (2 * i, 2 * i + 1):
+                self._accumulate_cells(
+                    accumulator, level - 1, ci, cj, bx0, by0, bx1, by1
+                )
+
+    def _accumulate_pixels(self, accumulator, x0, y0, x1, y1):
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        data = self.band.ReadAsArray(x0, y0, x1 - x0, y1 - y0)
+        minimum, maximum, total, count = window_statistics(data, self.nodata)
+        accumulator[0] = min(accumulator[0], minimum)
+        accumulator[1] = max(accumulator[1], maximum)
+        accumulator[2] += total
+        accumulator[3] += count
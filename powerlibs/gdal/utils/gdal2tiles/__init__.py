@@ -1,2 +1,29 @@
-from .non_raster import Geodetic, Mercator  # NOQA: F401
-from .raster import Raster  # NOQA: F401
+import importlib
+import sys
+import types
+
+
+# The profiles (and GDAL, numpy, etc) are only imported when first used,
+# so `gdal2tiles.global_mercator` and friends stay cheap to import:
+PROFILE_MODULES = {
+    'Geodetic': '.non_raster',
+    'Mercator': '.non_raster',
+    'Raster': '.raster',
+}
+
+
+class LazyProfilesModule(types.ModuleType):
+    """This package, importing its profiles on first access (Python 3.6
+    has no module-level __getattr__, so it's done by the module class)."""
+
+    def __getattr__(self, name):
+        if name in PROFILE_MODULES:
+            module = importlib.import_module(PROFILE_MODULES[name], __name__)
+            return getattr(module, name)
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    def __dir__(self):
+        return sorted(list(self.__dict__) + list(PROFILE_MODULES))
+
+
+sys.modules[__name__].__class__ = LazyProfilesModule
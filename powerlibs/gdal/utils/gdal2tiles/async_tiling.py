@@ -0,0 +1,214 @@
+import asyncio
+from collections import namedtuple
+import concurrent.futures
+import threading
+import time
+
+from .exceptions import TilingCancelled
+from .image_output import get_tile_filename
+
+
+class TilingProgress(namedtuple('TilingProgress', 'tz tx ty done total')):
+    """Progress event, sent after each tile reaches the sink."""
+
+    __slots__ = ()
+
+
+def count_tiles(tiler, tz):
+    tminx, tminy, tmaxx, tmaxy = tiler.tminmax[tz]
+    return (tmaxx - tminx + 1) * (tmaxy - tminy + 1)
+
+
+def choose_split_zoom(tiler, concurrency):
+    """Lowest zoom level with enough tiles to keep all workers busy:
+    each of its tiles becomes the root of an independent subtree."""
+    for tz in range(tiler.min_zoom, tiler.max_zoom + 1):
+        if count_tiles(tiler, tz) >= 4 * concurrency:
+            return tz
+    return tiler.max_zoom
+
+
+def iter_level(tiler, tz):
+    tminx, tminy, tmaxx, tmaxy = tiler.tminmax[tz]
+    for tx in range(tminx, tmaxx + 1):
+        for ty in range(tminy, tmaxy + 1):
+            yield tx, ty
+
+
+def make_file_sink(tiler):
+    """Sink writing the tiles into the tiler's output directory,
+    in the default executor, so writes overlap with rendering."""
+    if tiler.output_dir is None:
+        raise Exception("An output directory is needed to write the tiles.")
+    # (called from process_async, so it's the running loop)
+    loop = asyncio.get_event_loop()
+
+    def write(tz, tx, ty, data):
+        path = tiler.output_dir / get_tile_filename(tx, ty, tz, 'png')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(path), 'wb') as f:
+            f.write(data)
+
+    async def sink(tz, tx, ty, data):
+        await loop.run_in_executor(None, write, tz, tx, ty, data)
+
+    return sink
+
+
+async def process_async(tiler, concurrency=4, sink=None, on_progress=None, queue_size=64):
+    """Render the whole pyramid of `tiler` without blocking the event loop.
+
+    GDAL reads, resampling and encoding run on `concurrency` threads, each
+    one walking independent subtrees of the pyramid (see `iter_subtree`)
+    with its own dataset handle. Tiles are handed to the event loop through
+    a bounded queue and passed to `sink(tz, tx, ty, data)`, a coroutine
+    function (by default, one writing into the output directory).
+    `on_progress(TilingProgress)` may be a plain or a coroutine function.
+
+    Cancelling the task stops the rendering threads after their
+    current tile. Like `GDAL2Tiles.process`, returns the performance
+    report of the run (see `GDAL2Tiles.get_report`)."""
+
+    # (the running loop, as this is a coroutine; get_running_loop() is
+    # only available from Python 3.7 on)
+    loop = asyncio.get_event_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+    queue = asyncio.Queue(maxsize=queue_size)
+    cancelled = threading.Event()
+    local = threading.local()
+    futures = []
+    all_rendered = None
+
+    # MEM datasets of the subtree roots, until their parent is composed:
+    known = {}
+
+    def is_full():
+        # (the memory budget lowers the queue size when degrading)
+        budget = tiler.memory_budget
+        return budget is not None and queue.qsize() >= budget.queue_size
+
+    def put(item):
+        while not cancelled.is_set():
+            if is_full():
+                time.sleep(0.01)
+                continue
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            try:
+                future.result(timeout=0.5)
+                return
+            except concurrent.futures.TimeoutError:
+                if not future.cancel():
+                    return
+        raise TilingCancelled()
+
+    def get_image_output():
+        if not hasattr(local, 'image_output'):
+            local.image_output = tiler.create_image_output(
+                tiler.open_output_dataset()
+            )
+        return local.image_output
+
+    # (fewer threads render at once when the memory budget degrades;
+    # its throttle is the one planned by open_input)
+    throttle = None
+
+    def render_next(generator):
+        if throttle is None:
+            return next(generator)
+        with throttle:
+            return next(generator)
+
+    def render_subtree(tz, tx, ty):
+        generator = tiler.iter_subtree(tz, tx, ty, get_image_output())
+        try:
+            while True:
+                if cancelled.is_set():
+                    raise TilingCancelled()
+                put(render_next(generator))
+                tiler.check_memory()
+        except StopIteration as stop:
+            known[(tz, tx, ty)] = stop.value
+
+    def render_top():
+        tiles = []
+        for tx, ty in iter_level(tiler, tiler.min_zoom):
+            tiles.extend(tiler.iter_subtree(
+                tiler.min_zoom, tx, ty, tiler.image_output, known
+            ))
+        return tiles
+
+    done = 0
+
+    async def deliver(item):
+        nonlocal done
+        await sink(*item)
+        done += 1
+        tiler.metrics.count('tiles', 1, item[0])
+        tiler.metrics.count('bytes_encoded', len(item[3]), item[0])
+        if on_progress is not None:
+            result = on_progress(TilingProgress(*item[:3], done, total))
+            if asyncio.iscoroutine(result):
+                await result
+
+    tiler.metrics.reset()
+    started = time.perf_counter()
+    try:
+        await loop.run_in_executor(executor, tiler.open_input)
+        if tiler.memory_budget is not None:
+            throttle = tiler.memory_budget.throttle
+        if sink is None:
+            sink = make_file_sink(tiler)
+
+        total = sum(
+            count_tiles(tiler, tz)
+            for tz in range(tiler.min_zoom, tiler.max_zoom + 1)
+        )
+
+        split_zoom = choose_split_zoom(tiler, concurrency)
+        roots = list(iter_level(tiler, split_zoom))
+        futures = [
+            loop.run_in_executor(executor, render_subtree, split_zoom, tx, ty)
+            for tx, ty in roots
+        ]
+        all_rendered = asyncio.gather(*futures)
+
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            finished, _ = await asyncio.wait(
+                {getter, all_rendered},
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter in finished:
+                await deliver(getter.result())
+                continue
+
+            getter.cancel()
+            break
+
+        while not queue.empty():
+            await deliver(queue.get_nowait())
+
+        # (raise the errors of the rendering threads, if any)
+        all_rendered.result()
+
+        # Tiles above the split level are composed from the subtree roots
+        # (each one released from `known` once its parent is composed):
+        if split_zoom > tiler.min_zoom:
+            for item in await loop.run_in_executor(executor, render_top):
+                await deliver(item)
+        known.clear()
+
+    finally:
+        cancelled.set()
+        for future in futures:
+            future.cancel()
+        if all_rendered is not None:
+            # (retrieve its outcome, so asyncio doesn't warn about it)
+            all_rendered.add_done_callback(
+                lambda f: f.cancelled() or f.exception()
+            )
+        executor.shutdown(wait=False)
+        tiler.release_input()
+        tiler.metrics.add_time('process', time.perf_counter() - started)
+
+    return tiler.get_report()
@@ -0,0 +1,283 @@
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import heapq
+import json
+import logging
+import os
+from pathlib import PosixPath
+import shutil
+import sys
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Inputs bigger than this (in bytes) are split in shards, so their
+# tiles are spread over the pool instead of keeping one worker busy:
+DEFAULT_SHARD_SIZE = 256 * 1024 * 1024
+
+
+def get_profile_class(profile):
+    if not isinstance(profile, str):
+        return profile
+
+    from . import Geodetic, Mercator, Raster
+    from .raster import Leaflet
+    return {
+        'mercator': Mercator,
+        'geodetic': Geodetic,
+        'raster': Raster,
+        'leaflet': Leaflet,
+    }[profile]
+
+
+def get_size(source_path):
+    """Size, in bytes, of the given source (or list of sources)."""
+    if not isinstance(source_path, (list, tuple)):
+        source_path = [source_path]
+    size = 0
+    for path in source_path:
+        try:
+            size += os.path.getsize(str(path))
+        except OSError:
+            pass
+    return size
+
+
+class BatchJob:
+    """One tiling job of a batch: the arguments of a profile class
+    (a name like 'mercator', or the class itself)."""
+
+    def __init__(self, source_path, output_dir, profile='mercator', name=None, **kwargs):
+        self.source_path = source_path
+        self.output_dir = PosixPath(output_dir)
+        self.profile = profile
+        self.name = name or str(output_dir)
+        self.kwargs = kwargs
+        self.size = get_size(source_path)
+
+    def create_tiler(self, output_dir=None):
+        return get_profile_class(self.profile)(
+            self.source_path, output_dir or self.output_dir, **self.kwargs
+        )
+
+    def get_shard_dirs(self, shards):
+        return [self.output_dir / f'shard-{i}' for i in range(shards)]
+
+
+def init_worker(gdal_cache=None):
+    """Once per worker process: GDAL's setup (and the imports) are then
+    shared by every task the process runs."""
+    from osgeo import gdal
+
+    gdal.SetConfigOption("GDAL_PAM_ENABLED", "NO")
+    gdal.AllRegister()
+    if gdal_cache:
+        gdal.SetCacheMax(gdal_cache)
+    get_profile_class('mercator')
+
+
+def run_task(job, shard, shards):
+    """Run (inside a worker) one shard of a job, or the whole job if it
+    has only one, or its merge step if `shard` is None."""
+    started = time.perf_counter()
+    if shard is None:
+        shard_dirs = job.get_shard_dirs(shards)
+        tiler = job.create_tiler()
+        tiler.merge_shards(shard_dirs)
+        for shard_dir in shard_dirs:
+            shutil.rmtree(str(shard_dir))
+        report = tiler.get_report()
+    elif shards == 1:
+        report = job.create_tiler().process()
+    else:
+        shard_dir = job.get_shard_dirs(shards)[shard]
+        report = job.create_tiler(shard_dir).process(shard=shard, of=shards)
+
+    counters = report['counters']
+    return {
+        'seconds': time.perf_counter() - started,
+        'tiles': counters.get('tiles', 0),
+        'bytes_written': counters.get('bytes_written', 0),
+    }
+
+
+def describe_error(error):
+    return ' '.join(str(arg) for arg in error.args) or type(error).__name__
+
+
+class BatchRunner:
+    """Tile many jobs over one persistent pool of worker processes.
+
+    Bigger jobs (by input size) are scheduled first and split in shards
+    (see `sharding.ShardPlan`), so small jobs fill the cores the big ones
+    leave idle. A failing job doesn't stop the others: its remaining
+    tasks are dropped and the error goes into its summary. Tasks lost
+    with a crashed worker process are retried (`retries` times) on a new
+    pool."""
+
+    def __init__(self, workers=None, shard_size=DEFAULT_SHARD_SIZE, gdal_cache=None, retries=1):
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.gdal_cache = gdal_cache
+        self.retries = retries
+
+    def create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker, initargs=(self.gdal_cache,)
+        )
+
+    def get_shards(self, job):
+        if not self.shard_size:
+            return 1
+        return int(max(1, min(self.workers, job.size // self.shard_size)))
+
+    def run(self, jobs):
+        """Run every job, returning their summaries (in the same order)."""
+        summaries = [
+            {
+                'name': job.name,
+                'output_dir': str(job.output_dir),
+                'status': 'pending',
+                'shards': self.get_shards(job),
+                'remaining': self.get_shards(job),
+                'seconds': 0.0,
+                'task_seconds': 0.0,
+                'tiles': 0,
+                'bytes_written': 0,
+                'error': None,
+            }
+            for job in jobs
+        ]
+        started = {}
+
+        # (priority, task): bigger jobs first, their merge steps (shard
+        # None, sorted after the shards) as soon as the shards are done.
+        queue = []
+        for index, (job, summary) in enumerate(zip(jobs, summaries)):
+            for shard in range(summary['shards']):
+                heapq.heappush(queue, ((-job.size, index, shard), (index, shard, 0)))
+
+        def finish(index, status, error=None):
+            summary = summaries[index]
+            summary['status'] = status
+            summary['error'] = error
+            summary['seconds'] = time.perf_counter() - started.get(index, time.perf_counter())
+            summary.pop('remaining')
+            logger.info(f'{summary["name"]}: {status}{f" ({error})" if error else ""}')
+
+        executor = self.create_executor()
+        pending = {}
+        try:
+            while queue or pending:
+                while queue and len(pending) < self.workers:
+                    key, task = heapq.heappop(queue)
+                    index, shard, attempts = task
+                    if summaries[index]['status'] != 'pending':
+                        continue
+                    started.setdefault(index, time.perf_counter())
+                    future = executor.submit(
+                        run_task, jobs[index], shard, summaries[index]['shards']
+                    )
+                    pending[future] = (key, task)
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    key, (index, shard, attempts) = pending.pop(future)
+                    summary = summaries[index]
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        if attempts < self.retries:
+                            heapq.heappush(queue, (key, (index, shard, attempts + 1)))
+                        elif summary['status'] == 'pending':
+                            finish(index, 'failed', 'A worker process died.')
+                        continue
+                    except Exception as error:
+                        if summary['status'] == 'pending':
+                            finish(index, 'failed', describe_error(error))
+                        continue
+
+                    if summary['status'] != 'pending':
+                        continue
+                    summary['task_seconds'] += result['seconds']
+                    summary['tiles'] += result['tiles']
+                    summary['bytes_written'] += result['bytes_written']
+                    summary['remaining'] -= 1
+                    if summary['remaining']:
+                        continue
+                    if shard is not None and summary['shards'] > 1:
+                        summary['remaining'] = 1
+                        heapq.heappush(queue, ((-jobs[index].size, index, summary['shards']), (index, None, 0)))
+                    else:
+                        finish(index, 'done')
+
+                if broken:
+                    # Every other task of the dead pool is lost too:
+                    for key, (index, shard, attempts) in pending.values():
+                        heapq.heappush(queue, (key, (index, shard, attempts)))
+                    pending = {}
+                    executor.shutdown(wait=False)
+                    executor = self.create_executor()
+        finally:
+            executor.shutdown(wait=True)
+
+        return summaries
+
+
+def load_jobs(path):
+    """Read a JSON list of jobs: objects with 'source' and 'output_dir',
+    optionally 'profile' and 'name', plus any argument of the profile
+    class (e.g. {"source": "a.tif", "output_dir": "tiles/a",
+    "profile": "raster", "max_zoom": 20})."""
+    with open(path) as f:
+        items = json.load(f)
+
+    jobs = []
+    for item in items:
+        item = dict(item)
+        jobs.append(BatchJob(item.pop('source'), item.pop('output_dir'), **item))
+    return jobs
+
+
+def main():
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+
+    parser = argparse.ArgumentParser(
+        description='Tile a list of jobs (a JSON file) over one pool of processes.'
+    )
+    parser.add_argument('jobs')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--shard-size-mb', type=int, default=DEFAULT_SHARD_SIZE // (1024 * 1024))
+    parser.add_argument('--gdal-cache-mb', type=int, default=None)
+    parser.add_argument('--retries', type=int, default=1)
+    parser.add_argument('--summary', default=None)
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        workers=args.workers,
+        shard_size=args.shard_size_mb * 1024 * 1024,
+        gdal_cache=args.gdal_cache_mb and args.gdal_cache_mb * 1024 * 1024,
+        retries=args.retries,
+    )
+    summaries = runner.run(load_jobs(args.jobs))
+
+    for summary in summaries:
+        print(
+            f'{summary["name"]:<40} {summary["status"]:<7} '
+            f'{summary["tiles"]:>8} tiles {summary["seconds"]:>9.1f} s'
+            f'{"  " + summary["error"] if summary["error"] else ""}'
+        )
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summaries, f, indent=2)
+
+    sys.exit(1 if any(summary['status'] != 'done' for summary in summaries) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import numpy
+
+
+COLORIZER_MODES = ('scale', 'ramp', 'hillshade')
+
+# (fraction of the [minimum, maximum] range, (R, G, B)):
+DEFAULT_RAMP = (
+    (0.0, (0, 97, 71)),
+    (0.25, (16, 122, 47)),
+    (0.5, (232, 215, 125)),
+    (0.75, (161, 67, 0)),
+    (0.9, (130, 30, 30)),
+    (1.0, (255, 255, 255)),
+)
+
+
+def scale_to_byte(values, minimum, maximum):
+    """Linearly map [minimum, maximum] into [0, 255]."""
+    span = (maximum - minimum) or 1
+    scaled = (values - minimum) * (255.0 / span)
+    return numpy.clip(numpy.round(scaled), 0, 255).astype(numpy.uint8)
+
+
+def apply_ramp(values, stops, minimum, maximum, relative=True):
+    """Interpolate the (value, (R, G, B)) stops of a colour ramp over
+    `values`, returning a (3, rows, columns) uint8 array."""
+    positions = numpy.array([value for value, _ in stops], numpy.float64)
+    colors = numpy.array([color for _, color in stops], numpy.float64)
+    if relative:
+        positions = minimum + positions * (maximum - minimum)
+
+    return numpy.stack([
+        numpy.round(numpy.interp(values, positions, colors[:, i]))
+        for i in range(3)
+    ]).astype(numpy.uint8)
+
+
+def hillshade(values, resolution_x, resolution_y, azimuth=315, altitude=45, z_factor=1):
+    """Shaded relief (0-1) of an elevation window, lit from `azimuth`
+    (degrees clockwise from north) at `altitude` degrees."""
+    dy, dx = numpy.gradient(values * z_factor, resolution_y, resolution_x)
+    slope = numpy.arctan(numpy.hypot(dx, dy))
+    # (rows grow southwards)
+    aspect = numpy.arctan2(-dx, dy)
+
+    zenith = numpy.radians(90 - altitude)
+    azimuth = numpy.radians(azimuth)
+    shade = (
+        numpy.cos(zenith) * numpy.cos(slope)
+        + numpy.sin(zenith) * numpy.sin(slope) * numpy.cos(azimuth - aspect)
+    )
+    return numpy.clip(shade, 0, 1)
+
+
+class Colorizer:
+    """Turn a non-Byte band (e.g. a float32 DSM) into byte tile bands.
+
+    Modes:
+    - 'scale': gray levels, from minimum to maximum;
+    - 'ramp': RGB colour ramp (`ramp` stops, relative to the
+      [minimum, maximum] range unless `relative_ramp` is False),
+      optionally multiplied by the hillshade (`shade`);
+    - 'hillshade': gray shaded relief.
+
+    Invalid pixels (nodata, NaN or outside the source) are transparent.
+    When minimum/maximum are not given, the tiler takes them from the
+    band statistics."""
+
+    # Whether the band holds palette indices, read as integers:
+    indexed = False
+
+    def __init__(
+        self, mode='scale', ramp=DEFAULT_RAMP, relative_ramp=True,
+        minimum=None, maximum=None, shade=False,
+        azimuth=315, altitude=45, z_factor=1
+    ):
+        if mode not in COLORIZER_MODES:
+            raise Exception(
+                f"'{mode}' is not a colorizer mode.",
+                f"Please use one of: {', '.join(COLORIZER_MODES)}."
+            )
+        self.mode = mode
+        self.ramp = ramp
+        self.relative_ramp = relative_ramp
+        self.minimum = minimum
+        self.maximum = maximum
+        self.shade = shade
+        self.azimuth = azimuth
+        self.altitude = altitude
+        self.z_factor = z_factor
+
+    @property
+    def bands_count(self):
+        return 3 if self.mode == 'ramp' else 1
+
+    @property
+    def needs_apron(self):
+        """Whether the gradients need the pixels around the window."""
+        return self.mode == 'hillshade' or (self.mode == 'ramp' and self.shade)
+
+    @property
+    def needs_range(self):
+        return self.mode != 'hillshade' and (
+            self.minimum is None or self.maximum is None
+        )
+
+    def set_range(self, minimum, maximum):
+        if self.minimum is None:
+            self.minimum = minimum
+        if self.maximum is None:
+            self.maximum = maximum
+
+    def render(self, values, valid, resolution, crop=None):
+        """Return (bands, alpha) uint8 arrays for a window of `values`
+        with its `valid` mask and (x, y) pixel size.
+
+        With `crop` (rows and columns slices), `values` also holds the
+        pixels around the window (see needs_apron) and only the window
+        is returned, so the gradients match across tile borders."""
+        # Invalid pixels would spoil the gradients of their neighbours:
+        if not valid.all():
+            fill = values[valid].mean() if valid.any() else 0
+            values = numpy.where(valid, values, fill)
+
+        if self.mode == 'scale':
+            bands = scale_to_byte(values, self.minimum, self.maximum)[numpy.newaxis]
+        elif self.mode == 'hillshade':
+            shade = self.get_hillshade(values, resolution)
+            bands = numpy.round(shade * 255).astype(numpy.uint8)[numpy.newaxis]
+        else:
+            bands = apply_ramp(
+                values, self.ramp, self.minimum, self.maximum,
+                self.relative_ramp
+            )
+            if self.shade:
+                shade = self.get_hillshade(values, resolution)
+                bands = numpy.round(bands * shade).astype(numpy.uint8)
+
+        alpha = numpy.where(valid, 255, 0).astype(numpy.uint8)
+        if crop is not None:
+            bands = numpy.ascontiguousarray(bands[(slice(None),) + crop])
+            alpha = numpy.ascontiguousarray(alpha[crop])
+        return bands, alpha
+
+    def get_hillshade(self, values, resolution):
+        resolution_x, resolution_y = resolution
+        if min(values.shape) < 2:
+            return numpy.ones(values.shape)
+        return hillshade(
+            values, resolution_x, resolution_y,
+            self.azimuth, self.altitude, self.z_factor
+        )
+
+
+class ColorTable:
+    """Expand a paletted band per tile, through a numpy lookup table
+    built from its GDAL color table, into RGB plus alpha.
+
+    Only the compact indices are read; nodata and the palette's own
+    alpha become transparency."""
+
+    indexed = True
+    bands_count = 3
+    needs_apron = False
+    needs_range = False
+
+    def __init__(self, color_table):
+        # Indices out of the palette are transparent black:
+        count = color_table.GetCount()
+        self.lut = numpy.zeros((max(count, 256), 4), numpy.uint8)
+        for i in range(count):
+            self.lut[i] = color_table.GetColorEntry(i)
+
+    def render(self, indices, valid, resolution):
+        indices = numpy.clip(indices, 0, len(self.lut) - 1)
+        rgba = self.lut[indices]
+        bands = numpy.ascontiguousarray(rgba[..., :3].transpose(2, 0, 1))
+        alpha = numpy.where(valid, rgba[..., 3], 0).astype(numpy.uint8)
+        return bands, alpha
@@ -11,3 +11,17 @@ RESAMPLING_METHODS = (
 )
 
 PROFILES = ('mercator', 'geodetic', 'raster')
+
+# Tile sets a run can generate (see GDAL2Tiles.products):
+PRODUCTS = ('visual', 'terrain')
+
+# Resampling algorithms usable by the warper when reprojecting the input:
+WARP_RESAMPLING_METHODS = (
+    'near',
+    'bilinear',
+    'cubic',
+    'cubicspline',
+    'lanczos',
+    'average',
+    'mode',
+)
@@ -1,2 +1,6 @@
 class ImageOutputException(Exception):
     """Raised when the tile image can't be saved to disk."""
+
+
+class TilingCancelled(Exception):
+    """Raised inside the rendering threads when an async job is cancelled."""
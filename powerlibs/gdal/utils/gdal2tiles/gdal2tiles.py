@@ -1,34 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
 from pathlib import PosixPath
+import threading
 
 import numpy
 from osgeo import gdal
 from osgeo import osr
 
-from .image_output import SimpleImageOutput
+from ..raster import RasterFile
+from .async_tiling import process_async
+from .colorize import ColorTable, Colorizer
+from .defines import PRODUCTS, WARP_RESAMPLING_METHODS
+from .image_output import MultiImageOutput, MultiSizeImageOutput, SimpleImageOutput
+from .memory import MemoryBudget
+from .metrics import Metrics
+from .mosaic import Mosaic, MosaicSource
+from .nodata import NODATA_RULES, NodataMask, normalize_nodata
+from .planning import plan_job
+from .policy import get_default_querysize
 from .resampler import get_resampler
-from .utils import ensure_dir_exists, gdal_write
+from .sharding import ShardPlan, copy_tiles
+from .terrain import TerrainRGB
+from .utils import encode_tile, gdal_write, get_gdal_driver
+from .warp import create_warped_vrt, get_vsimem_path, is_rotated, release_vsimem
+from .windows import build_window_table, iter_windows, split_columns, tile_grid
+from .xyzzy import Xyzzy
 
 
 class GDAL2Tiles:
+    image_output_class = SimpleImageOutput
+
     def __init__(
             self,
             source_path, output_dir,
             min_zoom=None, max_zoom=None,
             resampling_method='average',
             source_srs=None, source_nodata=None,
-            tile_size=256
+            nodata_tolerance=0, nodata_rule='all',
+            tile_size=256, tile_sizes=None,
+            warp_resampling='near', warp_threads=None,
+            warp_memory_limit=None,
+            overview_query=False, workers=1,
+            colorizer=None,
+            products=('visual',), terrain_downsampling='mean',
+            metrics_hooks=(), report_path=None,
+            memory_budget=None, resampling_policy=None
     ):
-        self.source_path = PosixPath(source_path)
-        self.output_dir = PosixPath(output_dir)
+        # A list of sources is tiled as a mosaic of all of them, the
+        # first ones drawn on top of the following (see mosaic.Mosaic):
+        if isinstance(source_path, (list, tuple)):
+            self.source_paths = [PosixPath(path) for path in source_path]
+        else:
+            self.source_paths = [PosixPath(source_path)]
+        self.source_path = self.source_paths[0]
+        # (None when tiles are only rendered, e.g. by a tile_server.TileRenderer)
+        self.output_dir = PosixPath(output_dir) if output_dir is not None else None
         self.min_zoom = min_zoom
         self.max_zoom = max_zoom
 
         self.resampling_method = resampling_method
+
+        # Resampling method, querysize and encoder by zoom level (a
+        # policy.ResamplingPolicy, possibly auto-tuned when the input is
+        # opened); resampling_method everywhere if not given
+        self.resampling_policy = resampling_policy
         self.source_srs = source_srs
-        self.source_nodata = source_nodata
 
-        # Tile format
-        self.tile_size = tile_size
+        # NODATA of the input (one value, or one per band): those pixels
+        # become transparent, matching within nodata_tolerance and by
+        # nodata_rule (see nodata.NodataMask). source_nodata is then set
+        # by open_input to the value GDAL's warper takes (see
+        # nodata.normalize_nodata) and band_nodata to the one of each band.
+        self.source_nodata = source_nodata
+        self.band_nodata = None
+        self.nodata_given = source_nodata is not None
+        self.nodata_tolerance = nodata_tolerance
+        self.nodata_rule = nodata_rule
+        self.nodata_mask = None
+
+        # Tile format. With several tile_sizes (e.g. (256, 512), for HiDPI
+        # screens) all of them are written from one traversal of the
+        # pyramid of the smallest, each one into output_dir/<size>
+        # (see image_output.MultiSizeImageOutput).
+        self.tile_sizes = sorted(tile_sizes or (tile_size,))
+        self.tile_size = self.tile_sizes[0]
+
+        # Warper options, used whenever the input must be reprojected:
+        # warp_threads is the warper's NUM_THREADS option ('ALL_CPUS' or a
+        # number) and warp_memory_limit its working memory, in bytes.
+        # Every one of the `workers` threads warps through its own handle,
+        # so by default they share the CPUs (see get_warp_threads).
+        self.warp_resampling = warp_resampling
+        self.warp_threads = warp_threads
+        self.warp_memory_limit = warp_memory_limit
+        self.warped_vrt_path = None
+        self.mosaic = None
+        self.mosaic_vsimem_paths = []
 
         # Should we read bigger window of the input raster and scale it down?
         # Note: Modified later by open_input()
@@ -40,10 +107,48 @@ class GDAL2Tiles:
         self.write_method = gdal_write
 
         # Should we use Read on the input file for generating overview tiles?
-        # Note: Modified later by open_input()
+        # (GDAL then reads from the internal overviews of the input, if any)
         # Otherwise the overview tiles are generated from
         # existing underlying tiles
-        self.overviewquery = False
+        self.overviewquery = overview_query
+
+        # How many threads render the tiles read from the input raster,
+        # each one with its own handle of the dataset:
+        self.workers = workers
+
+        # How non-Byte inputs (e.g. DSMs) become tile colours: a
+        # colorize.Colorizer (linear gray scaling if not given)
+        self.colorizer = colorizer
+
+        # Tile sets generated in the same run: 'visual' (the imagery) and
+        # 'terrain' (terrain-RGB encoded elevations of the first band).
+        # With more than one, each goes into output_dir/<product>.
+        self.products = tuple(products)
+        self.terrain = None
+        if 'terrain' in self.products:
+            self.terrain = TerrainRGB(terrain_downsampling)
+
+        # Per-stage timers and counters of every run (see metrics.Metrics),
+        # written by process() as a JSON report to report_path, if given
+        self.metrics = Metrics(metrics_hooks)
+        self.report_path = report_path
+
+        # Memory (in bytes) the whole job should fit in, divided between
+        # GDAL's cache, the warper, the workers and the queues. The job
+        # uses fewer workers and a smaller cache when it gets close to it.
+        self.memory_budget = None
+        if memory_budget:
+            self.memory_budget = MemoryBudget(memory_budget)
+            if self.warp_memory_limit is None:
+                self.warp_memory_limit = self.memory_budget.warp_memory
+
+        # Rendering threads of the running process_async (if any), which
+        # the memory budget is planned for instead of self.workers
+        self.async_concurrency = None
+
+        # Set by process() when generating only one shard of the pyramid:
+        self.shard = None
+        self.shard_plan = None
 
         self.check_resampling_method_availability()
         self.set_querysize()
@@ -52,14 +157,44 @@ class GDAL2Tiles:
         # How big should be query window be for scaling down
         # Later on reset according the chosen resampling algorightm
 
-        if self.resampling_method == 'near':
-            self.querysize = self.tile_size
-        elif self.resampling_method == 'bilinear':
-            self.querysize = self.tile_size * 2
-        else:
-            self.querysize = 4 * self.tile_size
+        self.querysize = get_default_querysize(
+            self.resampling_method, self.tile_size
+        )
+        # (the biggest one, with a policy; see get_querysize)
+        if self.resampling_policy is not None:
+            self.querysize = self.resampling_policy.get_max_querysize(self.tile_size)
+
+        # The same read is scaled into the tiles of every size:
+        self.querysize = max(self.querysize, self.tile_sizes[-1])
 
     def check_resampling_method_availability(self):
+        if self.nodata_rule not in NODATA_RULES:
+            raise Exception(
+                f"'{self.nodata_rule}' is not a nodata rule.",
+                f"Please use one of: {', '.join(NODATA_RULES)}."
+            )
+
+        for tile_size in self.tile_sizes[1:]:
+            ratio = tile_size // self.tile_size
+            if tile_size % self.tile_size or ratio & (ratio - 1):
+                raise Exception(
+                    f"Tile size {tile_size} is not a power of two "
+                    f"multiple of {self.tile_size}."
+                )
+
+        for product in self.products:
+            if product not in PRODUCTS:
+                raise Exception(
+                    f"'{product}' is not a tile product.",
+                    f"Please use one of: {', '.join(PRODUCTS)}."
+                )
+
+        if self.warp_resampling not in WARP_RESAMPLING_METHODS:
+            raise Exception(
+                f"'{self.warp_resampling}' can't be used for warping.",
+                f"Please use one of: {', '.join(WARP_RESAMPLING_METHODS)}."
+            )
+
         # Supported options
         if self.resampling_method == 'average':
             try:
@@ -80,34 +215,340 @@ class GDAL2Tiles:
                 )
 
     # -------------------------------------------------------------------------
-    def process(self):
-        # Opening and preprocessing of the input file
+    def process(self, shard=None, of=None):
+        """Generate the whole pyramid or, with `shard` and `of`, only the
+        part of it owned by the given shard (see `sharding.ShardPlan`);
+        the remaining levels are generated later by `merge_shards`.
+
+        Returns the performance report of the run (see `get_report`)."""
+        if (shard is None) != (of is None):
+            raise Exception(
+                "A shard must be given together with the number of shards.",
+                "Please call process(shard=<i>, of=<shards>)."
+            )
+        if of is not None and not 0 <= shard < of:
+            raise Exception(f"Shard {shard} is not one of the {of} shards.")
+        if self.output_dir is None:
+            raise Exception("An output directory is needed to write the tiles.")
+
+        self.metrics.reset()
+        # (left by a previous sharded run of this instance)
+        self.shard = None
+        self.shard_plan = None
+
+        with self.metrics.timer('process'):
+            # Opening and preprocessing of the input file
+            self.open_input()
+
+            last_zoom = self.min_zoom
+            if shard is not None:
+                self.shard = shard
+                self.shard_plan = ShardPlan(
+                    self.tminmax, self.min_zoom, self.max_zoom, of
+                )
+                last_zoom = self.shard_plan.zoom
+
+            # Generation of the lowest tiles
+            self.generate_base_tiles()
+
+            # Generation of the overview tiles (higher in the pyramid)
+            self.generate_overview_tiles(last_zoom=last_zoom)
+
+            self.release_input()
+
+        return self.get_report()
+
+    def plan(self, samples=8, workers=None, sample_levels=3):
+        """Dry run: open the input, count the tiles of every zoom level
+        and render a few samples in memory to estimate their encoded
+        size, empty ratio and render time. Nothing is written.
+
+        Returns a `planning.TilingPlan` with the projected output size
+        and wall time for `workers` threads (default: self.workers)."""
+        self.open_input()
+        try:
+            return plan_job(
+                self, samples=samples, workers=workers,
+                sample_levels=sample_levels
+            )
+        finally:
+            self.release_input()
+
+    def get_report(self):
+        """Metrics of the last run, also written as JSON to
+        self.report_path (when given)."""
+        extra = {
+            'source': [str(path) for path in self.source_paths],
+            'output_dir': str(self.output_dir) if self.output_dir is not None else None,
+            'min_zoom': self.min_zoom,
+            'max_zoom': self.max_zoom,
+            'workers': self.async_concurrency or self.workers,
+        }
+        if self.memory_budget is not None:
+            extra['memory'] = self.memory_budget.report()
+        if self.resampling_policy is not None:
+            extra['resampling_policy'] = self.resampling_policy.report()
+        if self.report_path is None:
+            report = self.metrics.report()
+            report.update(extra)
+            return report
+        return self.metrics.write_report(self.report_path, **extra)
+
+    def merge_shards(self, shard_dirs):
+        """Gather the tiles of every shard of a job into the output
+        directory and generate the levels crossing shard boundaries."""
         self.open_input()
 
-        # Generation of the lowest tiles
-        self.generate_base_tiles()
+        plan = ShardPlan(
+            self.tminmax, self.min_zoom, self.max_zoom, len(shard_dirs)
+        )
+        for shard_dir in shard_dirs:
+            copy_tiles(shard_dir, self.output_dir)
+
+        self.generate_overview_tiles(first_zoom=plan.zoom - 1)
+
+        self.release_input()
 
-        # Generation of the overview tiles (higher in the pyramid)
-        self.generate_overview_tiles()
+    def in_shard(self, tx, ty, tz):
+        """Mask of the given tile arrays this job must generate."""
+        if self.shard_plan is None:
+            return numpy.ones(numpy.shape(tx), bool)
+        return self.shard_plan.mask(self.shard, tx, ty, tz)
+
+    def iter_tiles(self):
+        """Yield (tz, tx, ty, data) for every tile of the pyramid, with
+        data being the encoded PNG, as soon as each tile is produced.
+
+        Nothing is written to the output directory. The pyramid is walked
+        depth-first, so only the children of the overview tiles along the
+        current path are kept in memory."""
+        self.open_input()
+        try:
+            tminx, tminy, tmaxx, tmaxy = self.tminmax[self.min_zoom]
+            for tx in range(tminx, tmaxx + 1):
+                for ty in range(tminy, tmaxy + 1):
+                    yield from self.iter_subtree(self.min_zoom, tx, ty)
+        finally:
+            self.release_input()
+
+    def iter_subtree(self, tz, tx, ty, image_output=None, known=None):
+        """Yield the tiles under (and including) the given one, children
+        first, and return the MEM dataset of the given tile (or None if
+        it's outside the pyramid).
+
+        `known` maps (tz, tx, ty) to already rendered tiles: those are
+        returned as they are (and removed from it), without walking (nor
+        yielding) them again."""
+        if known and (tz, tx, ty) in known:
+            return known.pop((tz, tx, ty))
+
+        tminx, tminy, tmaxx, tmaxy = self.tminmax[tz]
+        if not (tminx <= tx <= tmaxx and tminy <= ty <= tmaxy):
+            return None
+
+        image_output = image_output or self.image_output
+        children = []
+        if tz < self.max_zoom:
+            for cy in (2 * ty, 2 * ty + 1):
+                for cx in (2 * tx, 2 * tx + 1):
+                    child = yield from self.iter_subtree(
+                        tz + 1, cx, cy, image_output, known
+                    )
+                    if child is not None:
+                        children.append((cx, cy, child))
+
+        image_output.zoom = tz
+        if tz == self.max_zoom or self.overviewquery:
+            xyzzy = self.generate_base_tile_xyzzy(tx, ty, tz)
+            alpha = image_output.read_alpha(xyzzy)
+            dstile = image_output.render_base_tile(xyzzy, alpha)
+        else:
+            dstile = image_output.render_overview_tile(tx, ty, children)
+
+        yield tz, tx, ty, encode_tile(dstile)
+        return dstile
+
+    async def process_async(self, concurrency=4, sink=None, on_progress=None):
+        """Asyncio version of process(): see `async_tiling.process_async`."""
+        # (the memory budget is planned for these threads by open_input)
+        self.async_concurrency = concurrency
+        try:
+            return await process_async(
+                self, concurrency=concurrency, sink=sink, on_progress=on_progress
+            )
+        finally:
+            self.async_concurrency = None
 
     def open_input(self):
         """Initialization of the input raster, reprojection if necessary"""
+        with self.metrics.timer('open_input'):
+            self._open_input()
+
+    def _open_input(self):
+        if self.memory_budget is not None:
+            gdal.SetCacheMax(self.memory_budget.gdal_cache)
+
         self.initialize_input_raster()
 
+        if self.source_nodata is not None:
+            self.nodata_mask = NodataMask(
+                self.band_nodata, self.in_ds.RasterCount,
+                self.nodata_tolerance, self.nodata_rule
+            )
+
         self.set_out_srs()
 
         self.out_ds = None
-        self.reproject_if_necessary()
+        if len(self.source_paths) > 1:
+            self.build_mosaic()
+        else:
+            self.reproject_if_necessary()
         if not self.out_ds:
             self.out_ds = self.in_ds
 
+        self.configure_colorizer()
         self.instantiate_image_output()
         self.configure_bounds()
         self.adjust_zoom()
         self.calculate_ranges_for_tiles()
 
+        if self.resampling_policy is not None and self.resampling_policy.auto:
+            with self.metrics.timer('tune'):
+                self.resampling_policy.tune(self)
+            self.set_querysize()
+
+        if self.memory_budget is not None:
+            workers = self.memory_budget.plan(
+                self.async_concurrency or self.workers, self.querysize,
+                self.tile_size, self.out_ds.RasterCount
+            )
+            if self.async_concurrency is None:
+                self.workers = workers
+
     def reproject_if_necessary(self):
-        pass
+        # Rotated/skewed inputs are warped (in memory) to a north up grid
+        # in their own reference system:
+        if self.needs_reprojection(self.in_ds, self.in_srs):
+            self.warp_input(self.in_srs_wkt, self.get_warp_resolution())
+
+    def needs_reprojection(self, ds, srs):
+        return is_rotated(ds)
+
+    def get_out_srs_wkt(self):
+        if self.out_srs is None:
+            return ''
+        return self.out_srs.ExportToWkt()
+
+    def get_warp_resolution(self):
+        return None
+
+    def get_warp_threads(self):
+        if self.warp_threads is not None:
+            return self.warp_threads
+        if self.workers <= 1:
+            return 'ALL_CPUS'
+        return max(1, (os.cpu_count() or 1) // self.workers)
+
+    def build_mosaic(self):
+        """Index the footprints of every source and make self.out_ds an
+        empty VRT covering all of them, used only for its grid: the tiles
+        are read from the sources themselves (see mosaic.Mosaic)."""
+        if self.terrain is not None:
+            raise Exception(
+                "Elevation tiles can't be generated from mosaics.",
+                "Please tile each source separately."
+            )
+
+        sources = []
+        for priority, path in enumerate(self.source_paths):
+            ds = gdal.Open(str(path), gdal.GA_ReadOnly)
+            if not ds:
+                raise Exception(
+                    f'It is not possible to open the input file "{path}".'
+                )
+
+            srs = osr.SpatialReference()
+            if self.source_srs:
+                srs.SetFromUserInput(self.source_srs)
+            else:
+                wkt = ds.GetProjection() or ds.GetGCPProjection()
+                if wkt:
+                    srs.ImportFromWkt(wkt)
+
+            # The given nodata applies to every source; otherwise, each
+            # source uses its own.
+            band_nodata = self.band_nodata if self.nodata_given else None
+            nodata = self.source_nodata if self.nodata_given else None
+            if self.needs_reprojection(ds, srs):
+                if nodata is None:
+                    nodata = normalize_nodata([
+                        ds.GetRasterBand(i).GetNoDataValue()
+                        for i in range(1, ds.RasterCount + 1)
+                    ])
+                vrt_path, ds = create_warped_vrt(
+                    ds, srs.ExportToWkt(), self.get_out_srs_wkt(),
+                    resolution=self.get_warp_resolution(),
+                    nodata=nodata,
+                    add_alpha=nodata is None and ds.RasterCount in (1, 3),
+                    resampling=self.warp_resampling,
+                    threads=self.get_warp_threads(),
+                    memory_limit=self.warp_memory_limit,
+                )
+                self.mosaic_vsimem_paths.append(vrt_path)
+                path = vrt_path
+
+            sources.append(MosaicSource(
+                path, priority, ds, band_nodata,
+                self.nodata_tolerance, self.nodata_rule
+            ))
+
+        geotransform, xsize, ysize = Mosaic.get_grid(sources)
+        self.mosaic = Mosaic(sources, geotransform)
+
+        # Data bands of the first source, plus alpha:
+        bands_count = sources[0].data_bands_count + 1
+        vrt_path = get_vsimem_path('.vrt')
+        self.mosaic_vsimem_paths.append(vrt_path)
+        out_ds = get_gdal_driver('VRT').Create(
+            vrt_path, xsize, ysize, bands_count, gdal.GDT_Byte
+        )
+        out_ds.SetGeoTransform(geotransform)
+        out_ds.SetProjection(self.get_out_srs_wkt() or self.in_srs_wkt or '')
+        out_ds.GetRasterBand(bands_count).SetRasterColorInterpretation(
+            gdal.GCI_AlphaBand
+        )
+        out_ds.FlushCache()
+        self.out_ds = out_ds
+
+    def warp_input(self, dst_wkt, resolution=None):
+        """Replace self.out_ds with an in-memory warped VRT of the input."""
+        # Mono (1 band) and RGB (3 bands) files without NODATA
+        # get an alpha band for the areas outside the source:
+        add_alpha = (
+            self.source_nodata is None and self.in_ds.RasterCount in (1, 3)
+        )
+
+        # Palette indices can't be interpolated:
+        resampling = self.warp_resampling
+        if self.in_ds.GetRasterBand(1).GetRasterColorTable():
+            resampling = 'near'
+
+        self.warped_vrt_path, self.out_ds = create_warped_vrt(
+            self.in_ds, self.in_srs_wkt, dst_wkt,
+            resolution=resolution,
+            nodata=self.source_nodata,
+            add_alpha=add_alpha,
+            resampling=resampling,
+            threads=self.get_warp_threads(),
+            memory_limit=self.warp_memory_limit,
+        )
+
+    def release_input(self):
+        release_vsimem(self.warped_vrt_path)
+        self.warped_vrt_path = None
+        for path in self.mosaic_vsimem_paths:
+            release_vsimem(path)
+        self.mosaic_vsimem_paths = []
 
     def initialize_input_raster(self):
         gdal.SetConfigOption("GDAL_PAM_ENABLED", "NO")
@@ -127,23 +568,20 @@ class GDAL2Tiles:
         if self.in_ds.RasterCount == 0:
             raise Exception("Input file '%s' has no raster band" % self.source_path)
 
-        if self.in_ds.GetRasterBand(1).GetRasterColorTable():
-            # TODO: Process directly paletted dataset by generating VRT in memory
-            raise Exception(
-                "Please convert this file to RGB/RGBA and run gdal2tiles on the result.",
-                """From paletted file you can create RGBA file (temp.vrt) by:
-gdal_translate -of vrt -expand rgba %s temp.vrt
-then run:
-gdal2tiles temp.vrt""" % self.source_path)
+        # Paletted files are expanded per tile (see configure_colorizer)
 
         # Get NODATA value
-        # If the source dataset has NODATA, use it.
-        if self.source_nodata is None:
-            for i in range(1, self.in_ds.RasterCount + 1):
-                ndvalue = self.in_ds.GetRasterBand(i).GetNoDataValue()
-                if ndvalue is not None:
-                    self.source_nodata = ndvalue
-                    break
+        # If none was given and the source dataset has NODATA, use it
+        # (one value per band, if they differ).
+        if self.band_nodata is None:
+            if self.source_nodata is None:
+                self.band_nodata = [
+                    self.in_ds.GetRasterBand(i).GetNoDataValue()
+                    for i in range(1, self.in_ds.RasterCount + 1)
+                ]
+            else:
+                self.band_nodata = self.source_nodata
+            self.source_nodata = normalize_nodata(self.band_nodata)
 
         # Here we should have RGBA input dataset opened in self.in_ds
 
@@ -168,34 +606,91 @@ gdal2tiles temp.vrt""" % self.source_path)
     def set_out_srs(self):
         pass
 
+    def configure_colorizer(self):
+        if 'visual' not in self.products:
+            return
+
+        band = self.in_ds.GetRasterBand(1)
+        if self.colorizer is None and band.GetRasterColorTable():
+            self.colorizer = ColorTable(band.GetRasterColorTable())
+        elif self.colorizer is None and band.DataType != gdal.GDT_Byte:
+            self.colorizer = Colorizer()
+        if self.colorizer is None:
+            return
+
+        if self.mosaic is not None:
+            raise Exception(
+                "Mosaics of non-Byte or paletted sources can't be colorized.",
+                "Please tile each source separately."
+            )
+
+        # Scale between the altitudes of the (non-warped) input:
+        if self.colorizer.needs_range:
+            raster = RasterFile(self.source_path)
+            self.colorizer.set_range(
+                raster.lower_altitude, raster.higher_altitude
+            )
+
     def instantiate_image_output(self):
-        # Instantiate image output.
-        resampler = get_resampler(self.resampling_method, self.write_method)
-        self.image_output = SimpleImageOutput(
-            self.out_ds,
-            self.tile_size,
+        self.image_output = self.create_image_output(self.out_ds)
+
+    def create_image_output(self, out_ds):
+        outputs = [
+            self.create_sizes_output(out_ds, product)
+            for product in self.products
+        ]
+        if len(outputs) == 1:
+            return outputs[0]
+        return MultiImageOutput(outputs)
+
+    def create_sizes_output(self, out_ds, product):
+        outputs = [
+            self.create_product_output(out_ds, product, tile_size)
+            for tile_size in self.tile_sizes
+        ]
+        if len(outputs) == 1:
+            return outputs[0]
+        return MultiSizeImageOutput(outputs)
+
+    def create_product_output(self, out_ds, product, tile_size=None):
+        resampler = get_resampler(self.resampling_method)
+        return self.image_output_class(
+            out_ds,
+            tile_size or self.tile_size,
             resampler,
             self.write_method,
             self.source_nodata,
-            self.output_dir,
+            self.get_product_dir(product, tile_size),
+            mosaic=self.mosaic,
+            colorizer=self.colorizer if product == 'visual' else None,
+            terrain=self.terrain if product == 'terrain' else None,
+            metrics=self.metrics,
+            nodata_mask=self.nodata_mask,
+            policy=self.resampling_policy,
         )
 
+    def get_product_dir(self, product, tile_size=None):
+        output_dir = self.output_dir
+        if output_dir is None:
+            return None
+        if len(self.products) > 1:
+            output_dir = output_dir / product
+        if len(self.tile_sizes) > 1:
+            output_dir = output_dir / str(tile_size or self.tile_size)
+        return output_dir
+
+    def open_output_dataset(self):
+        """Open a new handle of self.out_ds (whatever it is: the input
+        file, an in-memory warped VRT or a materialized intermediate)."""
+        return gdal.Open(self.out_ds.GetDescription(), gdal.GA_ReadOnly)
+
     def configure_bounds(self):
         # Read the georeference
         self.out_gt = self.out_ds.GetGeoTransform()
 
-        # Report error in case rotation/skew is in geotransform
-        # (possible only in 'raster' profile)
-        # TODO: move to raster.Raster, somehow...
-        if (self.out_gt[2], self.out_gt[4]) != (0, 0):
-            raise Exception(
-                "Georeference of the raster contains rotation or skew. "
-                "Such raster is not supported. Please use gdalwarp first."
-            )
-            # TODO: Do the warping in this case automaticaly
-
         #
         # Here we expect: pixel is square, no rotation on the raster
+        # (rotated/skewed inputs were warped by reproject_if_necessary)
         #
 
         # Output Bounds - coordinates in the output SRS
@@ -207,55 +702,145 @@ gdal2tiles temp.vrt""" % self.source_path)
         # when 0 becomes -1e-15
 
     # -------------------------------------------------------------------------
+    def generate_base_windows(self, tz):
+        """Read/write windows of every tile of the given zoom level,
+        as a `windows.WINDOW_DTYPE` table in tile loop order."""
+        tminx, tminy, tmaxx, tmaxy = self.tminmax[tz]
+        tx, ty = tile_grid(range(tminx, tmaxx + 1), self.get_y_range(tz))
+        inside = (ty >= tminy) & (ty <= tmaxy) & self.in_shard(tx, ty, tz)
+        tx, ty = tx[inside], ty[inside]
+        rb, wb = self.compute_windows(tx, ty, tz)
+        return build_window_table(tx, ty, self.get_querysize(tz), rb, wb)
+
+    def compute_windows(self, tx, ty, tz):
+        """Return ((rx, ry, rxsize, rysize), (wx, wy, wxsize, wysize))
+        arrays for the given arrays of tiles."""
+        raise NotImplementedError
+
+    def get_querysize(self, tz):
+        if self.resampling_policy is None:
+            return self.querysize
+        querysize = self.resampling_policy.get(tz).get_querysize(self.tile_size)
+        return max(querysize, self.tile_sizes[-1])
+
+    def generate_base_tile_xyzzy(self, tx, ty, tz):
+        rb, wb = self.compute_windows(
+            numpy.array([tx]), numpy.array([ty]), tz
+        )
+        values = [int(array[0]) for array in rb + wb]
+        return Xyzzy(self.get_querysize(tz), *values)
+
     def generate_base_tiles(self):
         """Generation of the base tiles (the lowest in the pyramid)
         directly from the input raster"""
 
-        # Set the bounds
-        tminx, tminy, tmaxx, tmaxy = self.tminmax[self.max_zoom]
-        querysize = self.querysize
-
-        # Just the center tile
-        # tminx = tminx+ (tmaxx - tminx)/2
-        # tminy = tminy+ (tmaxy - tminy)/2
-        # tmaxx = tminx
-        # tmaxy = tminy
-
-        tz = self.max_zoom
-        tzs = str(tz)
-        for tx in range(tminx, tmaxx + 1):
-            target_path = self.output_dir / tzs / str(tx)
-            dir_already_existed = ensure_dir_exists(target_path)
-
-            for ty in self.get_y_range(self.max_zoom):
-                xyzzy = self.generate_base_tile_xyzzy(
-                    tx, ty, tz,
-                    querysize,
-                    tminx, tminy, tmaxx, tmaxy
-                )
-                self.image_output.write_base_tile(
-                    tx, ty, tz, xyzzy, dir_already_existed
+        with self.metrics.timer('base_tiles', self.max_zoom):
+            self.base_windows = self.generate_base_windows(self.max_zoom)
+            self.render_windows([(self.max_zoom, self.base_windows)])
+
+    def render_windows(self, tables):
+        """Render, reading from the input raster, the tiles of a list
+        of (tz, window table) pairs."""
+        columns = [
+            (tz, column)
+            for tz, table in tables
+            for column in split_columns(table)
+        ]
+
+        if self.workers <= 1:
+            for tz, column in columns:
+                self.render_column(self.image_output, tz, column)
+                self.check_memory()
+            return
+
+        local = threading.local()
+
+        def render(task):
+            if not hasattr(local, 'image_output'):
+                local.image_output = self.create_image_output(
+                    self.open_output_dataset()
                 )
+            if self.memory_budget is None:
+                self.render_column(local.image_output, *task)
+                return
+
+            with self.memory_budget.throttle:
+                self.render_column(local.image_output, *task)
+            self.check_memory()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # (consume the results so exceptions are raised here)
+            for _ in executor.map(render, columns):
+                pass
+
+    def render_column(self, image_output, tz, column):
+        tx = int(column['tx'][0])
+        dir_already_existed = image_output.ensure_tile_dir(tz, tx)
+
+        for tx, ty, xyzzy in iter_windows(column):
+            image_output.write_base_tile(
+                tx, ty, tz, xyzzy, dir_already_existed
+            )
 
     # -------------------------------------------------------------------------
-    def generate_overview_tiles(self):
+    def generate_overview_tiles(self, first_zoom=None, last_zoom=None):
         """Generation of the overview tiles (higher in the pyramid)
-        based on existing tiles"""
+        based on existing tiles, from first_zoom (default: the one above
+        the base level) up to last_zoom (default: min_zoom)"""
+        if first_zoom is None:
+            first_zoom = self.max_zoom - 1
+        if last_zoom is None:
+            last_zoom = self.min_zoom
+        zooms = range(first_zoom, last_zoom - 1, -1)
+
+        if self.overviewquery:
+            with self.metrics.timer('overview_tiles'):
+                self.generate_overview_tiles_from_input(zooms)
+            return
+
         # Usage of existing tiles:
         # from 4 underlying tiles generate one as overview.
         # querysize = tile_size * 2
-        for tz in range(self.max_zoom - 1, self.min_zoom - 1, -1):
-            tminx, tminy, tmaxx, tmaxy = self.tminmax[tz]
+        for tz in zooms:
+            with self.metrics.timer('overview_tiles', tz):
+                self.generate_overview_level(tz)
 
-            tzs = str(tz)
-            for tx in range(tminx, tmaxx + 1):
-                target_path = self.output_dir / tzs / str(tx)
-                dir_already_existed = ensure_dir_exists(target_path)
+    def generate_overview_level(self, tz):
+        tminx, tminy, tmaxx, tmaxy = self.tminmax[tz]
 
-                for ty in self.get_y_range(tz):
-                    self.image_output.write_overview_tile(
-                        tx, ty, tz, dir_already_existed
-                    )
+        for tx in range(tminx, tmaxx + 1):
+            y_range = numpy.array(self.get_y_range(tz))
+            y_range = y_range[self.in_shard(numpy.full_like(y_range, tx), y_range, tz)]
+            if not len(y_range):
+                continue
+
+            dir_already_existed = self.image_output.ensure_tile_dir(tz, tx)
+
+            for ty in y_range.tolist():
+                self.image_output.write_overview_tile(
+                    tx, ty, tz, dir_already_existed
+                )
+            self.check_memory()
+
+    def check_memory(self):
+        """Track the RSS against the memory budget (if any), shrinking
+        GDAL's cache and the active workers when it's too close."""
+        if self.memory_budget is None:
+            return
+
+        def degrade(budget):
+            gdal.SetCacheMax(budget.gdal_cache)
+            self.metrics.count('memory_degradations')
+
+        self.memory_budget.check(on_degrade=degrade)
+
+    def generate_overview_tiles_from_input(self, zooms):
+        """Generation of the overview tiles reading each one directly from
+        the input raster, exactly like the base tiles. No level depends on
+        another one, so all of them are rendered together."""
+        self.render_windows([
+            (tz, self.generate_base_windows(tz)) for tz in zooms
+        ])
 
     def get_y_range(self, zoom):
         tminx, tminy, tmaxx, tmaxy = self.tminmax[zoom]
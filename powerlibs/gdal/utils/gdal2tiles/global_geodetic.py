@@ -1,8 +1,13 @@
 import math
 
+from ..lazy import lazy_import
 from .defines import MAXZOOMLEVEL
 
 
+# Only the *_array methods need numpy:
+numpy = lazy_import('numpy')
+
+
 class GlobalGeodetic:
     def __init__(self, tile_size=256):
         self.tile_size = tile_size
@@ -57,3 +62,39 @@ class GlobalGeodetic:
         "Returns bounds of the given tile in the SWNE form"
         b = self.TileBounds(tx, ty, zoom)
         return (b[1], b[0], b[3], b[2])
+
+    # -------------------------------------------------------------------------
+    # Vectorized variants: same math as above, but every argument
+    # (zoom included) may be a numpy array and results are broadcast.
+    def resolution_array(self, zoom):
+        return 180.0 / self.tile_size / numpy.exp2(zoom)
+
+    def lat_lon_to_pixels_array(self, lat, lon, zoom):
+        res = self.resolution_array(zoom)
+        return (180 + numpy.asarray(lat)) / res, (90 + numpy.asarray(lon)) / res
+
+    def pixels_to_tile_array(self, px, py):
+        tx = numpy.ceil(numpy.asarray(px) / float(self.tile_size)) - 1
+        ty = numpy.ceil(numpy.asarray(py) / float(self.tile_size)) - 1
+        return tx.astype(numpy.int64), ty.astype(numpy.int64)
+
+    def lat_lon_to_tile_array(self, lat, lon, zoom):
+        px, py = self.lat_lon_to_pixels_array(lat, lon, zoom)
+        return self.pixels_to_tile_array(px, py)
+
+    def tile_bounds_array(self, tx, ty, zoom):
+        """Bounds of many tiles at once, as a (minx, miny, maxx, maxy)
+        tuple of arrays."""
+        tx = numpy.asarray(tx, numpy.float64)
+        ty = numpy.asarray(ty, numpy.float64)
+        res = self.resolution_array(zoom)
+        return (
+            tx * self.tile_size * res - 180,
+            ty * self.tile_size * res - 90,
+            (tx + 1) * self.tile_size * res - 180,
+            (ty + 1) * self.tile_size * res - 90
+        )
+
+    def tile_lat_lon_bounds_array(self, tx, ty, zoom):
+        b = self.tile_bounds_array(tx, ty, zoom)
+        return (b[1], b[0], b[3], b[2])
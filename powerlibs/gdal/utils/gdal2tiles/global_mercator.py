@@ -1,8 +1,63 @@
 import math
 
+from ..lazy import lazy_import
 from .defines import MAXZOOMLEVEL
 
 
+# Only the *_array methods need numpy:
+numpy = lazy_import('numpy')
+
+
+def interleave_bits(tx, ty):
+    """Morton code of (tx, ty) arrays: bits of tx on the even
+    positions and bits of ty on the odd ones."""
+
+    def spread(values):
+        values = numpy.asarray(values).astype(numpy.uint64) & numpy.uint64(0xFFFFFFFF)
+        for shift, mask in (
+            (16, 0x0000FFFF0000FFFF),
+            (8, 0x00FF00FF00FF00FF),
+            (4, 0x0F0F0F0F0F0F0F0F),
+            (2, 0x3333333333333333),
+            (1, 0x5555555555555555),
+        ):
+            values = (values | (values << numpy.uint64(shift))) & numpy.uint64(mask)
+        return values
+
+    return spread(tx) | (spread(ty) << numpy.uint64(1))
+
+
+def quad_key_digits(tx, ty, zoom):
+    """QuadTree keys of arrays of tiles (with y already flipped to the
+    top-left origin), built from their interleaved bits.
+
+    `zoom` may be an array too: the tiles are then keyed level by level."""
+    zoom = numpy.asarray(zoom, numpy.int64)
+    if zoom.ndim == 0:
+        return level_quad_key_digits(tx, ty, int(zoom))
+
+    tx, ty, zoom = numpy.broadcast_arrays(tx, ty, zoom)
+    max_zoom = int(zoom.max()) if zoom.size else 0
+    keys = numpy.zeros(tx.shape, f'U{max(1, max_zoom)}')
+    for level in numpy.unique(zoom).tolist():
+        selected = zoom == level
+        keys[selected] = level_quad_key_digits(tx[selected], ty[selected], level)
+    return keys
+
+
+def level_quad_key_digits(tx, ty, zoom):
+    """quad_key_digits of tiles all at the same (scalar) zoom level."""
+    tx, ty = numpy.broadcast_arrays(tx, ty)
+    if zoom == 0:
+        return numpy.full(tx.shape, '')
+
+    codes = interleave_bits(tx, ty)
+    shifts = numpy.arange(2 * (zoom - 1), -1, -2, dtype=numpy.uint64)
+    digits = (codes[..., numpy.newaxis] >> shifts) & numpy.uint64(3)
+    digits = numpy.ascontiguousarray(digits.astype(numpy.uint8) + ord('0'))
+    return digits.view(f'S{zoom}')[..., 0].astype(str)
+
+
 class GlobalMercator:
     def __init__(self, tile_size=256):
         self.tile_size = tile_size
@@ -122,3 +177,68 @@ class GlobalMercator:
             quadKey += str(digit)
 
         return quadKey
+
+    # -------------------------------------------------------------------------
+    # Vectorized variants: same math as above, but every argument
+    # (zoom included) may be a numpy array and results are broadcast.
+    def resolution_array(self, zoom):
+        return self.initialResolution / numpy.exp2(zoom)
+
+    def lat_lon_to_meters_array(self, lat, lon):
+        lat = numpy.asarray(lat, numpy.float64)
+        lon = numpy.asarray(lon, numpy.float64)
+        mx = lon * self.originShift / 180.0
+        my = numpy.log(numpy.tan((90 + lat) * math.pi / 360.0)) / (math.pi / 180.0)
+        my = my * self.originShift / 180.0
+        return mx, my
+
+    def meters_to_lat_lon_array(self, mx, my):
+        lon = (numpy.asarray(mx, numpy.float64) / self.originShift) * 180.0
+        lat = (numpy.asarray(my, numpy.float64) / self.originShift) * 180.0
+        lat = 180 / math.pi * (2 * numpy.arctan(numpy.exp(lat * math.pi / 180.0)) - math.pi / 2.0)
+        return lat, lon
+
+    def pixels_to_meters_array(self, px, py, zoom):
+        res = self.resolution_array(zoom)
+        return px * res - self.originShift, py * res - self.originShift
+
+    def meters_to_pixels_array(self, mx, my, zoom):
+        res = self.resolution_array(zoom)
+        return (mx + self.originShift) / res, (my + self.originShift) / res
+
+    def pixels_to_tile_array(self, px, py):
+        tx = numpy.ceil(numpy.asarray(px) / float(self.tile_size)) - 1
+        ty = numpy.ceil(numpy.asarray(py) / float(self.tile_size)) - 1
+        return tx.astype(numpy.int64), ty.astype(numpy.int64)
+
+    def meters_to_tile_array(self, mx, my, zoom):
+        px, py = self.meters_to_pixels_array(mx, my, zoom)
+        return self.pixels_to_tile_array(px, py)
+
+    def tile_bounds_array(self, tx, ty, zoom):
+        """Bounds of many tiles at once, as a (minx, miny, maxx, maxy)
+        tuple of arrays."""
+        tx = numpy.asarray(tx, numpy.float64)
+        ty = numpy.asarray(ty, numpy.float64)
+        minx, miny = self.pixels_to_meters_array(
+            tx * self.tile_size, ty * self.tile_size, zoom
+        )
+        maxx, maxy = self.pixels_to_meters_array(
+            (tx + 1) * self.tile_size, (ty + 1) * self.tile_size, zoom
+        )
+        return minx, miny, maxx, maxy
+
+    def tile_lat_lon_bounds_array(self, tx, ty, zoom):
+        minx, miny, maxx, maxy = self.tile_bounds_array(tx, ty, zoom)
+        min_lat, min_lon = self.meters_to_lat_lon_array(minx, miny)
+        max_lat, max_lon = self.meters_to_lat_lon_array(maxx, maxy)
+        return min_lat, min_lon, max_lat, max_lon
+
+    def google_tile_array(self, tx, ty, zoom):
+        return numpy.asarray(tx), (numpy.exp2(zoom).astype(numpy.int64) - 1) - ty
+
+    def quad_tree_array(self, tx, ty, zoom):
+        "Microsoft QuadTree keys (as a numpy string array) of many tiles"
+        zoom = numpy.asarray(zoom, numpy.int64)
+        ty = (numpy.left_shift(1, zoom) - 1) - numpy.asarray(ty, numpy.int64)
+        return quad_key_digits(tx, ty, zoom)
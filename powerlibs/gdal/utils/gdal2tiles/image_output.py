@@ -2,32 +2,91 @@ import logging
 from pathlib import PosixPath
 import os
 
+import numpy
 from osgeo import gdal
 
-from .utils import get_gdal_driver
+from ..lazy import lazy_import
+from .metrics import Metrics
+from .nodata import get_band_values
+from .resampler import composite_over_file
+from .utils import ensure_dir_exists, get_gdal_driver
 
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING'))
+
+gdal_array = lazy_import('osgeo.gdal_array')
 
 
 def get_tile_filename(tx, ty, tz, extension):
     return os.path.join(str(tz), str(tx), "%s.%s" % (ty, extension))
 
 
+class SharedWindow:
+    """Alpha and data bands of the window of a base tile, each one read
+    (on first use) only once for every output rendered from it."""
+
+    def __init__(self, output, xyzzy, bands_count):
+        self.output = output
+        self.xyzzy = xyzzy
+        self.bands_count = bands_count
+        self.values = {}
+
+    def get(self, name, read):
+        if name not in self.values:
+            self.values[name] = read()
+        return self.values[name]
+
+    @property
+    def alpha(self):
+        return self.get('alpha', lambda: self.output.read_alpha(self.xyzzy))
+
+    @property
+    def source(self):
+        return self.get(
+            'source', lambda: self.output.read_source(self.xyzzy, self.bands_count)
+        )
+
+
 class BaseImageOutput:
     """Base class for image output."""
 
     def __init__(
         self, out_ds, tile_size, resampler, write_method,
-        nodata, output_dir
+        nodata, output_dir, mosaic=None, colorizer=None, terrain=None,
+        metrics=None, nodata_mask=None, policy=None
     ):
         self.out_ds = out_ds
         self.tile_size = tile_size
         self.resampler = resampler
         self.write_method = write_method
+
+        # Resampler and encoder by zoom level (a policy.ResamplingPolicy),
+        # instead of `resampler` and the default encoder everywhere
+        self.policy = policy
         self.nodata = nodata
-        self.output_dir = PosixPath(output_dir)
+        self.output_dir = PosixPath(output_dir) if output_dir is not None else None
+
+        # Timers and counters (see metrics.Metrics) of the tile being
+        # written, by zoom level (None when rendering single tiles)
+        self.metrics = metrics or Metrics()
+        self.zoom = None
+
+        # Multi-source input: out_ds only holds the grid and the tiles
+        # are read from the sources, with handles shared between tiles
+        self.mosaic = mosaic
+        self.mosaic_handles = None
+        self.mosaic_window = None
+
+        # Non-Byte input (e.g. a DSM) rendered by a colorize.Colorizer,
+        # or paletted input expanded by a colorize.ColorTable
+        self.colorizer = colorizer
+
+        # Elevation tiles (a terrain.TerrainRGB encoding) instead of imagery
+        self.terrain = terrain
+
+        # Which pixels are NODATA (a nodata.NodataMask), computed from the
+        # data bands instead of reading GDAL's mask band
+        self.nodata_mask = nodata_mask
 
         self.mem_drv = get_gdal_driver("MEM")
         self.alpha_filler = None
@@ -56,24 +115,90 @@ class BaseImageOutput:
             logger.debug("NO ALPHA CHANNEL")
             self.data_bands_count = self.out_ds.RasterCount
 
-    def create_base_tile(self, tx, ty, tz, xyzzy, alpha):
+        # Data bands of the input (see read_source), whatever the tiles have:
+        self.source_bands_count = self.data_bands_count
+        self.data_type = self.out_ds.GetRasterBand(1).DataType
+
+        # Without an alpha band, the alpha comes from the data already
+        # read (see read_query) or, if every pixel is valid, isn't read:
+        self.alpha_from_nodata = (
+            not has_alpha and nodata_mask is not None and mosaic is None
+        )
+        self.all_valid = (
+            not has_alpha and not self.alpha_from_nodata
+            and bool(self.alpha_band.GetMaskFlags() & gdal.GMF_ALL_VALID)
+        )
+
+        # Colorized and elevation tiles always have an alpha band:
+        if self.terrain is not None:
+            self.data_bands_count = 3
+            self.alpha_filler = "\xff" * (self.tile_size * self.tile_size)
+        elif self.colorizer is not None:
+            self.data_bands_count = self.colorizer.bands_count
+            self.alpha_filler = "\xff" * (self.tile_size * self.tile_size)
+
+    @property
+    def source_bands_needed(self):
+        """How many data bands of the input the tiles are rendered from."""
+        if self.terrain is not None or self.colorizer is not None:
+            return 1
+        return self.source_bands_count
+
+    def create_base_tile(self, tx, ty, tz, xyzzy, alpha, source=None):
         """Create image of a base level tile and write it to disk."""
         path = self.get_full_path(tx, ty, tz, 'png')
+        dstile = self.render_base_tile(xyzzy, alpha, source)
+        logger.info(f'saving base tile: {path}')
+        self.write_tile(path, dstile)
+
+    def write_tile(self, path, dstile):
+        if getattr(self.get_resampler(), 'over_existing', False) and path.exists():
+            dstile = composite_over_file(dstile, path)
+
+        options = self.policy.get(self.zoom).encoder_options if self.policy else None
+        with self.metrics.timer('write', self.zoom):
+            if options:
+                self.write_method(path, dstile, options)
+            else:
+                self.write_method(path, dstile)
+        self.metrics.count('tiles', 1, self.zoom)
+        self.metrics.count('bytes_written', path.stat().st_size, self.zoom)
+
+    def render_base_tile(self, xyzzy, alpha, source=None):
+        """Read the window of a tile from the input raster and return
+        the tile image as a MEM dataset."""
+        return self.scale_query(self.read_query(xyzzy, alpha, source))
+
+    def read_query(self, xyzzy, alpha, source=None):
+        """Read the window of a tile into a querysize x querysize MEM
+        dataset (or (heights, mask) arrays, for elevation tiles), which
+        scale_query turns into the tile.
+
+        `source` is the window as already read by read_source (for
+        another output, with at least source_bands_needed bands)."""
+        # (unless the colorizer reads a larger window, see read_colorized)
+        needs_apron = self.colorizer is not None and self.colorizer.needs_apron
+        if source is None and not needs_apron:
+            source = self.read_source(xyzzy, self.source_bands_needed)
+
+        if self.terrain is not None:
+            return self.read_terrain_query(xyzzy, alpha, source)
+
+        data_bands = list(range(1, self.data_bands_count + 1))
+        if self.colorizer is not None:
+            data, alpha = self.read_colorized(xyzzy, alpha, source)
+        else:
+            data = self.get_source_bands(xyzzy, source, self.data_bands_count)
+            if self.alpha_from_nodata:
+                with self.metrics.timer('nodata', self.zoom):
+                    alpha = self.nodata_mask.get_alpha(
+                        data, self.data_type, xyzzy.wxsize, xyzzy.wysize
+                    )
 
         num_bands = self.data_bands_count
         if alpha is not None:
             num_bands += 1
 
-        data_bands = list(range(1, self.data_bands_count + 1))
-
-        dstile = self.mem_drv.Create(
-            '', self.tile_size, self.tile_size, num_bands
-        )
-        data = self.out_ds.ReadRaster(
-            xyzzy.rx, xyzzy.ry, xyzzy.rxsize, xyzzy.rysize,
-            xyzzy.wxsize, xyzzy.wysize, band_list=data_bands
-        )
-
         """
         ReadRaster call signature:
         ReadRaster(
@@ -88,59 +213,91 @@ class BaseImageOutput:
         """
 
         # Query is in 'nearest neighbour' but can be bigger than the tile_size.
-        # We scale down the query to the tile_size by supplied algorithm.
-        if self.tile_size == xyzzy.querysize:
-            # Use the ReadRaster result directly in tiles ('nearest neighbour' query)
-            dstile.WriteRaster(
+        # scale_query scales it down to the tile_size by supplied algorithm.
+        dsquery = self.mem_drv.Create(
+            '', xyzzy.querysize, xyzzy.querysize, num_bands
+        )
+
+        if alpha is None and xyzzy.querysize != self.tile_size:
+            nodata_values = get_band_values(self.nodata, self.data_bands_count)
+            for band_index, nodata in enumerate(nodata_values):
+                if nodata is not None:
+                    dsquery.GetRasterBand(band_index + 1).Fill(nodata)
+
+        dsquery.WriteRaster(
+            xyzzy.wx, xyzzy.wy,
+            xyzzy.wxsize, xyzzy.wysize,
+            data, band_list=data_bands
+        )
+        if alpha is not None:
+            dsquery.WriteRaster(
                 xyzzy.wx, xyzzy.wy,
                 xyzzy.wxsize, xyzzy.wysize,
-                data, band_list=data_bands
+                alpha, band_list=[num_bands]
             )
-            if alpha is not None:
-                dstile.WriteRaster(
-                    xyzzy.wx, xyzzy.wy,
-                    xyzzy.wxsize, xyzzy.wysize,
-                    alpha, band_list=[num_bands]
-                )
 
-            logger.info(f'saving base tile: {path}')
-            self.write_method(path, dstile, 'PNG')
+        # Note: For source drivers based on WaveLet compression (JPEG2000, ECW, MrSID)
+        # the ReadRaster function returns high-quality raster (not ugly nearest neighbour)
+        # TODO: Use directly 'near' for WaveLet files
+        return dsquery
 
-            # Note: For source drivers based on WaveLet compression (JPEG2000, ECW, MrSID)
-            # the ReadRaster function returns high-quality raster (not ugly nearest neighbour)
-            # TODO: Use directly 'near' for WaveLet files
-        else:
-            # Big ReadRaster query in memory scaled to the tile_size - all but 'near' algo
-            dsquery = self.mem_drv.Create(
-                '', xyzzy.querysize, xyzzy.querysize, num_bands
-            )
+    def scale_query(self, dsquery):
+        """Scale a query (of read_query or compose_children, possibly
+        of an output with another tile size) down into the tile image."""
+        if self.terrain is not None:
+            return self.scale_terrain_query(dsquery)
 
-            if alpha is None:
-                for band_index in range(self.data_bands_count):
-                    dsquery.GetRasterBand(band_index + 1).Fill(self.nodata)
+        # A query of the tile_size is used directly as the tile:
+        if dsquery.RasterXSize == self.tile_size:
+            return dsquery
 
-            dsquery.WriteRaster(
-                xyzzy.wx, xyzzy.wy,
-                xyzzy.wxsize, xyzzy.wysize,
-                data, band_list=data_bands
-            )
-            if alpha is not None:
-                dsquery.WriteRaster(
-                    xyzzy.wx, xyzzy.wy,
-                    xyzzy.wxsize, xyzzy.wysize,
-                    alpha, band_list=[num_bands]
-                )
-            logger.info(f'saving resampled base tile: {path}')
-            self.resampler(path, dsquery, dstile)
+        dstile = self.mem_drv.Create(
+            '', self.tile_size, self.tile_size, dsquery.RasterCount
+        )
+        with self.metrics.timer('resample', self.zoom):
+            self.get_resampler()(dsquery, dstile)
+        return dstile
+
+    def get_resampler(self):
+        if self.policy is None:
+            return self.resampler
+        return self.policy.get(self.zoom).get_resampler()
 
     def write_overview_tile(self, tx, ty, tz, precheck_existence=True):
         """Create image of a overview level tile and write it to disk."""
 
+        self.zoom = tz
         path = self.get_full_path(tx, ty, tz, 'png')
         if precheck_existence and path.exists():
             logger.info(f'write_overview_tile: {path} already exists. Skipping.')
+            self.metrics.count('skipped', 1, tz)
             return
 
+        children = self.open_children(tx, ty, tz)
+        dstile = self.render_overview_tile(tx, ty, children)
+        logger.info(f'saving overview tile: {path}')
+        self.write_tile(path, dstile)
+
+    def open_children(self, tx, ty, tz):
+        return (
+            (cx, cy, gdal.Open(
+                str(self.get_full_path(cx, cy, tz + 1, 'png')),
+                gdal.GA_ReadOnly
+            ))
+            for cx, cy in self.iter_children(tx, ty, tz)
+        )
+
+    def render_overview_tile(self, tx, ty, children):
+        """Compose the given (cx, cy, dataset) children of a tile
+        and scale them down into the tile image (a MEM dataset)."""
+        return self.scale_query(self.compose_children(tx, ty, children))
+
+    def compose_children(self, tx, ty, children):
+        """Compose the given (cx, cy, dataset) children of a tile into a
+        query of twice the tile_size (as in read_query)."""
+        if self.terrain is not None:
+            return self.compose_terrain_children(tx, ty, children)
+
         num_bands = self.data_bands_count + 1
 
         dsquery = self.mem_drv.Create(
@@ -150,22 +307,15 @@ class BaseImageOutput:
         # Fill alpha band with zeroes (why? IDK)
         dsquery.GetRasterBand(num_bands).Fill(0)
 
-        for cx, cy in self.iter_children(tx, ty, tz):
+        for cx, cy, dsquerytile in children:
+            tileposx = self.get_tileposx(tx, cx)
             tileposy = self.get_tileposy(ty, cy)
-            if tx:
-                tileposx = cx % (2 * tx) * self.tile_size
-            elif tx == 0 and cx == 1:
-                tileposx = self.tile_size
-            else:
-                tileposx = 0
 
-            origin_path = self.get_full_path(
-                cx, cy, tz + 1, 'png'
-            )
-            dsquerytile = gdal.Open(str(origin_path), gdal.GA_ReadOnly)
-            dsdata = dsquerytile.ReadRaster(
-                0, 0, self.tile_size, self.tile_size
-            )
+            with self.metrics.timer('read', self.zoom):
+                dsdata = dsquerytile.ReadRaster(
+                    0, 0, self.tile_size, self.tile_size
+                )
+            self.metrics.count('bytes_read', len(dsdata), self.zoom)
 
             dsquery.WriteRaster(
                 tileposx, tileposy, self.tile_size, self.tile_size,
@@ -179,11 +329,70 @@ class BaseImageOutput:
                     self.alpha_filler, band_list=[num_bands]
                 )
 
-        dstile = self.mem_drv.Create(
-            '', self.tile_size, self.tile_size, num_bands
+        return dsquery
+
+    def read_terrain_query(self, xyzzy, alpha, source):
+        values, valid = self.read_values(xyzzy, alpha, source)
+
+        # Place the window inside the query (reduced by scale_query):
+        size = xyzzy.querysize
+        heights = numpy.zeros((size, size))
+        mask = numpy.zeros((size, size), bool)
+        window = (
+            slice(xyzzy.wy, xyzzy.wy + xyzzy.wysize),
+            slice(xyzzy.wx, xyzzy.wx + xyzzy.wxsize),
         )
-        logger.info(f'saving overview tile: {path}')
-        self.resampler(path, dsquery, dstile)
+        heights[window] = values
+        mask[window] = valid
+        return heights, mask
+
+    def compose_terrain_children(self, tx, ty, children):
+        size = 2 * self.tile_size
+        heights = numpy.zeros((size, size))
+        mask = numpy.zeros((size, size), bool)
+
+        for cx, cy, dsquerytile in children:
+            tileposx = self.get_tileposx(tx, cx)
+            tileposy = self.get_tileposy(ty, cy)
+            with self.metrics.timer('read', self.zoom):
+                bands = dsquerytile.ReadAsArray()
+            self.metrics.count('bytes_read', bands.nbytes, self.zoom)
+            alpha = bands[3] if len(bands) > 3 else None
+            window = (
+                slice(tileposy, tileposy + self.tile_size),
+                slice(tileposx, tileposx + self.tile_size),
+            )
+            heights[window], mask[window] = self.terrain.decode(bands, alpha)
+        return heights, mask
+
+    def scale_terrain_query(self, query):
+        heights, mask = query
+        with self.metrics.timer('resample', self.zoom):
+            heights, mask = self.terrain.reduce(
+                heights, mask, len(heights) // self.tile_size
+            )
+        return self.create_terrain_tile(heights, mask)
+
+    def create_terrain_tile(self, heights, valid):
+        rgb, alpha = self.terrain.encode(heights, valid)
+        dstile = self.mem_drv.Create('', self.tile_size, self.tile_size, 4)
+        dstile.WriteRaster(
+            0, 0, self.tile_size, self.tile_size,
+            rgb.tobytes(), band_list=[1, 2, 3]
+        )
+        dstile.WriteRaster(
+            0, 0, self.tile_size, self.tile_size,
+            alpha.tobytes(), band_list=[4]
+        )
+        return dstile
+
+    def get_tileposx(self, tx, cx):
+        if tx:
+            return cx % (2 * tx) * self.tile_size
+        elif tx == 0 and cx == 1:
+            return self.tile_size
+        else:
+            return 0
 
     def get_tileposy(self, ty, cy):
         if (ty == 0 and cy == 1) or (ty != 0 and (cy % (2 * ty)) != 0):
@@ -199,15 +408,138 @@ class BaseImageOutput:
                 if self.tile_exists(x, y, tz + 1):
                     yield x, y
 
+    def read_source(self, xyzzy, bands_count):
+        """Read the first `bands_count` data bands of the window of a
+        tile, band sequential and in the data type of the input."""
+        if self.mosaic is not None:
+            return self.read_mosaic_window(xyzzy)[0]
+
+        with self.metrics.timer('read', self.zoom):
+            data = self.out_ds.ReadRaster(
+                xyzzy.rx, xyzzy.ry, xyzzy.rxsize, xyzzy.rysize,
+                xyzzy.wxsize, xyzzy.wysize,
+                band_list=list(range(1, bands_count + 1))
+            )
+        self.metrics.count('bytes_read', len(data), self.zoom)
+        return data
+
+    def get_source_bands(self, xyzzy, source, bands_count):
+        """The first `bands_count` bands of a read_source buffer."""
+        band_size = xyzzy.wxsize * xyzzy.wysize * gdal.GetDataTypeSize(self.data_type) // 8
+        return source[:band_size * bands_count]
+
+    def read_values(self, xyzzy, alpha, source):
+        """The first band (of a read_source buffer) as floats (or as
+        integers, for palette indices), with its validity mask."""
+        dtype = numpy.float64
+        if self.colorizer is not None and self.colorizer.indexed:
+            dtype = numpy.uint16
+
+        shape = (xyzzy.wysize, xyzzy.wxsize)
+        source_dtype = gdal_array.GDALTypeCodeToNumericTypeCode(self.data_type)
+        values = numpy.frombuffer(
+            source, source_dtype, xyzzy.wxsize * xyzzy.wysize
+        ).reshape(shape).astype(dtype)
+
+        valid = numpy.isfinite(values)
+        if self.nodata_mask is not None:
+            valid &= ~self.nodata_mask.match_band(values, 0)
+        if alpha is not None:
+            valid &= numpy.frombuffer(alpha, numpy.uint8).reshape(shape) > 0
+        return values, valid
+
+    def read_colorized(self, xyzzy, alpha, source):
+        """Colorize the first band into (data, alpha) bytes."""
+        # Ground size of the (possibly scaled) pixels of the window:
+        gt = self.out_ds.GetGeoTransform()
+        resolution = (
+            abs(gt[1]) * xyzzy.rxsize / xyzzy.wxsize,
+            abs(gt[5]) * xyzzy.rysize / xyzzy.wysize,
+        )
+
+        if self.colorizer.needs_apron:
+            apron_xyzzy, crop = self.get_apron_window(xyzzy)
+            alpha = self.read_alpha(apron_xyzzy)
+            source = self.read_source(apron_xyzzy, 1)
+            values, valid = self.read_values(apron_xyzzy, alpha, source)
+            with self.metrics.timer('colorize', self.zoom):
+                bands, alpha = self.colorizer.render(values, valid, resolution, crop)
+        else:
+            values, valid = self.read_values(xyzzy, alpha, source)
+            with self.metrics.timer('colorize', self.zoom):
+                bands, alpha = self.colorizer.render(values, valid, resolution)
+        return bands.tobytes(), alpha.tobytes()
+
+    def get_apron_window(self, xyzzy):
+        """The window of a tile grown by one (scaled) pixel on each side
+        still inside the input, with the (rows, columns) slices of the
+        tile window inside it.
+
+        The offsets are fractional when the window is scaled by a
+        non-integer factor, which ReadRaster supports."""
+        def get_scale(size, buffer_size):
+            if size % buffer_size == 0:
+                return size // buffer_size
+            return size / buffer_size
+
+        scale_x = get_scale(xyzzy.rxsize, xyzzy.wxsize)
+        scale_y = get_scale(xyzzy.rysize, xyzzy.wysize)
+        left = int(xyzzy.rx - scale_x >= 0)
+        top = int(xyzzy.ry - scale_y >= 0)
+        right = int(xyzzy.rx + xyzzy.rxsize + scale_x <= self.out_ds.RasterXSize)
+        bottom = int(xyzzy.ry + xyzzy.rysize + scale_y <= self.out_ds.RasterYSize)
+
+        apron_xyzzy = xyzzy._replace(
+            rx=xyzzy.rx - left * scale_x,
+            ry=xyzzy.ry - top * scale_y,
+            rxsize=xyzzy.rxsize + (left + right) * scale_x,
+            rysize=xyzzy.rysize + (top + bottom) * scale_y,
+            wxsize=xyzzy.wxsize + left + right,
+            wysize=xyzzy.wysize + top + bottom,
+        )
+        crop = (
+            slice(top, top + xyzzy.wysize),
+            slice(left, left + xyzzy.wxsize),
+        )
+        return apron_xyzzy, crop
+
+    def read_mosaic_window(self, xyzzy):
+        # Data and alpha come from the same compositing, so the
+        # last window is kept for the read following read_alpha()
+        if self.mosaic_window is None or self.mosaic_window[0] != xyzzy:
+            if self.mosaic_handles is None:
+                self.mosaic_handles = self.mosaic.open_sources()
+            with self.metrics.timer('read', self.zoom):
+                data, alpha = self.mosaic.read_window(
+                    self.mosaic_handles, xyzzy, self.data_bands_count
+                )
+            self.metrics.count('bytes_read', len(data) + len(alpha), self.zoom)
+            self.mosaic_window = (xyzzy, data, alpha)
+        return self.mosaic_window[1:]
+
     def read_alpha(self, xyzzy):
-        if self.alpha_band is None:
+        if self.mosaic is not None:
+            return self.read_mosaic_window(xyzzy)[1]
+
+        if self.alpha_band is None or self.alpha_from_nodata:
             return None
 
-        return self.alpha_band.ReadRaster(
-            xyzzy.rx, xyzzy.ry,
-            xyzzy.rxsize, xyzzy.rysize,
-            xyzzy.wxsize, xyzzy.wysize
-        )
+        if self.all_valid:
+            return b'\xff' * (xyzzy.wxsize * xyzzy.wysize)
+
+        with self.metrics.timer('read', self.zoom):
+            alpha = self.alpha_band.ReadRaster(
+                xyzzy.rx, xyzzy.ry,
+                xyzzy.rxsize, xyzzy.rysize,
+                xyzzy.wxsize, xyzzy.wysize
+            )
+        self.metrics.count('bytes_read', len(alpha), self.zoom)
+        return alpha
+
+    def ensure_tile_dir(self, tz, tx):
+        """Create the directory of a column of tiles, returning
+        whether it already existed."""
+        return ensure_dir_exists(self.output_dir / str(tz) / str(tx))
 
     def tile_exists(self, tx, ty, tz):
         return self.get_full_path(
@@ -222,13 +554,156 @@ class BaseImageOutput:
 class SimpleImageOutput(BaseImageOutput):
     """Image output using only one image format."""
 
-    def write_base_tile(self, tx, ty, tz, xyzzy, precheck_existence=True):
+    def write_base_tile(self, tx, ty, tz, xyzzy, precheck_existence=True, window=None):
+        """Write a base tile, rendered from the given SharedWindow (if
+        the window is shared with other outputs) or read for it alone."""
+        self.zoom = tz
         if precheck_existence:
             path = self.get_full_path(tx, ty, tz, 'png')
             if path.exists():
                 logger.info(
                     f'write_base_tile: {path} already exists. Skipping.'
                 )
+                self.metrics.count('skipped', 1, tz)
                 return
-        alpha = self.read_alpha(xyzzy)
-        self.create_base_tile(tx, ty, tz, xyzzy, alpha)
+        if window is None:
+            window = SharedWindow(self, xyzzy, self.source_bands_needed)
+        self.create_base_tile(tx, ty, tz, xyzzy, window.alpha, window.source)
+
+
+class MultiSizeImageOutput:
+    """The same tiles at several sizes (e.g. 256 and 512 pixels, for
+    HiDPI screens) written from one traversal.
+
+    Every size is a power of two multiple of the first (smallest) one,
+    whose pyramid is traversed: the tiles of every size with the same
+    coordinates cover the same ground. Base tiles of every size are
+    scaled from the same read of the input (so querysize must be at
+    least the largest size), and the composed children of an overview
+    tile of the first size are, as they are, the tile of twice its size.
+    Other sizes compose their own children."""
+
+    def __init__(self, outputs):
+        self.outputs = sorted(outputs, key=lambda output: output.tile_size)
+        self.primary = self.outputs[0]
+
+    @property
+    def zoom(self):
+        return self.primary.zoom
+
+    @zoom.setter
+    def zoom(self, zoom):
+        for output in self.outputs:
+            output.zoom = zoom
+
+    def get_missing(self, tx, ty, tz, precheck_existence):
+        """Outputs the given tile must still be written to."""
+        missing = []
+        for output in self.outputs:
+            if precheck_existence and output.tile_exists(tx, ty, tz):
+                output.metrics.count('skipped', 1, tz)
+            else:
+                missing.append(output)
+        return missing
+
+    @property
+    def source_bands_needed(self):
+        return self.primary.source_bands_needed
+
+    def write_base_tile(self, tx, ty, tz, xyzzy, precheck_existence=True, window=None):
+        self.zoom = tz
+        outputs = self.get_missing(tx, ty, tz, precheck_existence)
+        if not outputs:
+            return
+
+        if window is None:
+            window = SharedWindow(self.primary, xyzzy, self.source_bands_needed)
+        query = self.primary.read_query(xyzzy, window.alpha, window.source)
+        for output in outputs:
+            path = output.get_full_path(tx, ty, tz, 'png')
+            output.write_tile(path, output.scale_query(query))
+
+    def write_overview_tile(self, tx, ty, tz, precheck_existence=True):
+        self.zoom = tz
+        outputs = self.get_missing(tx, ty, tz, precheck_existence)
+        composed = [
+            output for output in outputs
+            if output.tile_size in (self.primary.tile_size, 2 * self.primary.tile_size)
+        ]
+
+        if composed:
+            query = self.primary.compose_children(
+                tx, ty, self.primary.open_children(tx, ty, tz)
+            )
+            for output in composed:
+                path = output.get_full_path(tx, ty, tz, 'png')
+                output.write_tile(path, output.scale_query(query))
+
+        for output in outputs:
+            if output not in composed:
+                output.write_overview_tile(tx, ty, tz, precheck_existence=False)
+
+    def ensure_tile_dir(self, tz, tx):
+        existed = [output.ensure_tile_dir(tz, tx) for output in self.outputs]
+        return all(existed)
+
+    def read_alpha(self, xyzzy):
+        return self.primary.read_alpha(xyzzy)
+
+    def read_source(self, xyzzy, bands_count):
+        return self.primary.read_source(xyzzy, bands_count)
+
+    def render_base_tile(self, xyzzy, alpha, source=None):
+        return self.primary.render_base_tile(xyzzy, alpha, source)
+
+    def render_overview_tile(self, tx, ty, children):
+        return self.primary.render_overview_tile(tx, ty, children)
+
+
+class MultiImageOutput:
+    """Several products (e.g. visual and terrain tiles) written from the
+    same traversal, the same window computations and the same read of
+    each base tile window (see SharedWindow).
+
+    The tiles streamed or served one by one (`render_*` methods) are the
+    ones of the first output."""
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.primary = outputs[0]
+
+    @property
+    def zoom(self):
+        return self.primary.zoom
+
+    @zoom.setter
+    def zoom(self, zoom):
+        for output in self.outputs:
+            output.zoom = zoom
+
+    def write_base_tile(self, tx, ty, tz, xyzzy, precheck_existence=True):
+        self.zoom = tz
+        bands_count = max(output.source_bands_needed for output in self.outputs)
+        window = SharedWindow(self.primary, xyzzy, bands_count)
+        for output in self.outputs:
+            output.write_base_tile(tx, ty, tz, xyzzy, precheck_existence, window)
+
+    def write_overview_tile(self, tx, ty, tz, precheck_existence=True):
+        for output in self.outputs:
+            output.write_overview_tile(tx, ty, tz, precheck_existence)
+
+    def ensure_tile_dir(self, tz, tx):
+        existed = [output.ensure_tile_dir(tz, tx) for output in self.outputs]
+        return all(existed)
+
+    def read_alpha(self, xyzzy):
+        return self.primary.read_alpha(xyzzy)
+
+    def read_source(self, xyzzy, bands_count):
+        return self.primary.read_source(xyzzy, bands_count)
+
+    def render_base_tile(self, xyzzy, alpha, source=None):
+        return self.primary.render_base_tile(xyzzy, alpha, source)
+
+    def render_overview_tile(self, tx, ty, children):
+        return self.primary.render_overview_tile(tx, ty, children)
@@ -0,0 +1,163 @@
+import os
+import resource
+import sys
+import threading
+
+
+# How the budget is shared (the rest goes to the workers and the queues):
+GDAL_CACHE_SHARE = 0.4
+WARP_MEMORY_SHARE = 0.2
+
+# RSS above this fraction of the budget makes the job degrade:
+PRESSURE_THRESHOLD = 0.9
+
+# Checks to skip after degrading, so each step has time to take effect:
+DEGRADE_COOLDOWN = 16
+
+# The queue of encoded tiles never shrinks below:
+MIN_QUEUE_SIZE = 4
+
+# Tiles kept in the async queue are encoded PNGs, a fraction of their
+# raw size; this is a conservative average:
+ENCODED_TILE_RATIO = 0.5
+
+
+def get_rss():
+    """Current resident set size of this process, in bytes, or None
+    where it can't be read (outside Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def get_peak_rss():
+    """Peak resident set size of this process, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # (in bytes on macOS, in kilobytes elsewhere)
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def get_worker_memory(querysize, tile_size, bands, sample_size=8):
+    """Rough peak memory of rendering one tile: the query buffer (as
+    read and inside the MEM dataset), the tile and the 2x2 children of
+    an overview tile, with `sample_size` bytes per sample at worst."""
+    query = querysize * querysize * bands * sample_size
+    tile = tile_size * tile_size * bands
+    return 2 * query + 5 * tile
+
+
+class Throttle:
+    """Semaphore whose limit can be lowered while it's in use, so
+    a running thread pool can be made to use fewer workers."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def __exit__(self, *args):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def reduce(self):
+        with self.condition:
+            self.limit = max(1, self.limit // 2)
+            return self.limit
+
+
+class MemoryBudget:
+    """Split of a job's memory budget (in bytes) between GDAL's block
+    cache, the warper, the rendering workers and the queues, plus the
+    tracking of the peak RSS against it.
+
+    When the RSS gets close to the budget, the job degrades instead of
+    growing further: GDAL's cache and the queue of encoded tiles are
+    halved and fewer workers render at once (see `check`)."""
+
+    def __init__(self, budget):
+        self.budget = int(budget)
+        self.gdal_cache = int(self.budget * GDAL_CACHE_SHARE)
+        self.warp_memory = int(self.budget * WARP_MEMORY_SHARE)
+        self.available = self.budget - self.gdal_cache - self.warp_memory
+
+        self.workers = 1
+        self.queue_size = 64
+        self.throttle = Throttle(1)
+
+        self.peak_rss = 0
+        self.degradations = 0
+        self.cooldown = 0
+        self.lock = threading.Lock()
+
+    def plan(self, workers, querysize, tile_size, bands):
+        """Fit the number of workers and the queue size in the memory
+        left after the GDAL cache and the warper."""
+        worker_memory = get_worker_memory(querysize, tile_size, bands)
+        self.workers = max(1, min(workers, self.available // worker_memory))
+
+        left = self.available - self.workers * worker_memory
+        tile_bytes = tile_size * tile_size * bands * ENCODED_TILE_RATIO
+        self.queue_size = int(max(MIN_QUEUE_SIZE, min(64, left // tile_bytes)))
+
+        self.throttle = Throttle(self.workers)
+        return self.workers
+
+    def get_chunk_size(self, workers, bands, sample_size=1, maximum=2048):
+        """Largest (power of two) chunk size letting the 2 chunks per
+        worker of a materialized warp fit in the warp memory."""
+        chunk_size = maximum
+        while chunk_size > 256:
+            chunk_bytes = chunk_size * chunk_size * bands * sample_size
+            if 2 * workers * chunk_bytes <= self.warp_memory:
+                break
+            chunk_size //= 2
+        return chunk_size
+
+    def check(self, on_degrade=None):
+        """Track the RSS, degrading the job when it's over the
+        threshold. Returns whether it degraded.
+
+        Where only the peak RSS is available, a single crossing would
+        keep degrading the job after every cooldown, so the peak is
+        only recorded."""
+        rss = get_rss()
+        with self.lock:
+            if rss is None:
+                self.peak_rss = max(self.peak_rss, get_peak_rss())
+                return False
+            self.peak_rss = max(self.peak_rss, rss)
+            if self.cooldown:
+                self.cooldown -= 1
+                return False
+            if rss < self.budget * PRESSURE_THRESHOLD:
+                return False
+            self.cooldown = DEGRADE_COOLDOWN
+            self.degradations += 1
+            self.gdal_cache = max(16 * 1024 * 1024, self.gdal_cache // 2)
+            self.queue_size = max(MIN_QUEUE_SIZE, self.queue_size // 2)
+
+        self.throttle.reduce()
+        if on_degrade is not None:
+            on_degrade(self)
+        return True
+
+    def report(self):
+        return {
+            'budget': self.budget,
+            'gdal_cache': self.gdal_cache,
+            'warp_memory': self.warp_memory,
+            'workers': self.workers,
+            'current_workers': self.throttle.limit,
+            'queue_size': self.queue_size,
+            'peak_rss': self.peak_rss,
+            'degradations': self.degradations,
+        }
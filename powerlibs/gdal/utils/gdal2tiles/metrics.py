@@ -0,0 +1,81 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+
+class Metrics:
+    """Per-stage timers and counters of a tiling run, broken down by zoom
+    level, shared by every rendering thread.
+
+    Each hook is called as hook(kind, name, value, zoom) for every
+    measurement, with kind being 'time' (value in seconds) or 'count',
+    so they can forward the values to an external metrics system."""
+
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # (stage, zoom) -> [calls, seconds]
+            self.timers = defaultdict(lambda: [0, 0.0])
+            # (name, zoom) -> value
+            self.counters = defaultdict(int)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def timer(self, stage, zoom=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, zoom)
+
+    def add_time(self, stage, seconds, zoom=None):
+        with self.lock:
+            timer = self.timers[(stage, zoom)]
+            timer[0] += 1
+            timer[1] += seconds
+        for hook in self.hooks:
+            hook('time', stage, seconds, zoom)
+
+    def count(self, name, value=1, zoom=None):
+        with self.lock:
+            self.counters[(name, zoom)] += value
+        for hook in self.hooks:
+            hook('count', name, value, zoom)
+
+    def report(self):
+        """Totals and per-zoom breakdown, as a JSON-serializable dict."""
+        with self.lock:
+            timers = dict(self.timers)
+            counters = dict(self.counters)
+
+        def empty():
+            return {'stages': {}, 'counters': {}}
+
+        totals = empty()
+        zooms = defaultdict(empty)
+        for (stage, zoom), (calls, seconds) in sorted(timers.items(), key=str):
+            for target in (totals, zooms[zoom]) if zoom is not None else (totals,):
+                entry = target['stages'].setdefault(stage, {'calls': 0, 'seconds': 0.0})
+                entry['calls'] += calls
+                entry['seconds'] += seconds
+        for (name, zoom), value in sorted(counters.items(), key=str):
+            for target in (totals, zooms[zoom]) if zoom is not None else (totals,):
+                target['counters'][name] = target['counters'].get(name, 0) + value
+
+        totals['zooms'] = {str(zoom): zooms[zoom] for zoom in sorted(zooms)}
+        return totals
+
+    def write_report(self, path, **extra):
+        report = self.report()
+        report.update(extra)
+        with open(str(path), 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        return report
@@ -0,0 +1,188 @@
+import math
+
+import numpy
+from osgeo import gdal
+
+from ..lazy import lazy_import
+from .nodata import NodataMask
+
+
+# Only needed when tiling mosaics:
+shapely_geometry = lazy_import('shapely.geometry')
+shapely_strtree = lazy_import('shapely.strtree')
+
+
+class MosaicSource:
+    """One input of a mosaic, already in the output reference system.
+
+    Without an alpha band, `nodata` (one value or one per band; by
+    default, the nodata values of the dataset) makes pixels transparent,
+    matched within `tolerance` and by `rule` like single inputs are
+    (see nodata.NodataMask)."""
+
+    def __init__(self, path, priority, ds, nodata=None, tolerance=0, rule='all'):
+        self.path = str(path)
+        self.priority = priority
+
+        self.geotransform = ds.GetGeoTransform()
+        self.xsize, self.ysize = ds.RasterXSize, ds.RasterYSize
+        ulx, xres, _, uly, _, yres = self.geotransform
+        lrx, lry = ulx + self.xsize * xres, uly + self.ysize * yres
+        self.bounds = (min(ulx, lrx), min(uly, lry), max(ulx, lrx), max(uly, lry))
+        self.resolution = abs(xres)
+
+        band = ds.GetRasterBand(1)
+        self.data_type = band.DataType
+        self.paletted = band.GetRasterColorTable() is not None
+
+        # Transparency comes from an alpha band or from the nodata values:
+        raster_count = ds.RasterCount
+        mask_flags = ds.GetRasterBand(1).GetMaskFlags()
+        self.alpha_band = None
+        if mask_flags & gdal.GMF_ALPHA or raster_count in (2, 4):
+            self.alpha_band = raster_count
+        self.data_bands_count = raster_count - (1 if self.alpha_band else 0)
+        if nodata is None:
+            nodata = [
+                ds.GetRasterBand(i).GetNoDataValue()
+                for i in range(1, self.data_bands_count + 1)
+            ]
+        self.nodata_mask = NodataMask(nodata, self.data_bands_count, tolerance, rule)
+
+    def read(self, ds, bounds, width, height, bands_count):
+        """Read the part of `bounds` covered by this source, scaled as if
+        the whole bounds were read into a width x height buffer.
+
+        Returns ((bx0, by0, bx1, by1), data, alpha), with data as a
+        (bands_count, rows, columns) uint8 array, or None if the source
+        doesn't cover any pixel of the buffer."""
+        ulx, uly, lrx, lry = bounds
+        sgt = self.geotransform
+        fx0, fx1 = (ulx - sgt[0]) / sgt[1], (lrx - sgt[0]) / sgt[1]
+        fy0, fy1 = (uly - sgt[3]) / sgt[5], (lry - sgt[3]) / sgt[5]
+
+        sx0, sx1 = max(0, int(math.floor(fx0))), min(self.xsize, int(math.ceil(fx1)))
+        sy0, sy1 = max(0, int(math.floor(fy0))), min(self.ysize, int(math.ceil(fy1)))
+        if sx1 <= sx0 or sy1 <= sy0:
+            return None
+
+        scale_x = width / (fx1 - fx0)
+        scale_y = height / (fy1 - fy0)
+        bx0 = min(width, max(0, int(round((sx0 - fx0) * scale_x))))
+        bx1 = min(width, max(0, int(round((sx1 - fx0) * scale_x))))
+        by0 = min(height, max(0, int(round((sy0 - fy0) * scale_y))))
+        by1 = min(height, max(0, int(round((sy1 - fy0) * scale_y))))
+        if bx1 <= bx0 or by1 <= by0:
+            return None
+
+        array = ds.ReadAsArray(
+            sx0, sy0, sx1 - sx0, sy1 - sy0,
+            buf_xsize=bx1 - bx0, buf_ysize=by1 - by0
+        )
+        if array.ndim == 2:
+            array = array[numpy.newaxis]
+
+        data = array[:self.data_bands_count]
+        if self.alpha_band:
+            alpha = array[self.alpha_band - 1]
+        else:
+            valid = self.nodata_mask.get_valid(data)
+            alpha = numpy.where(valid, 255, 0).astype(numpy.uint8)
+
+        # Gray sources in color mosaics (and vice-versa):
+        if len(data) < bands_count:
+            data = numpy.concatenate([data] + [data[-1:]] * (bands_count - len(data)))
+        return (bx0, by0, bx1, by1), data[:bands_count], alpha
+
+
+class Mosaic:
+    """Several overlapping inputs tiled as one raster, without a VRT.
+
+    The footprints of the sources are indexed in a STRtree, so each tile
+    only reads the sources intersecting it. Sources are composited with
+    their alpha (or nodata-derived) masks: lower `priority` values are
+    drawn on top."""
+
+    def __init__(self, sources, geotransform):
+        # (composited as Byte imagery, so nothing may be saturated)
+        for source in sources:
+            if source.data_type != gdal.GDT_Byte or source.paletted:
+                raise Exception(
+                    f'"{source.path}" is not a Byte gray or RGB(A) raster.',
+                    "Mosaics are composited as Byte imagery: please convert "
+                    "it (e.g. gdal_translate -ot Byte -scale, or -expand rgba) "
+                    "or tile it separately."
+                )
+
+        self.sources = sorted(sources, key=lambda source: source.priority)
+        self.geotransform = geotransform
+        self.tree = shapely_strtree.STRtree([
+            shapely_geometry.box(*source.bounds) for source in self.sources
+        ])
+
+    @classmethod
+    def get_grid(cls, sources):
+        """Geotransform and size of a grid covering every source,
+        at the finest resolution among them."""
+        resolution = min(source.resolution for source in sources)
+        minx = min(source.bounds[0] for source in sources)
+        miny = min(source.bounds[1] for source in sources)
+        maxx = max(source.bounds[2] for source in sources)
+        maxy = max(source.bounds[3] for source in sources)
+        xsize = int(math.ceil((maxx - minx) / resolution))
+        ysize = int(math.ceil((maxy - miny) / resolution))
+        return (minx, resolution, 0, maxy, 0, -resolution), xsize, ysize
+
+    def open_sources(self):
+        """New handles of every source (one set per rendering thread)."""
+        return [
+            gdal.Open(source.path, gdal.GA_ReadOnly)
+            for source in self.sources
+        ]
+
+    def read_window(self, handles, xyzzy, bands_count):
+        """Composite the sources over a tile window of the mosaic grid.
+
+        Returns (data, alpha) as the bytes ReadRaster would return for
+        the window (xyzzy.wxsize x xyzzy.wysize buffer)."""
+        gt = self.geotransform
+        width, height = xyzzy.wxsize, xyzzy.wysize
+        bounds = (
+            gt[0] + xyzzy.rx * gt[1],
+            gt[3] + xyzzy.ry * gt[5],
+            gt[0] + (xyzzy.rx + xyzzy.rxsize) * gt[1],
+            gt[3] + (xyzzy.ry + xyzzy.rysize) * gt[5],
+        )
+
+        # Premultiplied "under" compositing, from the top source down:
+        color = numpy.zeros((bands_count, height, width), numpy.float32)
+        coverage = numpy.zeros((height, width), numpy.float32)
+
+        ulx, uly, lrx, lry = bounds
+        hits = self.tree.query(
+            shapely_geometry.box(
+                min(ulx, lrx), min(uly, lry), max(ulx, lrx), max(uly, lry)
+            ),
+            predicate='intersects'
+        )
+        for index in sorted(hits):
+            result = self.sources[index].read(
+                handles[index], bounds, width, height, bands_count
+            )
+            if result is None:
+                continue
+
+            (bx0, by0, bx1, by1), data, alpha = result
+            window = (slice(by0, by1), slice(bx0, bx1))
+            weight = (alpha / 255.0) * (1 - coverage[window])
+            color[(slice(None),) + window] += data * weight
+            coverage[window] += weight
+
+            if coverage.min() >= 1:
+                break
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            color = numpy.where(coverage > 0, color / coverage, 0)
+        data = numpy.clip(numpy.round(color), 0, 255).astype(numpy.uint8)
+        alpha = numpy.clip(numpy.round(coverage * 255), 0, 255).astype(numpy.uint8)
+        return data.tobytes(), alpha.tobytes()
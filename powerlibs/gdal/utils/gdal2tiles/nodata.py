@@ -0,0 +1,94 @@
+import math
+
+import numpy
+
+from ..lazy import lazy_import
+
+
+gdal_array = lazy_import('osgeo.gdal_array')
+
+# When a pixel is nodata: when 'all' its bands (with a nodata value)
+# match their nodata value (like GDAL's NODATA_VALUES), or when 'any'
+# of them does.
+NODATA_RULES = ('all', 'any')
+
+
+def get_band_values(values, bands_count):
+    """One nodata value (or None) for each of the bands."""
+    if not isinstance(values, (list, tuple)):
+        return [values] * bands_count
+    values = list(values)[:bands_count]
+    return values + [None] * (bands_count - len(values))
+
+
+def normalize_nodata(values):
+    """The nodata of a dataset from the one of its bands, as GDAL's warper
+    takes it: None if no band has one, the value if all the defined ones
+    are the same, a list of one value per band if every band has its own.
+    Bands partially defined with different values fall back to the first
+    defined one (the NodataMask still matches each band separately)."""
+    if not isinstance(values, (list, tuple)):
+        return values
+
+    defined = [value for value in values if value is not None]
+    if not defined:
+        return None
+    if len({'nan' if math.isnan(value) else value for value in defined}) == 1:
+        return defined[0]
+    if len(defined) == len(values):
+        return list(values)
+    return defined[0]
+
+
+class NodataMask:
+    """Transparency derived from the data bands themselves, so no mask
+    band has to be read.
+
+    `values` is one nodata value for every band, or a sequence with one
+    per band (None for bands without nodata). With a `tolerance`, values
+    that close to the nodata value also match (e.g. the noisy edges of
+    JPEG compressed imagery)."""
+
+    def __init__(self, values, bands_count, tolerance=0, rule='all'):
+        if rule not in NODATA_RULES:
+            raise Exception(
+                f"'{rule}' is not a nodata rule.",
+                f"Please use one of: {', '.join(NODATA_RULES)}."
+            )
+        self.values = get_band_values(values, bands_count)
+        self.tolerance = tolerance
+        self.rule = rule
+
+    def match_band(self, values, index):
+        """Which of the given values of the index-th band are nodata."""
+        nodata = self.values[index] if index < len(self.values) else None
+        if nodata is None:
+            return numpy.zeros(values.shape, bool)
+        if numpy.isnan(nodata):
+            return numpy.isnan(values)
+        if self.tolerance:
+            if values.dtype.kind in 'ui':
+                values = values.astype(numpy.int64)
+            return numpy.abs(values - nodata) <= self.tolerance
+        return values == nodata
+
+    def get_valid(self, bands):
+        """Mask of the valid pixels of a (bands, rows, columns) array."""
+        matches = [
+            self.match_band(band, index)
+            for index, band in enumerate(bands)
+            if index < len(self.values) and self.values[index] is not None
+        ]
+        if not matches:
+            return numpy.ones(bands.shape[1:], bool)
+        if self.rule == 'all':
+            return ~numpy.logical_and.reduce(matches)
+        return ~numpy.logical_or.reduce(matches)
+
+    def get_alpha(self, data, data_type, width, height):
+        """Alpha (bytes, 0 or 255) of the data read by ReadRaster (band
+        sequential, of the given GDAL data type) for a width x height
+        window."""
+        dtype = gdal_array.GDALTypeCodeToNumericTypeCode(data_type)
+        bands = numpy.frombuffer(data, dtype).reshape(-1, height, width)
+        return numpy.where(self.get_valid(bands), 255, 0).astype(numpy.uint8).tobytes()
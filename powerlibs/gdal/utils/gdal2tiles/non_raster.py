@@ -1,19 +1,33 @@
 import os
 import tempfile
 
+import numpy
 from osgeo import gdal
 
 from .global_mercator import GlobalMercator
 from .global_geodetic import GlobalGeodetic
 from .gdal2tiles import GDAL2Tiles
-from .xyzzy import Xyzzy
+from .utils import build_tminmax
+from .warp import materialize_warped
+from .windows import geo_query_array
 
 
 class CommonProfile(GDAL2Tiles):
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self, *args,
+        materialize_warp=False, intermediate_path=None, **kwargs
+    ):
         super().__init__(*args, **kwargs)
         self.projection = self.projection_class(tile_size=self.tile_size)
 
+        # Warp the input only once, into a GeoTIFF (with overviews) the
+        # tiles are cut from, instead of warping on the fly the
+        # overlapping query windows of every tile.
+        # If no intermediate_path is given, a temporary file is used.
+        self.materialize_warp = materialize_warp
+        self.intermediate_path = intermediate_path
+        self.remove_intermediate = False
+
     def reproject_if_necessary(self):
         in_ds = self.in_ds
 
@@ -36,132 +50,57 @@ class CommonProfile(GDAL2Tiles):
                 "source reference system."
             )
 
-        in_proj4 = self.in_srs.ExportToProj4()
+        if self.needs_reprojection(in_ds, self.in_srs):
+            # Generation of VRT dataset in tile projection, at the
+            # resolution of the max zoom level (when it's known):
+            self.warp_input(self.out_srs.ExportToWkt(), self.get_warp_resolution())
+
+            # Note: self.in_srs and self.in_srs_wkt contain still the non-warped reference system!!!
+
+            if self.materialize_warp:
+                self.materialize_intermediate()
+
+    def needs_reprojection(self, ds, srs):
+        in_proj4 = srs.ExportToProj4()
         out_proj4 = self.out_srs.ExportToProj4()
-        if (in_proj4 != out_proj4) or (self.in_ds.GetGCPCount() != 0):
-            # Generation of VRT dataset in tile projection,
-            # default 'nearest neighbour' warping
-            self.out_ds = gdal.AutoCreateWarpedVRT(self.in_ds, self.in_srs_wkt, self.out_srs.ExportToWkt())
+        return (
+            (in_proj4 != out_proj4) or (ds.GetGCPCount() != 0)
+            or super().needs_reprojection(ds, srs)
+        )
 
-            # TODO: HIGH PRIORITY:
-            # Correction of AutoCreateWarpedVRT according the max zoomlevel
-            # for correct direct warping!!!
+    def materialize_intermediate(self):
+        path = self.intermediate_path
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='-gdal2tiles.tif')
+            os.close(fd)
+            self.remove_intermediate = True
+
+        kwargs = {}
+        if self.memory_budget is not None:
+            band = self.out_ds.GetRasterBand(1)
+            kwargs['workers'] = self.workers
+            kwargs['chunk_size'] = self.memory_budget.get_chunk_size(
+                self.workers, self.out_ds.RasterCount,
+                gdal.GetDataTypeSize(band.DataType) // 8
+            )
 
-            # if verbose: self.out_ds.GetDriver().CreateCopy("tiles.vrt", self.out_ds)
+        with self.metrics.timer('materialize'):
+            self.out_ds = materialize_warped(
+                self.warped_vrt_path, str(path), **kwargs
+            )
+        self.intermediate_path = path
 
-            # Note: self.in_srs and self.in_srs_wkt contain still the non-warped reference system!!!
+    def release_input(self):
+        super().release_input()
+        if self.remove_intermediate:
+            os.unlink(self.intermediate_path)
+            self.intermediate_path = None
+            self.remove_intermediate = False
 
-            # Correction of AutoCreateWarpedVRT for NODATA values
-            if self.source_nodata is not None:
-                tempfilename = tempfile.mktemp('-gdal2tiles.vrt')
-                self.out_ds.GetDriver().CreateCopy(tempfilename, self.out_ds)
-                # open as a text file
-                s = open(tempfilename).read()
-                # Add the warping options
-                s = s.replace(
-                    """<GDALWarpOptions>""",
-                    """<GDALWarpOptions>
-<Option name="INIT_DEST">NO_DATA</Option>
-<Option name="UNIFIED_SRC_NODATA">YES</Option>"""
-                )
-                # replace BandMapping tag for NODATA bands....
-                for i in range(self.in_ds.RasterCount):
-                    s = s.replace("""<BandMapping src="%i" dst="%i"/>""" % ((i + 1), (i + 1)), """<BandMapping src="%i" dst="%i">
-  <SrcNoDataReal>%i</SrcNoDataReal>
-  <SrcNoDataImag>0</SrcNoDataImag>
-  <DstNoDataReal>%i</DstNoDataReal>
-  <DstNoDataImag>0</DstNoDataImag>
-</BandMapping>""" % (
-                        (i + 1), (i + 1),
-                        self.source_nodata,
-                        self.source_nodata)
-                    )  # Or rewrite to white by: , 255 ))
-                # save the corrected VRT
-                # TODO: use TemporaryFile, here!!!
-                open(tempfilename, "w").write(s)
-                # open by GDAL as self.out_ds
-                self.out_ds = gdal.Open(tempfilename)
-                # delete the temporary file
-                os.unlink(tempfilename)
-
-                # set NODATA_VALUE metadata
-                self.out_ds.SetMetadataItem(
-                    'NODATA_VALUES',
-                    " ".join(str(self.source_nodata) for x in
-                             range(self.in_ds.RasterCount))
-                )
-
-            # -----------------------------------
-            # Correction of AutoCreateWarpedVRT for Mono (1 band) and RGB (3 bands) files without NODATA:
-            # equivalent of gdalwarp -dstalpha
-            if self.source_nodata is None and self.out_ds.RasterCount in [1, 3]:
-                tempfilename = tempfile.mktemp('-gdal2tiles.vrt')
-                self.out_ds.GetDriver().CreateCopy(tempfilename, self.out_ds)
-                # open as a text file
-                s = open(tempfilename).read()
-                # Add the warping options
-                s = s.replace("""<BlockXSize>""", """<VRTRasterBand dataType="Byte" band="%i" subClass="VRTWarpedRasterBand">
-<ColorInterp>Alpha</ColorInterp>
-</VRTRasterBand>
-<BlockXSize>""" % (self.out_ds.RasterCount + 1))
-                s = s.replace("""</GDALWarpOptions>""", """<DstAlphaBand>%i</DstAlphaBand>
-</GDALWarpOptions>""" % (self.out_ds.RasterCount + 1))
-                s = s.replace("""</WorkingDataType>""", """</WorkingDataType>
-<Option name="INIT_DEST">0</Option>""")
-                # save the corrected VRT
-                open(tempfilename, "w").write(s)
-                # open by GDAL as self.out_ds
-                self.out_ds = gdal.Open(tempfilename)
-                # delete the temporary file
-                os.unlink(tempfilename)
-
-            s = '''
-            '''
-
-    def geo_query(self, ds, ulx, uly, lrx, lry, querysize=0):
-        """For given dataset and query in cartographic coordinates
-        returns parameters for ReadRaster() in raster coordinates and
-        x/y shifts (for border tiles). If the querysize is not given, the
-        extent is returned in the native resolution of dataset ds."""
-
-        geotran = ds.GetGeoTransform()
-        rx = int((ulx - geotran[0]) / geotran[1] + 0.001)
-        ry = int((uly - geotran[3]) / geotran[5] + 0.001)
-        rxsize = int((lrx - ulx) / geotran[1] + 0.5)
-        rysize = int((lry - uly) / geotran[5] + 0.5)
-
-        if not querysize:
-            wxsize, wysize = rxsize, rysize
-        else:
-            wxsize, wysize = querysize, querysize
-
-        # Coordinates should not go out of the bounds of the raster
-        wx = 0
-        if rx < 0:
-            rxshift = abs(rx)
-            wx = int(wxsize * (float(rxshift) / rxsize))
-            wxsize = wxsize - wx
-            rxsize = rxsize - int(rxsize * (float(rxshift) / rxsize))
-            rx = 0
-        if rx + rxsize > ds.RasterXSize:
-            wxsize = int(wxsize * (float(ds.RasterXSize - rx) / rxsize))
-            rxsize = ds.RasterXSize - rx
-
-        wy = 0
-        if ry < 0:
-            ryshift = abs(ry)
-            wy = int(wysize * (float(ryshift) / rysize))
-            wysize = wysize - wy
-            rysize = rysize - int(rysize * (float(ryshift) / rysize))
-            ry = 0
-        if ry + rysize > ds.RasterYSize:
-            wysize = int(wysize * (float(ds.RasterYSize - ry) / rysize))
-            rysize = ds.RasterYSize - ry
-
-        return (rx, ry, rxsize, rysize), (wx, wy, wxsize, wysize)
-
-    def get_tile_bounds(self, tx, ty, tz):
-        return self.projection.TileBounds(tx, ty, tz)
+    def get_warp_resolution(self):
+        if self.max_zoom is None:
+            return None
+        return self.projection.Resolution(self.max_zoom)
 
     def adjust_zoom(self):
         # Get the minimal zoom level (map covers area equivalent to one tile)
@@ -178,26 +117,15 @@ class CommonProfile(GDAL2Tiles):
         if self.max_zoom is None:
             self.max_zoom = self.projection.ZoomForPixelSize(self.out_gt[1])
 
-    def generate_base_tile_xyzzy(
-        self,
-        tx, ty, tz,
-        querysize,
-        tminx, tminy, tmaxx, tmaxy
-    ):
-        ds = self.out_ds
-        b = self.get_tile_bounds(tx, ty, tz)
-        querysize = self.querysize
+    def compute_windows(self, tx, ty, tz):
+        minx, miny, maxx, maxy = self.projection.tile_bounds_array(tx, ty, tz)
 
         # Tile bounds in raster coordinates for ReadRaster query
-        rb, wb = self.geo_query(
-            ds, b[0], b[3], b[2], b[1], querysize=querysize
+        return geo_query_array(
+            self.out_gt, self.out_ds.RasterXSize, self.out_ds.RasterYSize,
+            minx, maxy, maxx, miny, querysize=self.get_querysize(tz)
         )
 
-        rx, ry, rxsize, rysize = rb
-        wx, wy, wxsize, wysize = wb
-
-        return Xyzzy(querysize, rx, ry, rxsize, rysize, wx, wy, wxsize, wysize)
-
 
 class Mercator(CommonProfile):
     projection_class = GlobalMercator
@@ -207,18 +135,19 @@ class Mercator(CommonProfile):
 
     def calculate_ranges_for_tiles(self):
         # Generate table with min max tile coordinates for all zoomlevels
-        self.tminmax = list(range(0, 32))
-        for tz in range(0, 32):
-            tminx, tminy = self.projection.MetersToTile(
-                self.ominx, self.ominy, tz
-            )
-            tmaxx, tmaxy = self.projection.MetersToTile(
-                self.omaxx, self.omaxy, tz
-            )
-            # crop tiles extending world limits (+-180,+-90)
-            tminx, tminy = max(0, tminx), max(0, tminy)
-            tmaxx, tmaxy = min(2 ** tz - 1, tmaxx), min(2 ** tz - 1, tmaxy)
-            self.tminmax[tz] = (tminx, tminy, tmaxx, tmaxy)
+        zooms = numpy.arange(0, 32)
+        tminx, tminy = self.projection.meters_to_tile_array(
+            self.ominx, self.ominy, zooms
+        )
+        tmaxx, tmaxy = self.projection.meters_to_tile_array(
+            self.omaxx, self.omaxy, zooms
+        )
+        # crop tiles extending world limits (+-180,+-90)
+        limits = 2 ** zooms - 1
+        self.tminmax = build_tminmax(
+            numpy.maximum(0, tminx), numpy.maximum(0, tminy),
+            numpy.minimum(limits, tmaxx), numpy.minimum(limits, tmaxy)
+        )
 
         # TODO: Maps crossing 180E (Alaska?)
 
@@ -231,18 +160,19 @@ class Geodetic(CommonProfile):
 
     def calculate_ranges_for_tiles(self):
         # Generate table with min max tile coordinates for all zoomlevels
-        self.tminmax = list(range(0, 32))
-        ominx = self.ominx
-        ominy = self.ominy
-        omaxx = self.omaxx
-        omaxy = self.omaxy
-        for tz in range(0, 32):
-            tminx, tminy = self.projection.LatLonToTile(ominx, ominy, tz)
-            tmaxx, tmaxy = self.projection.LatLonToTile(omaxx, omaxy, tz)
-
-            # crop tiles extending world limits (+-180,+-90)
-            tminx, tminy = max(0, tminx), max(0, tminy)
-            tmaxx, tmaxy = min(2**(tz + 1) - 1, tmaxx), min(2 ** tz - 1, tmaxy)
-            self.tminmax[tz] = (tminx, tminy, tmaxx, tmaxy)
+        zooms = numpy.arange(0, 32)
+        tminx, tminy = self.projection.lat_lon_to_tile_array(
+            self.ominx, self.ominy, zooms
+        )
+        tmaxx, tmaxy = self.projection.lat_lon_to_tile_array(
+            self.omaxx, self.omaxy, zooms
+        )
+
+        # crop tiles extending world limits (+-180,+-90)
+        self.tminmax = build_tminmax(
+            numpy.maximum(0, tminx), numpy.maximum(0, tminy),
+            numpy.minimum(2 ** (zooms + 1) - 1, tmaxx),
+            numpy.minimum(2 ** zooms - 1, tmaxy)
+        )
 
         # TODO: Maps crossing 180E (Alaska?)
@@ -0,0 +1,165 @@
+import random
+import shutil
+import time
+from pathlib import PosixPath
+
+from .utils import encode_tile
+from .windows import tile_grid
+
+
+class LevelPlan:
+    """Tile count of a zoom level and the estimates from its samples."""
+
+    def __init__(self, tz, tiles):
+        self.tz = tz
+        self.tiles = tiles
+        self.sampled = 0
+        self.empty = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.estimated_from = None
+
+    def add_sample(self, data, empty, seconds):
+        self.sampled += 1
+        self.empty += 1 if empty else 0
+        self.bytes += len(data)
+        self.seconds += seconds
+
+    def copy_estimates(self, other):
+        self.sampled, self.empty = other.sampled, other.empty
+        self.bytes, self.seconds = other.bytes, other.seconds
+        self.estimated_from = other.tz
+
+    @property
+    def mean_bytes(self):
+        return self.bytes / self.sampled if self.sampled else 0
+
+    @property
+    def mean_seconds(self):
+        return self.seconds / self.sampled if self.sampled else 0
+
+    @property
+    def empty_ratio(self):
+        return self.empty / self.sampled if self.sampled else 0
+
+    def as_dict(self):
+        return {
+            'tiles': self.tiles,
+            'sampled': self.sampled,
+            'estimated_from': self.estimated_from,
+            'empty_ratio': self.empty_ratio,
+            'mean_bytes': self.mean_bytes,
+            'mean_seconds': self.mean_seconds,
+            'projected_bytes': self.tiles * self.mean_bytes,
+            'projected_seconds': self.tiles * self.mean_seconds,
+        }
+
+
+class TilingPlan:
+    """Dry-run estimates of a tiling job (see GDAL2Tiles.plan).
+
+    Wall time assumes the base level is rendered by `workers` threads and
+    the overview levels too only in the overview-query mode (otherwise
+    they're composed from the children by a single thread). File system
+    writes are not included."""
+
+    def __init__(self, levels, workers, overview_query, base_zoom):
+        self.levels = levels
+        self.workers = workers
+        self.overview_query = overview_query
+        self.base_zoom = base_zoom
+
+    @property
+    def total_tiles(self):
+        return sum(level.tiles for level in self.levels.values())
+
+    @property
+    def projected_bytes(self):
+        return sum(level.tiles * level.mean_bytes for level in self.levels.values())
+
+    @property
+    def projected_seconds(self):
+        seconds = 0
+        for tz, level in self.levels.items():
+            parallel = tz == self.base_zoom or self.overview_query
+            level_seconds = level.tiles * level.mean_seconds
+            seconds += level_seconds / self.workers if parallel else level_seconds
+        return seconds
+
+    @property
+    def empty_ratio(self):
+        sampled = sum(level.sampled for level in self.levels.values() if level.estimated_from is None)
+        empty = sum(level.empty for level in self.levels.values() if level.estimated_from is None)
+        return empty / sampled if sampled else 0
+
+    def fits(self, output_dir, margin=1.1):
+        """Whether the projected output (plus a safety margin) fits in the
+        free space of the file system holding output_dir."""
+        path = PosixPath(output_dir).resolve()
+        while not path.exists():
+            path = path.parent
+        return self.projected_bytes * margin <= shutil.disk_usage(str(path)).free
+
+    def as_dict(self):
+        return {
+            'total_tiles': self.total_tiles,
+            'workers': self.workers,
+            'empty_ratio': self.empty_ratio,
+            'projected_bytes': self.projected_bytes,
+            'projected_seconds': self.projected_seconds,
+            'zooms': {
+                str(tz): level.as_dict()
+                for tz, level in sorted(self.levels.items())
+            },
+        }
+
+
+def is_empty(dstile):
+    """Whether the tile is fully transparent."""
+    if dstile.RasterCount not in (2, 4):
+        return False
+    alpha = dstile.GetRasterBand(dstile.RasterCount).ReadRaster()
+    return not alpha.strip(b'\x00')
+
+
+def get_level_tiles(tiler, tz):
+    """(tx, ty) arrays of the tiles the tiler would generate at the given
+    zoom level, following the same rules as the tiling itself."""
+    tminx, tminy, tmaxx, tmaxy = tiler.tminmax[tz]
+    tx, ty = tile_grid(range(tminx, tmaxx + 1), tiler.get_y_range(tz))
+    inside = tiler.in_shard(tx, ty, tz)
+    if tz == tiler.max_zoom or tiler.overviewquery:
+        inside &= (ty >= tminy) & (ty <= tmaxy)
+    return tx[inside], ty[inside]
+
+
+def plan_job(tiler, samples=8, workers=None, sample_levels=3, seed=0):
+    """Count the tiles of every level of an opened tiler and render (in
+    memory) up to `samples` random tiles of each of the `sample_levels`
+    finest levels, reading them directly from the input. Coarser levels
+    reuse the estimates of the coarsest sampled one, since rendering
+    their windows could mean reading most of the input."""
+    sampler = random.Random(seed)
+    image_output = tiler.image_output
+    levels = {}
+
+    for tz in range(tiler.max_zoom, tiler.min_zoom - 1, -1):
+        tx, ty = get_level_tiles(tiler, tz)
+        levels[tz] = level = LevelPlan(tz, len(tx))
+
+        if tz <= tiler.max_zoom - sample_levels:
+            level.copy_estimates(levels[tz + 1])
+            continue
+
+        image_output.zoom = tz
+        for index in sampler.sample(range(len(tx)), min(samples, len(tx))):
+            started = time.perf_counter()
+            xyzzy = tiler.generate_base_tile_xyzzy(int(tx[index]), int(ty[index]), tz)
+            alpha = image_output.read_alpha(xyzzy)
+            dstile = image_output.render_base_tile(xyzzy, alpha)
+            data = encode_tile(dstile)
+            level.add_sample(data, is_empty(dstile), time.perf_counter() - started)
+
+    return TilingPlan(
+        levels, workers or tiler.workers, tiler.overviewquery, tiler.max_zoom
+    )
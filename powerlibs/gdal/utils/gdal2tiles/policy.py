@@ -0,0 +1,299 @@
+import math
+import random
+import time
+
+import numpy
+
+from .defines import RESAMPLING_METHODS
+from .planning import get_level_tiles
+from .resampler import get_resampler
+
+
+# PNG creation options of each encoder (tiles are always PNG; the
+# encoders only trade encoding time for file size):
+ENCODERS = {
+    'png': (),
+    'png-fast': ('ZLEVEL=1',),
+    'png-small': ('ZLEVEL=9',),
+}
+
+# Resampling methods tried by the auto-tuning (besides the configured one):
+TUNING_CANDIDATES = ('near', 'bilinear', 'average', 'cubic', 'lanczos')
+
+
+def get_default_querysize(resampling, tile_size):
+    """How big the query window should be for scaling it down."""
+    if resampling == 'near':
+        return tile_size
+    elif resampling == 'bilinear':
+        return tile_size * 2
+    return 4 * tile_size
+
+
+class ZoomPolicy:
+    """Resampling method, querysize (by default, the one suited to the
+    method) and encoder of the zoom levels from min_zoom to max_zoom
+    (None meaning no limit)."""
+
+    def __init__(
+        self, resampling='average', querysize=None, encoder='png',
+        min_zoom=None, max_zoom=None
+    ):
+        if resampling not in RESAMPLING_METHODS:
+            raise Exception(
+                f"'{resampling}' is not a resampling method.",
+                f"Please use one of: {', '.join(RESAMPLING_METHODS)}."
+            )
+        if encoder not in ENCODERS:
+            raise Exception(
+                f"'{encoder}' is not a tile encoder.",
+                f"Please use one of: {', '.join(ENCODERS)}."
+            )
+        self.resampling = resampling
+        self.querysize = querysize
+        self.encoder = encoder
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._resampler = None
+
+    def contains(self, tz):
+        if tz is None:
+            return False
+        if self.min_zoom is not None and tz < self.min_zoom:
+            return False
+        return self.max_zoom is None or tz <= self.max_zoom
+
+    def get_querysize(self, tile_size):
+        return self.querysize or get_default_querysize(self.resampling, tile_size)
+
+    def get_resampler(self):
+        if self._resampler is None:
+            self._resampler = get_resampler(self.resampling)
+        return self._resampler
+
+    @property
+    def encoder_options(self):
+        return list(ENCODERS[self.encoder])
+
+    def report(self):
+        return {
+            'min_zoom': self.min_zoom,
+            'max_zoom': self.max_zoom,
+            'resampling': self.resampling,
+            'querysize': self.querysize,
+            'encoder': self.encoder,
+        }
+
+
+class ResamplingPolicy:
+    """ZoomPolicy of every zoom level: the first of `rules` containing
+    it or, if none does, the default one. E.g. lanczos for the base
+    level and average for the overviews:
+
+        ResamplingPolicy(
+            [ZoomPolicy('lanczos', min_zoom=20)],
+            default=ZoomPolicy('average', encoder='png-fast')
+        )
+
+    With `auto`, the rules are chosen by `tune` once the input is open
+    (see ResamplingPolicy.auto_tune)."""
+
+    def __init__(
+        self, rules=(), default=None,
+        auto=False, threshold=40, samples=8, candidates=TUNING_CANDIDATES
+    ):
+        self.rules = list(rules)
+        self.default = default or ZoomPolicy()
+        self.auto = auto
+        self.threshold = threshold
+        self.samples = samples
+        self.candidates = tuple(candidates)
+        self.tuning = None
+
+    @classmethod
+    def auto_tune(cls, threshold=40, samples=8, candidates=TUNING_CANDIDATES, encoder='png'):
+        """Policy choosing, for the base level and for the overview
+        levels, the fastest resampling method whose tiles are within
+        `threshold` (PSNR, in dB) of the ones of the configured method,
+        measured on `samples` random tiles of each."""
+        return cls(
+            default=ZoomPolicy(encoder=encoder), auto=True,
+            threshold=threshold, samples=samples, candidates=candidates
+        )
+
+    def get(self, tz):
+        for rule in self.rules:
+            if rule.contains(tz):
+                return rule
+        return self.default
+
+    def get_max_querysize(self, tile_size):
+        return max(
+            policy.get_querysize(tile_size)
+            for policy in self.rules + [self.default]
+        )
+
+    def tune(self, tiler, seed=0):
+        """Measure the candidates on tiles of an opened tiler and replace
+        the rules with the chosen ones."""
+        output = get_render_output(tiler.image_output)
+        if output.terrain is not None:
+            # (elevation tiles don't use the resampler)
+            self.auto = False
+            return
+
+        sampler = random.Random(seed)
+        names = [tiler.resampling_method] + [
+            name for name in self.candidates if name != tiler.resampling_method
+        ]
+        # (every candidate scales the same query, the reference's one, so
+        # the timings only compare the resamplers)
+        querysize = self.default.querysize or get_default_querysize(
+            tiler.resampling_method, tiler.tile_size
+        )
+        candidates = [
+            ZoomPolicy(name, querysize=querysize, encoder=self.default.encoder)
+            for name in names
+        ]
+
+        base_zoom = tiler.max_zoom
+        overview_zoom = base_zoom - 1
+        try:
+            base = self.measure_direct(tiler, output, base_zoom, candidates, sampler)
+            overview = None
+            if overview_zoom >= tiler.min_zoom:
+                if tiler.overviewquery:
+                    overview = self.measure_direct(tiler, output, overview_zoom, candidates, sampler)
+                else:
+                    overview = self.measure_composed(tiler, output, overview_zoom, candidates, sampler)
+        finally:
+            tiler.resampling_policy = self
+
+        base_choice = self.choose(candidates, base)
+        overview_choice = self.choose(candidates, overview) if overview else base_choice
+        self.rules = [ZoomPolicy(
+            base_choice.resampling, querysize=querysize, encoder=self.default.encoder,
+            min_zoom=base_zoom, max_zoom=base_zoom
+        )]
+        self.default = ZoomPolicy(
+            overview_choice.resampling, querysize=querysize, encoder=self.default.encoder
+        )
+        self.auto = False
+        self.tuning = {
+            'threshold': self.threshold,
+            'querysize': querysize,
+            'base': self.describe_results(candidates, base),
+            'overviews': self.describe_results(candidates, overview) if overview else None,
+        }
+
+    def measure_direct(self, tiler, output, tz, candidates, sampler):
+        """(seconds, worst PSNR) of every candidate scaling the same
+        queries, read directly from the input."""
+        tiles = sample_tiles(tiler, tz, self.samples, sampler)
+        tiler.resampling_policy = ResamplingPolicy(default=candidates[0])
+        queries = [read_direct(tiler, output, tx, ty, tz) for tx, ty in tiles]
+        return self.measure_scaling(output, queries, candidates)
+
+    def measure_composed(self, tiler, output, tz, candidates, sampler):
+        """(seconds, worst PSNR) of every candidate scaling the composed
+        children of overview tiles (rendered with the first candidate)."""
+        tiles = sample_tiles(tiler, tz, self.samples, sampler)
+        tiler.resampling_policy = ResamplingPolicy(default=candidates[0])
+        cminx, cminy, cmaxx, cmaxy = tiler.tminmax[tz + 1]
+        queries = []
+        for tx, ty in tiles:
+            children = [
+                (cx, cy, render_direct(tiler, output, cx, cy, tz + 1, candidates[0]))
+                for cy in (2 * ty, 2 * ty + 1)
+                for cx in (2 * tx, 2 * tx + 1)
+                if cminx <= cx <= cmaxx and cminy <= cy <= cmaxy
+            ]
+            queries.append(output.compose_children(tx, ty, children))
+        return self.measure_scaling(output, queries, candidates)
+
+    def measure_scaling(self, output, queries, candidates):
+        """(seconds, worst PSNR against the first candidate) of every
+        candidate scaling `queries` down to tiles."""
+        results = [[0.0, math.inf] for candidate in candidates]
+        for query in queries:
+            reference = None
+            for i, candidate in enumerate(candidates):
+                started = time.perf_counter()
+                dstile = scale(output, query, candidate.get_resampler())
+                results[i][0] += time.perf_counter() - started
+                pixels = get_pixels(dstile)
+                if reference is None:
+                    reference = pixels
+                results[i][1] = min(results[i][1], get_psnr(reference, pixels))
+        return results
+
+    def choose(self, candidates, results):
+        """The fastest candidate within the threshold (the first one,
+        the reference, always is)."""
+        acceptable = [
+            (seconds, i) for i, (seconds, psnr) in enumerate(results)
+            if psnr >= self.threshold
+        ]
+        return candidates[min(acceptable)[1]]
+
+    def describe_results(self, candidates, results):
+        return {
+            candidate.resampling: {
+                'seconds': seconds,
+                'psnr': None if math.isinf(psnr) else psnr,
+            }
+            for candidate, (seconds, psnr) in zip(candidates, results)
+        }
+
+    def report(self):
+        return {
+            'rules': [rule.report() for rule in self.rules],
+            'default': self.default.report(),
+            'tuning': self.tuning,
+        }
+
+
+def get_render_output(image_output):
+    """The single output (the first one) of a multi-product or
+    multi-size image output."""
+    while hasattr(image_output, 'primary'):
+        image_output = image_output.primary
+    return image_output
+
+
+def sample_tiles(tiler, tz, samples, sampler):
+    tx, ty = get_level_tiles(tiler, tz)
+    indexes = sampler.sample(range(len(tx)), min(samples, len(tx)))
+    return [(int(tx[i]), int(ty[i])) for i in indexes]
+
+
+def read_direct(tiler, output, tx, ty, tz):
+    output.zoom = tz
+    xyzzy = tiler.generate_base_tile_xyzzy(tx, ty, tz)
+    alpha = output.read_alpha(xyzzy)
+    return output.read_query(xyzzy, alpha)
+
+
+def render_direct(tiler, output, tx, ty, tz, policy):
+    return scale(output, read_direct(tiler, output, tx, ty, tz), policy.get_resampler())
+
+
+def scale(output, query, resampler):
+    if query.RasterXSize == output.tile_size:
+        return query
+    dstile = output.mem_drv.Create(
+        '', output.tile_size, output.tile_size, query.RasterCount
+    )
+    resampler(query, dstile)
+    return dstile
+
+
+def get_pixels(dstile):
+    return numpy.frombuffer(dstile.ReadRaster(), numpy.uint8).astype(numpy.float64)
+
+
+def get_psnr(a, b):
+    mse = numpy.mean((a - b) ** 2)
+    if mse == 0:
+        return math.inf
+    return 10 * math.log10(255 ** 2 / mse)
@@ -1,16 +1,47 @@
 import math
 
+import numpy
+from osgeo import gdal
+from osgeo import osr
+
 from .gdal2tiles import GDAL2Tiles
 from .image_output import SimpleImageOutput
-from .resampler import get_resampler
-from .utils import gdal_write
-from .xyzzy import Xyzzy
+from .utils import build_tminmax
 
 
 class Raster(GDAL2Tiles):
     def set_out_srs(self):
         self.out_srs = self.in_srs
 
+    def build_mosaic(self):
+        self.check_mosaic_srs()
+        super().build_mosaic()
+
+    def check_mosaic_srs(self):
+        """Sources are never reprojected by this profile, so all of them
+        must be in the same reference system."""
+        if self.source_srs:
+            return
+
+        first_srs = None
+        for path in self.source_paths:
+            ds = gdal.Open(str(path), gdal.GA_ReadOnly)
+            if not ds:
+                continue
+            srs = osr.SpatialReference()
+            wkt = ds.GetProjection() or ds.GetGCPProjection()
+            if wkt:
+                srs.ImportFromWkt(wkt)
+
+            if first_srs is None:
+                first_srs = srs
+            elif not srs.IsSame(first_srs):
+                raise Exception(
+                    f'"{path}" is not in the reference system of "{self.source_paths[0]}".',
+                    "The 'raster' profile doesn't reproject: please use sources in "
+                    "the same reference system, or the 'mercator' or 'geodetic' profile."
+                )
+
     def adjust_zoom(self):
         def log2(x):
             return math.log10(x) / math.log10(2)
@@ -30,54 +61,50 @@ class Raster(GDAL2Tiles):
 
     def calculate_ranges_for_tiles(self):
         # Generate table with min max tile coordinates for all zoomlevels
-        self.tminmax = list(range(0, self.max_zoom + 1))
-        self.tsize = list(range(0, self.max_zoom + 1))
-        for tz in range(0, self.max_zoom + 1):
-            tsize = 2.0**(self.nativezoom - tz) * self.tile_size
-            tminx, tminy = 0, 0
-            tmaxx = int(math.ceil(self.out_ds.RasterXSize / tsize)) - 1
-            tmaxy = int(math.ceil(self.out_ds.RasterYSize / tsize)) - 1
-            self.tsize[tz] = math.ceil(tsize)
-            self.tminmax[tz] = (tminx, tminy, tmaxx, tmaxy)
-
-    def generate_base_tile_xyzzy(
-        self,
-        tx, ty, tz,
-        querysize,
-        tminx, tminy, tmaxx, tmaxy
-    ):
+        zooms = numpy.arange(0, self.max_zoom + 1)
+        tsize = numpy.exp2(self.nativezoom - zooms) * self.tile_size
+        tmaxx = numpy.ceil(self.out_ds.RasterXSize / tsize) - 1
+        tmaxy = numpy.ceil(self.out_ds.RasterYSize / tsize) - 1
+        zeros = numpy.zeros_like(zooms)
+        self.tsize = numpy.ceil(tsize).astype(numpy.int64).tolist()
+        self.tminmax = build_tminmax(zeros, zeros, tmaxx, tmaxy)
+
+    def get_querysize(self, tz):
+        if tz >= self.nativezoom:
+            return self.tile_sizes[-1]
+        return super().get_querysize(tz)
+
+    def compute_windows(self, tx, ty, tz):
         # tile_size in raster coordinates for actual zoom:
         tsize = int(self.tsize[tz])
+        tminx, tminy, tmaxx, tmaxy = self.tminmax[tz]
 
         # size of the raster in pixels:
         xsize = self.out_ds.RasterXSize
         ysize = self.out_ds.RasterYSize
 
-        if tz >= self.nativezoom:
-            querysize = self.tile_size
+        rx = tx * tsize
+        rxsize = numpy.where(tx == tmaxx, xsize % tsize, 0)
+        rxsize = numpy.where(rxsize == 0, tsize, rxsize)
 
-        rx = (tx) * tsize
-        rxsize = 0
-        if tx == tmaxx:
-            rxsize = xsize % tsize
-        if rxsize == 0:
-            rxsize = tsize
+        rysize = numpy.where(ty == tmaxy, ysize % tsize, 0)
+        rysize = numpy.where(rysize == 0, tsize, rysize)
+        ry = self.get_read_y(ty, tsize, rysize, ysize)
 
-        rysize = 0
-        if ty == tmaxy:
-            rysize = ysize % tsize
-        if rysize == 0:
-            rysize = tsize
-        ry = ysize - (ty * tsize) - rysize
+        # (in query pixels, the query being scaled into the tile)
+        querysize = self.get_querysize(tz)
+        wxsize = numpy.trunc(rxsize / float(tsize) * querysize).astype(numpy.int64)
+        wysize = numpy.trunc(rysize / float(tsize) * querysize).astype(numpy.int64)
+        wx = numpy.zeros_like(wxsize)
+        wy = self.get_write_y(wysize, querysize)
 
-        wx, wy = 0, 0
-        wxsize = int(rxsize / float(tsize) * self.tile_size)
-        wysize = int(rysize / float(tsize) * self.tile_size)
+        return (rx, ry, rxsize, rysize), (wx, wy, wxsize, wysize)
 
-        if wysize != self.tile_size:
-            wy = self.tile_size - wysize
+    def get_read_y(self, ty, tsize, rysize, ysize):
+        return ysize - (ty * tsize) - rysize
 
-        return Xyzzy(querysize, rx, ry, rxsize, rysize, wx, wy, wxsize, wysize)
+    def get_write_y(self, wysize, querysize):
+        return numpy.where(wysize != querysize, querysize - wysize, 0)
 
 
 class LeafletImageOutput(SimpleImageOutput):
@@ -90,53 +117,14 @@ class LeafletImageOutput(SimpleImageOutput):
 
 
 class Leaflet(Raster):
+    image_output_class = LeafletImageOutput
+
     def get_y_range(self, zoom):
         tminx, tminy, tmaxx, tmaxy = self.tminmax[self.max_zoom]
         return range(tminy, tmaxy + 1)
 
-    def instantiate_image_output(self):
-        resampler = get_resampler(self.resampling_method, gdal_write)
-        self.image_output = LeafletImageOutput(
-            self.out_ds,
-            self.tile_size,
-            resampler,
-            gdal_write,
-            self.source_nodata,
-            self.output_dir
-        )
+    def get_read_y(self, ty, tsize, rysize, ysize):
+        return ty * tsize
 
-    def generate_base_tile_xyzzy(
-        self,
-        tx, ty, tz,
-        querysize,
-        tminx, tminy, tmaxx, tmaxy
-    ):
-        # tile_size in raster coordinates for actual zoom:
-        tsize = int(self.tsize[tz])
-
-        # size of the raster in pixels:
-        xsize = self.out_ds.RasterXSize
-        ysize = self.out_ds.RasterYSize
-
-        if tz >= self.nativezoom:
-            querysize = self.tile_size
-
-        rx = (tx) * tsize
-        rxsize = 0
-        if tx == tmaxx:
-            rxsize = xsize % tsize
-        if rxsize == 0:
-            rxsize = tsize
-
-        rysize = 0
-        if ty == tmaxy:
-            rysize = ysize % tsize
-        if rysize == 0:
-            rysize = tsize
-        ry = ty * tsize
-
-        wx, wy = 0, 0
-        wxsize = int(rxsize / float(tsize) * self.tile_size)
-        wysize = int(rysize / float(tsize) * self.tile_size)
-
-        return Xyzzy(querysize, rx, ry, rxsize, rysize, wx, wy, wxsize, wysize)
+    def get_write_y(self, wysize, querysize):
+        return numpy.zeros_like(wysize)
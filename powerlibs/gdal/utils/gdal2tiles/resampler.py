@@ -1,16 +1,40 @@
-import numpy
 from osgeo import gdal
-import osgeo.gdal_array as gdalarray
-from PIL import Image
 
-from .utils import ensure_dir_exists
+from ..lazy import lazy_import
 from .exceptions import ImageOutputException
+from .utils import get_gdal_driver
 
 
-def get_resampler(name, write_method):
-    """Return a function performing given resampling algorithm."""
+# Only the 'antialias' resampler needs these:
+numpy = lazy_import('numpy')
+gdalarray = lazy_import('osgeo.gdal_array')
+Image = lazy_import('PIL.Image')
 
-    def resample_average(path, dsquery, dstile):
+
+def composite_over_file(dstile, path):
+    """The tile (a MEM dataset) drawn, through its alpha, over the tile
+    already written at `path`, as a new MEM dataset."""
+    size = dstile.RasterXSize
+    array = numpy.full((size, size, 4), 255, numpy.uint8)
+    for i in range(dstile.RasterCount):
+        array[:,:,i] = gdalarray.BandReadAsArray(dstile.GetRasterBand(i + 1))  # NOQA
+    im1 = Image.fromarray(array, 'RGBA')
+    im0 = Image.open(str(path)).convert('RGBA')
+    composite = numpy.asarray(Image.composite(im1, im0, im1))
+
+    dscomposite = get_gdal_driver('MEM').Create(
+        '', size, size, dstile.RasterCount
+    )
+    for i in range(dstile.RasterCount):
+        gdalarray.BandWriteArray(dscomposite.GetRasterBand(i + 1), composite[:,:,i])  # NOQA
+    return dscomposite
+
+
+def get_resampler(name):
+    """Return a function performing given resampling algorithm:
+    resample(dsquery, dstile) scales dsquery down into dstile."""
+
+    def resample_average(dsquery, dstile):
         for i in range(1, dstile.RasterCount + 1):
             res = gdal.RegenerateOverview(
                 dsquery.GetRasterBand(i), dstile.GetRasterBand(i), "average"
@@ -20,26 +44,26 @@ def get_resampler(name, write_method):
                     "RegenerateOverview() failed with error %d" % res
                 )
 
-        write_method(path, dstile)
-
-    def resample_antialias(path, dsquery, dstile):
+    def resample_antialias(dsquery, dstile):
         querysize = dsquery.RasterXSize
         tile_size = dstile.RasterXSize
 
-        array = numpy.zeros((querysize, querysize, 4), numpy.uint8)
+        # Always four bands. Tiles without an alpha band are opaque
+        # (a zero alpha would let Image.resize darken their colours):
+        array = numpy.full((querysize, querysize, 4), 255, numpy.uint8)
         for i in range(dstile.RasterCount):
             array[:,:,i] = gdalarray.BandReadAsArray(  # NOQA
                 dsquery.GetRasterBand(i + 1), 0, 0, querysize, querysize
             )
-        im = Image.fromarray(array, 'RGBA')  # Always four bands
-        im1 = im.resize((tile_size, tile_size), Image.ANTIALIAS)
+        im = Image.fromarray(array, 'RGBA')
+        im1 = numpy.asarray(im.resize((tile_size, tile_size), Image.LANCZOS))
 
-        if path.exists():
-            im0 = Image.open(str(path))
-            im1 = Image.composite(im1, im0, im1)
+        for i in range(dstile.RasterCount):
+            gdalarray.BandWriteArray(dstile.GetRasterBand(i + 1), im1[:,:,i])  # NOQA
 
-        ensure_dir_exists(path.parent)
-        im1.save(str(path), 'PNG')
+    # Its tiles are drawn over the ones already in the output (see
+    # BaseImageOutput.write_tile), e.g. of a previous run over another input:
+    resample_antialias.over_existing = True
 
     if name == "average":
         return resample_average
@@ -56,7 +80,7 @@ def get_resampler(name, write_method):
 
     resampling_method = resampling_methods[name]
 
-    def resample_gdal(path, dsquery, dstile):
+    def resample_gdal(dsquery, dstile):
         querysize = dsquery.RasterXSize
         tile_size = dstile.RasterXSize
 
@@ -67,6 +91,4 @@ def get_resampler(name, write_method):
         if res != 0:
             raise ImageOutputException("ReprojectImage() failed with error %d" % res)
 
-        write_method(path, dstile)
-
     return resample_gdal
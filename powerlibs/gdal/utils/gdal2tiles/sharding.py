@@ -0,0 +1,118 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+from pathlib import PosixPath
+import shutil
+
+import numpy
+
+from .global_mercator import interleave_bits
+from .windows import tile_grid
+
+
+class ShardPlan:
+    """Deterministic split of a pyramid into `shards` partitions.
+
+    Every tile of the `zoom` level (the lowest one with at least four
+    tiles per shard) is the root of a subtree going down to the base
+    zoom. Roots are sorted along the Z-order curve, so each partition is
+    spatially compact, and cut into runs with about the same number of
+    base tiles. Everything from `zoom` down to the base level depends
+    only on one shard; the levels above it are built by the merge step."""
+
+    def __init__(self, tminmax, min_zoom, max_zoom, shards):
+        if shards < 1:
+            raise Exception('The number of shards must be at least 1.')
+
+        self.shards = shards
+        self.max_zoom = max_zoom
+        self.zoom = max_zoom
+        for tz in range(min_zoom, max_zoom + 1):
+            tminx, tminy, tmaxx, tmaxy = tminmax[tz]
+            if (tmaxx - tminx + 1) * (tmaxy - tminy + 1) >= 4 * shards:
+                self.zoom = tz
+                break
+
+        tminx, tminy, tmaxx, tmaxy = tminmax[self.zoom]
+        tx, ty = tile_grid(range(tminx, tmaxx + 1), range(tminy, tmaxy + 1))
+
+        # Weight of each root: how many base tiles are under it
+        depth = max_zoom - self.zoom
+        bminx, bminy, bmaxx, bmaxy = tminmax[max_zoom]
+        width = (
+            numpy.minimum((tx + 1) << depth, bmaxx + 1)
+            - numpy.maximum(tx << depth, bminx)
+        )
+        height = (
+            numpy.minimum((ty + 1) << depth, bmaxy + 1)
+            - numpy.maximum(ty << depth, bminy)
+        )
+        weights = numpy.maximum(width, 0) * numpy.maximum(height, 0)
+
+        order = numpy.argsort(interleave_bits(tx, ty), kind='stable')
+        cumulative = numpy.cumsum(weights[order])
+        targets = cumulative[-1] * numpy.arange(1, shards) / shards
+        boundaries = numpy.searchsorted(cumulative, targets, side='right')
+        self.roots = [
+            numpy.stack((tx[part], ty[part]), axis=1)
+            for part in numpy.split(order, boundaries)
+        ]
+
+    def get_keys(self, tx, ty, tz):
+        depth = tz - self.zoom
+        return (
+            (numpy.asarray(tx, numpy.int64) >> depth) << 32
+        ) | (numpy.asarray(ty, numpy.int64) >> depth)
+
+    def mask(self, shard, tx, ty, tz):
+        """Which of the given tiles (of a level >= self.zoom) belong
+        to the given shard."""
+        roots = self.roots[shard]
+        root_keys = (roots[:, 0].astype(numpy.int64) << 32) | roots[:, 1]
+        return numpy.isin(self.get_keys(tx, ty, tz), root_keys)
+
+    def contains(self, shard, tx, ty, tz):
+        return bool(self.mask(shard, [tx], [ty], tz)[0])
+
+
+def copy_tiles(source_dir, output_dir):
+    """Copy every tile rendered into source_dir to output_dir."""
+    source_dir = PosixPath(source_dir)
+    output_dir = PosixPath(output_dir)
+    if source_dir.resolve() == output_dir.resolve():
+        return
+
+    for path in source_dir.rglob('*.png'):
+        target = output_dir / path.relative_to(source_dir)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(str(path), str(target))
+
+
+def process_shard(profile_class, source_path, output_dir, shard, shards, kwargs):
+    tiler = profile_class(source_path, output_dir, **kwargs)
+    tiler.process(shard=shard, of=shards)
+    return shard
+
+
+def process_locally(profile_class, source_path, output_dir, shards, **kwargs):
+    """Run a sharded job on local processes, each one writing into its own
+    `shard-<i>` directory inside output_dir, and then merge them."""
+    output_dir = PosixPath(output_dir)
+    shard_dirs = [output_dir / f'shard-{i}' for i in range(shards)]
+
+    with ProcessPoolExecutor(max_workers=min(shards, os.cpu_count() or 1)) as executor:
+        futures = [
+            executor.submit(
+                process_shard,
+                profile_class, str(source_path), str(shard_dir),
+                i, shards, kwargs
+            )
+            for i, shard_dir in enumerate(shard_dirs)
+        ]
+        for future in futures:
+            future.result()
+
+    tiler = profile_class(source_path, output_dir, **kwargs)
+    tiler.merge_shards(shard_dirs)
+    for shard_dir in shard_dirs:
+        shutil.rmtree(str(shard_dir))
+    return tiler
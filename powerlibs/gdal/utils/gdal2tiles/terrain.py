@@ -0,0 +1,70 @@
+import numpy
+
+
+TERRAIN_DOWNSAMPLING_METHODS = ('mean', 'max')
+
+# Largest value encodable in 24 bits (R, G and B):
+MAX_ENCODED = 256 ** 3 - 1
+
+
+class TerrainRGB:
+    """Mapbox terrain-RGB encoding of elevations:
+
+        height = base + (R * 256 * 256 + G * 256 + B) * interval
+
+    Tiles of lower zoom levels are downsampled from the decoded
+    elevations (by their mean or max), never from the encoded colours."""
+
+    def __init__(self, downsampling='mean', base=-10000, interval=0.1):
+        if downsampling not in TERRAIN_DOWNSAMPLING_METHODS:
+            raise Exception(
+                f"'{downsampling}' can't be used for elevation tiles.",
+                f"Please use one of: {', '.join(TERRAIN_DOWNSAMPLING_METHODS)}."
+            )
+        self.downsampling = downsampling
+        self.base = base
+        self.interval = interval
+
+    def encode(self, heights, valid):
+        """Return (rgb, alpha) uint8 arrays; invalid pixels are transparent."""
+        encoded = numpy.round((heights - self.base) / self.interval)
+        encoded = numpy.clip(numpy.where(valid, encoded, 0), 0, MAX_ENCODED)
+        encoded = encoded.astype(numpy.uint32)
+
+        rgb = numpy.stack((
+            (encoded >> 16) & 0xff,
+            (encoded >> 8) & 0xff,
+            encoded & 0xff,
+        )).astype(numpy.uint8)
+        alpha = numpy.where(valid, 255, 0).astype(numpy.uint8)
+        return rgb, alpha
+
+    def decode(self, rgb, alpha=None):
+        """Return (heights, valid) from the bands of an encoded tile."""
+        r, g, b = (band.astype(numpy.float64) for band in rgb[:3])
+        heights = self.base + (r * 65536 + g * 256 + b) * self.interval
+        if alpha is None:
+            valid = numpy.ones(heights.shape, bool)
+        else:
+            valid = alpha > 0
+        return heights, valid
+
+    def reduce(self, heights, valid, factor):
+        """Downsample by `factor` (in both axes), ignoring invalid pixels."""
+        if factor == 1:
+            return heights, valid
+
+        rows, columns = heights.shape
+        shape = (rows // factor, factor, columns // factor, factor)
+        heights = heights.reshape(shape)
+        valid = valid.reshape(shape)
+
+        count = valid.sum(axis=(1, 3))
+        if self.downsampling == 'max':
+            reduced = numpy.where(valid, heights, -numpy.inf).max(axis=(1, 3))
+        else:
+            total = numpy.where(valid, heights, 0).sum(axis=(1, 3))
+            reduced = total / numpy.maximum(count, 1)
+
+        valid = count > 0
+        return numpy.where(valid, reduced, 0), valid
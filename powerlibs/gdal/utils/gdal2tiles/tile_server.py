@@ -0,0 +1,319 @@
+import argparse
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import logging
+import os
+from pathlib import PosixPath
+import queue
+import re
+from socketserver import ThreadingMixIn
+import threading
+
+from .defines import PROFILES
+from .utils import encode_tile
+
+
+logger = logging.getLogger(__name__)
+
+TILE_URL = re.compile(r'^/(\d+)/(\d+)/(\d+)\.png$')
+
+
+class DatasetPool:
+    """Fixed-size pool of (dataset, image output) pairs sharing the
+    same tiler, so concurrent renders never share a GDAL handle."""
+
+    def __init__(self, tiler, size):
+        self.tiler = tiler
+        self.items = queue.Queue()
+        for _ in range(size):
+            ds = tiler.open_output_dataset()
+            self.items.put((ds, tiler.create_image_output(ds)))
+
+    @contextmanager
+    def acquire(self):
+        item = self.items.get()
+        try:
+            yield item
+        finally:
+            self.items.put(item)
+
+
+class MemoryCache:
+    """Least-recently-used cache of tile bytes, bounded in total bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            data = self.items.get(key)
+            if data is not None:
+                self.items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def get_cache_namespace(tiler):
+    """Name of the cache directory of the tiles of `tiler`, from the
+    signature (path, mtime and size) of its sources and the options
+    changing the tiles, so a cache directory can be shared safely."""
+    parts = [type(tiler).__name__, tiler.resampling_method, tiler.tile_size]
+    for path in tiler.source_paths:
+        stat = os.stat(str(path))
+        parts += [str(path), stat.st_mtime_ns, stat.st_size]
+    parts += [
+        tiler.source_srs, tiler.source_nodata,
+        tiler.nodata_tolerance, tiler.nodata_rule,
+    ]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+class DiskCache:
+    """Tiles stored as z/x/y.png files under `directory`, evicting the
+    least recently used ones when the total size exceeds `max_bytes`.
+
+    Every tile found there is adopted, so the directory must only hold
+    tiles of the same source and options (see get_cache_namespace)."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = PosixPath(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        # Pick up what previous runs left, oldest first:
+        self.items = OrderedDict()
+        self.size = 0
+        found = []
+        for path in self.directory.rglob('*.png'):
+            stat = path.stat()
+            found.append((stat.st_mtime, str(path), stat.st_size))
+        for _, path, size in sorted(found):
+            self.items[path] = size
+            self.size += size
+
+    def get_path(self, key):
+        tz, tx, ty = key
+        return self.directory / str(tz) / str(tx) / f'{ty}.png'
+
+    def get(self, key):
+        path = str(self.get_path(key))
+        with self.lock:
+            if path not in self.items:
+                return None
+            self.items.move_to_end(path)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # (evicted meanwhile by another thread)
+            return None
+        return data
+
+    def put(self, key, data):
+        path = self.get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, str(path))
+
+        with self.lock:
+            self.size -= self.items.pop(str(path), 0)
+            self.items[str(path)] = len(data)
+            self.size += len(data)
+            while self.size > self.max_bytes and len(self.items) > 1:
+                evicted_path, evicted_size = self.items.popitem(last=False)
+                self.size -= evicted_size
+                try:
+                    os.unlink(evicted_path)
+                except FileNotFoundError:
+                    pass
+
+
+class TileRenderer:
+    """Render single tiles on demand from a tiler (a `Mercator`,
+    `Geodetic` or `Raster` instance), without pre-rendering the pyramid.
+
+    Every zoom level is read directly from the input raster (like the
+    overview-query mode does), using its overviews when available."""
+
+    def __init__(
+        self, tiler,
+        pool_size=4,
+        memory_cache_bytes=64 * 1024 * 1024,
+        disk_cache_dir=None, disk_cache_bytes=1024 * 1024 * 1024
+    ):
+        self.tiler = tiler
+        if not hasattr(tiler, 'out_ds'):
+            tiler.open_input()
+
+        self.pool = DatasetPool(tiler, pool_size)
+        self.memory_cache = MemoryCache(memory_cache_bytes)
+        # (each source and set of options has its own directory inside)
+        self.disk_cache = None
+        if disk_cache_dir is not None:
+            self.disk_cache = DiskCache(
+                PosixPath(disk_cache_dir) / get_cache_namespace(tiler),
+                disk_cache_bytes
+            )
+
+    def contains(self, tz, tx, ty):
+        tiler = self.tiler
+        if not tiler.min_zoom <= tz <= tiler.max_zoom:
+            return False
+        tminx, tminy, tmaxx, tmaxy = tiler.tminmax[tz]
+        return tminx <= tx <= tmaxx and tminy <= ty <= tmaxy
+
+    def get_tile(self, tz, tx, ty):
+        """Return the PNG bytes of the given (TMS) tile
+        or None if it's outside the pyramid."""
+        if not self.contains(tz, tx, ty):
+            return None
+
+        metrics = self.tiler.metrics
+        key = (tz, tx, ty)
+        data = self.memory_cache.get(key)
+        if data is not None:
+            metrics.count('memory_cache_hits', 1, tz)
+            return data
+
+        if self.disk_cache is not None:
+            data = self.disk_cache.get(key)
+            if data is not None:
+                metrics.count('disk_cache_hits', 1, tz)
+
+        if data is None:
+            with metrics.timer('render', tz):
+                data = self.render(tz, tx, ty)
+            metrics.count('bytes_encoded', len(data), tz)
+            if self.disk_cache is not None:
+                self.disk_cache.put(key, data)
+
+        self.memory_cache.put(key, data)
+        return data
+
+    def render(self, tz, tx, ty):
+        xyzzy = self.tiler.generate_base_tile_xyzzy(tx, ty, tz)
+        with self.pool.acquire() as (ds, image_output):
+            image_output.zoom = tz
+            alpha = image_output.read_alpha(xyzzy)
+            dstile = image_output.render_base_tile(xyzzy, alpha)
+            return encode_tile(dstile)
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+    """Serve /z/x/y.png (TMS y, unless the server has xyz=True)."""
+
+    def do_GET(self):
+        match = TILE_URL.match(self.path.split('?')[0])
+        if not match:
+            self.send_error(404)
+            return
+
+        tz, tx, ty = (int(value) for value in match.groups())
+        tiler = self.server.renderer.tiler
+        if not tiler.min_zoom <= tz <= tiler.max_zoom:
+            self.send_error(404)
+            return
+        if self.server.xyz:
+            ty = (2 ** tz - 1) - ty
+
+        try:
+            data = self.server.renderer.get_tile(tz, tx, ty)
+        except Exception:
+            logger.exception(f'Could not render tile {tz}/{tx}/{ty}')
+            self.send_error(500)
+            return
+
+        if data is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class TileHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, renderer, xyz=False):
+        super().__init__(address, TileRequestHandler)
+        self.renderer = renderer
+        self.xyz = xyz
+
+
+def serve(renderer, host='127.0.0.1', port=8000, xyz=False):
+    server = TileHTTPServer((host, port), renderer, xyz=xyz)
+    logger.info(f'Serving tiles on http://{host}:{server.server_port}/')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main():
+    from . import Geodetic, Mercator, Raster
+
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING'))
+
+    profile_classes = {
+        'mercator': Mercator,
+        'geodetic': Geodetic,
+        'raster': Raster,
+    }
+
+    parser = argparse.ArgumentParser(
+        description='Serve the tiles of a raster, rendering them on demand.'
+    )
+    parser.add_argument('source')
+    parser.add_argument('--profile', choices=PROFILES, default='mercator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--xyz', action='store_true')
+    parser.add_argument('--resampling', default='average')
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--memory-cache-mb', type=int, default=64)
+    parser.add_argument('--disk-cache-dir', default=None)
+    parser.add_argument('--disk-cache-mb', type=int, default=1024)
+    args = parser.parse_args()
+
+    tiler = profile_classes[args.profile](
+        args.source, None,
+        resampling_method=args.resampling
+    )
+    renderer = TileRenderer(
+        tiler,
+        pool_size=args.pool_size,
+        memory_cache_bytes=args.memory_cache_mb * 1024 * 1024,
+        disk_cache_dir=args.disk_cache_dir,
+        disk_cache_bytes=args.disk_cache_mb * 1024 * 1024,
+    )
+    serve(renderer, args.host, args.port, xyz=args.xyz)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,18 @@
+import uuid
+
+import numpy
 from osgeo import gdal
 
 
-PNG_DRIVER = gdal.GetDriverByName('PNG')
+# The PNG driver, looked up on first use (see get_png_driver):
+_png_driver = None
+
+
+def get_png_driver():
+    global _png_driver
+    if _png_driver is None:
+        _png_driver = get_gdal_driver('PNG')
+    return _png_driver
 
 
 def get_gdal_driver(name):
@@ -14,8 +25,24 @@ def get_gdal_driver(name):
         return driver
 
 
-def gdal_write(path, dstile):
-    PNG_DRIVER.CreateCopy(str(path), dstile, strict=0)
+def gdal_write(path, dstile, options=()):
+    get_png_driver().CreateCopy(str(path), dstile, strict=0, options=list(options))
+
+
+def encode_tile(dstile, driver=None):
+    """Encode a tile image (PNG, by default) in memory and return its bytes."""
+    path = f'/vsimem/gdal2tiles-{uuid.uuid4().hex}'
+    (driver or get_png_driver()).CreateCopy(path, dstile, strict=0)
+    try:
+        f = gdal.VSIFOpenL(path, 'rb')
+        gdal.VSIFSeekL(f, 0, 2)
+        size = gdal.VSIFTellL(f)
+        gdal.VSIFSeekL(f, 0, 0)
+        data = gdal.VSIFReadL(1, size, f)
+        gdal.VSIFCloseL(f)
+    finally:
+        gdal.Unlink(path)
+    return data
 
 
 def ensure_dir_exists(path):
@@ -23,3 +50,10 @@ def ensure_dir_exists(path):
         return True
     path.mkdir(parents=True, exist_ok=True)
     return False
+
+
+def build_tminmax(tminx, tminy, tmaxx, tmaxy):
+    """Turn per-zoom arrays of tile ranges into the `tminmax` list of
+    (tminx, tminy, tmaxx, tmaxy) tuples of plain ints."""
+    columns = numpy.stack((tminx, tminy, tmaxx, tmaxy), axis=1)
+    return [tuple(row) for row in columns.astype(numpy.int64).tolist()]
@@ -0,0 +1,212 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import uuid
+
+from osgeo import gdal
+
+from .utils import get_gdal_driver
+
+
+def get_vsimem_path(suffix):
+    return f'/vsimem/gdal2tiles-{uuid.uuid4().hex}{suffix}'
+
+
+def is_rotated(ds):
+    """Whether the geotransform of the dataset has rotation or skew."""
+    geotransform = ds.GetGeoTransform()
+    return (geotransform[2], geotransform[4]) != (0, 0)
+
+
+def create_warped_vrt(
+    src_ds, src_wkt, dst_wkt,
+    resolution=None, nodata=None, add_alpha=False,
+    resampling='near', threads='ALL_CPUS', memory_limit=None
+):
+    """Create a warped VRT of `src_ds` in the `dst_wkt` reference system,
+    entirely in memory (/vsimem/).
+
+    The warper options (threads, memory limit, resampling algorithm and
+    nodata handling) are stored in the VRT itself, so they apply to every
+    later read. Returns the VRT path and the opened dataset.
+
+    With empty reference systems the input is only resampled to a north
+    up grid, which is how rotated/skewed rasters without SRS are handled."""
+
+    warp_options = []
+    if threads:
+        warp_options.append(f'NUM_THREADS={threads}')
+
+    if nodata is not None:
+        warp_options += ['INIT_DEST=NO_DATA', 'UNIFIED_SRC_NODATA=YES']
+    elif add_alpha:
+        # equivalent of gdalwarp -dstalpha
+        warp_options.append('INIT_DEST=0')
+
+    # (one value per band, as gdalwarp's -srcnodata "v1 v2 v3")
+    if isinstance(nodata, (list, tuple)):
+        nodata = ' '.join(str(value) for value in nodata)
+
+    kwargs = {}
+    if resolution is not None:
+        kwargs['xRes'] = kwargs['yRes'] = resolution
+    if memory_limit is not None:
+        kwargs['warpMemoryLimit'] = memory_limit
+
+    options = gdal.WarpOptions(
+        format='VRT',
+        srcSRS=src_wkt or None,
+        dstSRS=dst_wkt or None,
+        srcNodata=nodata,
+        dstNodata=nodata,
+        dstAlpha=add_alpha,
+        resampleAlg=resampling,
+        warpOptions=warp_options,
+        multithread=bool(threads),
+        **kwargs
+    )
+
+    path = get_vsimem_path('.vrt')
+    ds = gdal.Warp(path, src_ds, options=options)
+    if ds is None:
+        raise Exception(f'Could not create the warped VRT "{path}".')
+
+    # (written to /vsimem/ only now, so other handles can open it by path)
+    ds.FlushCache()
+    return path, ds
+
+
+def release_vsimem(path):
+    if path is not None:
+        gdal.Unlink(path)
+
+
+INTERMEDIATE_CREATION_OPTIONS = (
+    'TILED=YES',
+    'BLOCKXSIZE=512',
+    'BLOCKYSIZE=512',
+    'COMPRESS=DEFLATE',
+    'PREDICTOR=2',
+    'ZLEVEL=1',
+    'BIGTIFF=IF_SAFER',
+    'NUM_THREADS=ALL_CPUS',
+)
+
+
+def get_overview_factors(xsize, ysize, min_size=256):
+    factors = []
+    factor = 2
+    while max(xsize, ysize) / factor >= min_size:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def iter_chunks(xsize, ysize, chunk_size):
+    for y in range(0, ysize, chunk_size):
+        for x in range(0, xsize, chunk_size):
+            yield x, y, min(chunk_size, xsize - x), min(chunk_size, ysize - y)
+
+
+def materialize_warped(
+    src_path, dst_path, workers=None, chunk_size=2048,
+    creation_options=INTERMEDIATE_CREATION_OPTIONS, min_overview_size=256
+):
+    """Warp the dataset at `src_path` (usually a warped VRT) once into a
+    tiled, compressed GeoTIFF with internal overviews.
+
+    Chunks are warped by a pool of threads, each one reading through its
+    own handle of the source, while the calling thread writes them. The
+    overviews fine enough to be aligned with the chunks are downsampled
+    from each chunk while it's still in memory; only the coarser ones are
+    computed afterwards, from the coarsest overview written in-pass."""
+
+    src_ds = gdal.Open(src_path, gdal.GA_ReadOnly)
+    xsize, ysize = src_ds.RasterXSize, src_ds.RasterYSize
+    band_count = src_ds.RasterCount
+    data_type = src_ds.GetRasterBand(1).DataType
+    nodata_values = [
+        src_ds.GetRasterBand(i).GetNoDataValue()
+        for i in range(1, band_count + 1)
+    ]
+
+    driver = get_gdal_driver('GTiff')
+    dst_ds = driver.Create(
+        dst_path, xsize, ysize, band_count, data_type,
+        options=list(creation_options)
+    )
+    dst_ds.SetGeoTransform(src_ds.GetGeoTransform())
+    dst_ds.SetProjection(src_ds.GetProjection())
+    for i in range(1, band_count + 1):
+        src_band = src_ds.GetRasterBand(i)
+        dst_band = dst_ds.GetRasterBand(i)
+        dst_band.SetColorInterpretation(src_band.GetColorInterpretation())
+        if nodata_values[i - 1] is not None:
+            dst_band.SetNoDataValue(nodata_values[i - 1])
+
+    factors = get_overview_factors(xsize, ysize, min_overview_size)
+    in_pass_factors = [f for f in factors if f <= chunk_size]
+    if factors:
+        dst_ds.BuildOverviews('NONE', factors)
+
+    local = threading.local()
+
+    def warp_chunk(chunk):
+        if not hasattr(local, 'ds'):
+            local.ds = gdal.Open(src_path, gdal.GA_ReadOnly)
+        x, y, w, h = chunk
+        return chunk, local.ds.ReadRaster(x, y, w, h)
+
+    def write_chunk(chunk, data):
+        x, y, w, h = chunk
+        dst_ds.WriteRaster(x, y, w, h, data)
+        if not in_pass_factors:
+            return
+
+        mem_ds = get_gdal_driver('MEM').Create('', w, h, band_count, data_type)
+        mem_ds.WriteRaster(0, 0, w, h, data)
+        for i, nodata in enumerate(nodata_values, 1):
+            if nodata is not None:
+                mem_ds.GetRasterBand(i).SetNoDataValue(nodata)
+        for level, factor in enumerate(in_pass_factors):
+            ox, oy = x // factor, y // factor
+            ow = -(-(x + w) // factor) - ox
+            oh = -(-(y + h) // factor) - oy
+            overview_data = mem_ds.ReadRaster(
+                0, 0, w, h, ow, oh, resample_alg=gdal.GRIORA_Average
+            )
+            for i in range(1, band_count + 1):
+                overview = dst_ds.GetRasterBand(i).GetOverview(level)
+                band_size = ow * oh * gdal.GetDataTypeSize(data_type) // 8
+                offset = (i - 1) * band_size
+                overview.WriteRaster(
+                    ox, oy, ow, oh, overview_data[offset:offset + band_size]
+                )
+
+    # Keep a bounded number of warped chunks in memory at once:
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        max_pending = 2 * workers
+        for chunk in iter_chunks(xsize, ysize, chunk_size):
+            pending.append(executor.submit(warp_chunk, chunk))
+            if len(pending) >= max_pending:
+                write_chunk(*pending.popleft().result())
+        while pending:
+            write_chunk(*pending.popleft().result())
+
+    # Overviews too coarse to be aligned with the chunks:
+    coarse_levels = range(len(in_pass_factors), len(factors))
+    if coarse_levels and in_pass_factors:
+        for i in range(1, band_count + 1):
+            band = dst_ds.GetRasterBand(i)
+            source = band.GetOverview(len(in_pass_factors) - 1)
+            targets = [band.GetOverview(level) for level in coarse_levels]
+            gdal.RegenerateOverviews(source, targets, 'AVERAGE')
+    elif coarse_levels:
+        dst_ds.BuildOverviews('AVERAGE', factors)
+
+    dst_ds.FlushCache()
+    dst_ds = None
+    return gdal.Open(dst_path, gdal.GA_ReadOnly)
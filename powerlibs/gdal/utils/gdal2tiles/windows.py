@@ -0,0 +1,102 @@
+import numpy
+
+from .xyzzy import Xyzzy
+
+
+WINDOW_FIELDS = ('tx', 'ty') + Xyzzy._fields
+WINDOW_DTYPE = numpy.dtype([(name, numpy.int64) for name in WINDOW_FIELDS])
+
+
+def tile_grid(x_range, y_range):
+    """Every (tx, ty) pair, in the same order the tile loops visit them:
+    column by column, each column in `y_range` order."""
+    xs = numpy.asarray(x_range, numpy.int64)
+    ys = numpy.asarray(y_range, numpy.int64)
+    return numpy.repeat(xs, len(ys)), numpy.tile(ys, len(xs))
+
+
+def truncate(values):
+    """Round towards zero, like `int()` does."""
+    return numpy.trunc(values).astype(numpy.int64)
+
+
+def clip_axis(r, rsize, wsize, limit):
+    """Vectorized out-of-bounds correction of one axis of the windows of
+    `geo_query_array` (rsize must be positive)."""
+    r, rsize, wsize = (numpy.array(values, numpy.int64) for values in (r, rsize, wsize))
+    w = numpy.zeros_like(wsize)
+
+    before = r < 0
+    shift = -r[before] / rsize[before]
+    w[before] = truncate(wsize[before] * shift)
+    wsize[before] -= w[before]
+    rsize[before] -= truncate(rsize[before] * shift)
+    r[before] = 0
+
+    after = r + rsize > limit
+    wsize[after] = truncate(wsize[after] * ((limit - r[after]) / rsize[after]))
+    rsize[after] = limit - r[after]
+    return r, rsize, w, wsize
+
+
+def geo_query_array(
+    geotransform, raster_xsize, raster_ysize,
+    ulx, uly, lrx, lry, querysize=0
+):
+    """For a dataset (its geotransform and size) and arrays of queries in
+    cartographic coordinates, return arrays of parameters for
+    ReadRaster() in raster coordinates and of x/y shifts (for border
+    tiles). If the querysize is not given, the extent is returned in the
+    native resolution of the dataset."""
+    gt = geotransform
+    if not gt[1] or not gt[5]:
+        raise Exception(f"Invalid geotransform {tuple(gt)}: the pixel size is zero.")
+
+    rx = truncate((ulx - gt[0]) / gt[1] + 0.001)
+    ry = truncate((uly - gt[3]) / gt[5] + 0.001)
+    rxsize = truncate((lrx - ulx) / gt[1] + 0.5)
+    rysize = truncate((lry - uly) / gt[5] + 0.5)
+    if numpy.any(rxsize <= 0) or numpy.any(rysize <= 0):
+        raise Exception(
+            "Tiles smaller than a pixel of the input can't be read.",
+            "Please use a lower max_zoom."
+        )
+
+    if not querysize:
+        wxsize, wysize = rxsize, rysize
+    else:
+        wxsize = numpy.full_like(rxsize, querysize)
+        wysize = numpy.full_like(rysize, querysize)
+
+    # Coordinates should not go out of the bounds of the raster
+    rx, rxsize, wx, wxsize = clip_axis(rx, rxsize, wxsize, raster_xsize)
+    ry, rysize, wy, wysize = clip_axis(ry, rysize, wysize, raster_ysize)
+
+    return (rx, ry, rxsize, rysize), (wx, wy, wxsize, wysize)
+
+
+def build_window_table(tx, ty, querysize, rb, wb):
+    """Pack the windows of many tiles into a WINDOW_DTYPE array."""
+    table = numpy.empty(len(tx), WINDOW_DTYPE)
+    table['tx'] = tx
+    table['ty'] = ty
+    table['querysize'] = querysize
+    for name, values in zip(('rx', 'ry', 'rxsize', 'rysize'), rb):
+        table[name] = values
+    for name, values in zip(('wx', 'wy', 'wxsize', 'wysize'), wb):
+        table[name] = values
+    return table
+
+
+def split_columns(table):
+    """Split a window table into one table per tile column (tx)."""
+    if not len(table):
+        return []
+    boundaries = numpy.flatnonzero(numpy.diff(table['tx'])) + 1
+    return numpy.split(table, boundaries)
+
+
+def iter_windows(table):
+    """Yield (tx, ty, xyzzy) for each row of a window table."""
+    for row in table.tolist():
+        yield row[0], row[1], Xyzzy(*row[2:])
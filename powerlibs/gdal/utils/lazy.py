@@ -0,0 +1,27 @@
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is only imported when one of its
+    attributes is first used, so importing our modules stays cheap
+    for workers that never touch the heavy dependencies."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attribute):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_module'] = module
+
+        # Cache it, so next lookups don't come through here:
+        value = getattr(module, attribute)
+        self.__dict__[attribute] = value
+        return value
+
+
+def lazy_import(name):
+    return LazyModule(name)
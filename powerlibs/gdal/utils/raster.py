@@ -1,15 +1,23 @@
 from osgeo import gdal, osr
-from shapely.geometry import Point
+
+from .lazy import lazy_import
+
+
+# Metadata-only users never need these:
+shapely_geometry = lazy_import('shapely.geometry')
+elevation_index = lazy_import('powerlibs.gdal.utils.elevation_index')
 
 
 class RasterFile:
     def __init__(self, orthomosaic_path):
         raster = gdal.Open(str(orthomosaic_path))
+        self.path = orthomosaic_path
         self.raster = raster
         wkt = raster.GetProjection()
         width, height = raster.RasterXSize, raster.RasterYSize
 
-        ulx, xres, _, uly, _, yres = raster.GetGeoTransform()
+        self.geotransform = raster.GetGeoTransform()
+        ulx, xres, _, uly, _, yres = self.geotransform
         lrx = ulx + (raster.RasterXSize * xres)
         lry = uly + (raster.RasterYSize * yres)
         native_bounds = (ulx, uly, lrx, lry)
@@ -45,7 +53,6 @@ class RasterFile:
         bounds = [transformation.TransformPoint(x, y)[:2] for x, y in coordinates]
         bounds = (bounds[0][0], bounds[0][1], bounds[1][0], bounds[1][1])
         center_coordinates = ((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
-        center = Point(center_coordinates)
 
         self.width = width
         self.height = height
@@ -56,4 +63,28 @@ class RasterFile:
         self.bounds = bounds
 
         self.center_coordinates = center_coordinates
-        self.center = center
+        self._center = None
+
+        self._elevation_index = None
+
+    @property
+    def center(self):
+        if self._center is None:
+            self._center = shapely_geometry.Point(self.center_coordinates)
+        return self._center
+
+    def get_elevation_index(self, block_size=256, workers=None):
+        """Min/max/sum/count pyramid of the band, persisted as a sidecar
+        file next to the raster and rebuilt when the raster changes."""
+        index = self._elevation_index
+        if index is None or index.is_stale() or index.block_size != block_size:
+            index = elevation_index.ElevationIndex.open(
+                self.path, block_size=block_size, workers=workers
+            )
+            self._elevation_index = index
+        return index
+
+    def get_region_statistics(self, minx, miny, maxx, maxy):
+        """Min/max/mean altitude inside a box in the native coordinates."""
+        index = self.get_elevation_index()
+        return index.query_bounds(self.geotransform, minx, miny, maxx, maxy)
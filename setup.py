@@ -27,6 +27,12 @@ setup(
     package_data={'': ['LICENSE', 'README.md']},
     include_package_data=True,
     install_requires=[],
+    entry_points={
+        'console_scripts': [
+            'gdal2tiles-batch = powerlibs.gdal.utils.gdal2tiles.batch:main',
+            'raster-catalog = powerlibs.gdal.utils.catalog:main',
+        ],
+    },
     dependency_links=[],
     zip_safe=False,
     keywords='generic libraries',
@@ -0,0 +1,53 @@
+from pathlib import PosixPath
+import sys
+
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator  # noqa: E402
+from powerlibs.gdal.utils.gdal2tiles.batch import BatchJob, BatchRunner  # noqa: E402
+
+
+def read_tiles(output_dir):
+    output_dir = PosixPath(output_dir)
+    return {
+        str(path.relative_to(output_dir)): path.read_bytes()
+        for path in output_dir.rglob('*.png')
+    }
+
+
+def test_batch_tiles_every_job_like_a_single_run(tmp_path):
+    big = create_synthetic_raster(tmp_path / 'big.tif', 2000, 1500, pixel_size=0.3)
+    small = create_synthetic_raster(tmp_path / 'small.tif', 600, 400, pixel_size=0.3, seed=1)
+    jobs = [
+        BatchJob(small, tmp_path / 'small', name='small'),
+        BatchJob(tmp_path / 'missing.tif', tmp_path / 'missing', name='missing'),
+        BatchJob(big, tmp_path / 'big', name='big'),
+    ]
+    # (only the big job is bigger than a shard)
+    shard_size = jobs[2].size // 2
+
+    summaries = BatchRunner(workers=2, shard_size=shard_size).run(jobs)
+
+    assert [summary['name'] for summary in summaries] == ['small', 'missing', 'big']
+    assert [summary['status'] for summary in summaries] == ['done', 'failed', 'done']
+    assert [summary['shards'] for summary in summaries] == [1, 1, 2]
+    assert 'not possible to open' in summaries[1]['error']
+
+    for name, source in (('small', small), ('big', big)):
+        Mercator(source, tmp_path / 'expected' / name).process()
+        expected = read_tiles(tmp_path / 'expected' / name)
+        tiles = read_tiles(tmp_path / name)
+        assert sorted(tiles) == sorted(expected), name
+        for key, data in expected.items():
+            assert tiles[key] == data, (name, key)
+
+        summary = summaries[[job.name for job in jobs].index(name)]
+        assert summary['tiles'] == len(tiles), name
+    assert not list((tmp_path / 'big').glob('shard-*'))
@@ -0,0 +1,74 @@
+import os
+from pathlib import PosixPath
+import sys
+
+import pytest
+
+
+pytest.importorskip('osgeo.gdal')
+pytest.importorskip('shapely')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from shapely import wkt  # noqa: E402
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.catalog import RasterCatalog  # noqa: E402
+
+
+@pytest.fixture
+def rasters(tmp_path):
+    root = tmp_path / 'rasters'
+    (root / 'nested').mkdir(parents=True)
+    west = create_synthetic_raster(root / 'west.tif', 200, 100, pixel_size=1.0)
+    east = create_synthetic_raster(
+        root / 'nested' / 'east.tif', 200, 100, pixel_size=1.0, origin=(510000.0, 7500000.0)
+    )
+    (root / 'broken.tif').write_bytes(b'not a raster')
+    return root, str(west.resolve()), str(east.resolve())
+
+
+def test_scan_indexes_every_raster_and_records_the_failures(rasters, tmp_path):
+    root, west, east = rasters
+    catalog = RasterCatalog(tmp_path / 'catalog.sqlite')
+
+    result = catalog.scan(root, workers=2)
+
+    assert sorted(result['indexed']) == sorted([west, east])
+    assert list(result['failed']) == [str((root / 'broken.tif').resolve())]
+    assert len(catalog) == 2
+    row = catalog.get(west)
+    # (the gsd is in centimeters)
+    assert (row['epsg'], row['width'], row['height'], row['gsd']) == (32723, 200, 100, 100.0)
+    assert list(catalog.get_failures()) == list(result['failed'])
+
+
+def test_rescan_only_reads_the_changed_files(rasters, tmp_path):
+    root, west, east = rasters
+    catalog = RasterCatalog(tmp_path / 'catalog.sqlite')
+    catalog.scan(root, workers=1)
+
+    result = catalog.scan(root, workers=1)
+    assert result['indexed'] == [] and result['failed'] == {}
+    assert len(result['skipped']) == 3
+
+    stat = os.stat(west)
+    os.utime(west, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    os.unlink(east)
+    result = catalog.scan(root, workers=1)
+    assert result['indexed'] == [west]
+    assert result['removed'] == [east]
+    assert [row['path'] for row in catalog] == [west]
+
+
+def test_covering_finds_the_rasters_under_a_point(rasters, tmp_path):
+    root, west, east = rasters
+    catalog = RasterCatalog(tmp_path / 'catalog.sqlite')
+    catalog.scan(root, workers=1)
+
+    west_center = wkt.loads(catalog.get(west)['footprint']).centroid
+    east_center = wkt.loads(catalog.get(east)['footprint']).centroid
+
+    assert catalog.covering(west_center) == [west]
+    assert catalog.covering(east_center) == [east]
+    assert catalog.covering(west_center.buffer(1)) == sorted([east, west])
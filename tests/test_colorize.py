@@ -0,0 +1,69 @@
+from pathlib import PosixPath
+import sys
+
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Raster  # noqa: E402
+from powerlibs.gdal.utils.gdal2tiles.colorize import Colorizer, apply_ramp, scale_to_byte  # noqa: E402
+
+
+def read_tiles(output_dir):
+    output_dir = PosixPath(output_dir)
+    return {
+        str(path.relative_to(output_dir)): gdal.Open(str(path)).ReadAsArray().astype(numpy.int64)
+        for path in output_dir.rglob('*.png')
+    }
+
+
+def test_scale_and_ramp_map_the_range_ends_to_the_end_colours():
+    values = numpy.array([[-5.0, 0.0, 50.0, 100.0, 120.0]])
+
+    assert scale_to_byte(values, 0, 100).tolist() == [[0, 0, 128, 255, 255]]
+
+    stops = ((0.0, (0, 0, 0)), (1.0, (200, 100, 50)))
+    rgb = apply_ramp(values, stops, 0, 100)
+    assert rgb[:, 0, 2].tolist() == [100, 50, 25]
+    assert rgb[:, 0, 4].tolist() == [200, 100, 50]
+
+
+def test_colorizer_makes_invalid_pixels_transparent():
+    values = numpy.array([[1.0, numpy.nan], [3.0, 4.0]])
+    valid = numpy.isfinite(values)
+
+    bands, alpha = Colorizer(minimum=1, maximum=4).render(values, valid, (1, 1))
+
+    assert bands.shape == (1, 2, 2)
+    assert alpha.tolist() == [[255, 0], [255, 255]]
+    assert (bands[0][valid] == [0, 170, 255]).all()
+
+
+def test_float_tiles_match_the_tiles_of_the_prescaled_raster(tmp_path):
+    dsm = create_synthetic_raster(
+        tmp_path / 'dsm.tif', 1200, 900, bands=1, pixel_size=0.3, data_type=gdal.GDT_Float32
+    )
+    prescaled = str(tmp_path / 'prescaled.tif')
+    gdal.Translate(prescaled, str(dsm), options=gdal.TranslateOptions(
+        outputType=gdal.GDT_Byte, scaleParams=[[0, 300, 0, 255]]
+    ))
+
+    Raster(dsm, tmp_path / 'float', colorizer=Colorizer(minimum=0, maximum=300)).process()
+    Raster(prescaled, tmp_path / 'byte').process()
+
+    colorized = read_tiles(tmp_path / 'float')
+    expected = read_tiles(tmp_path / 'byte')
+    assert expected
+    assert sorted(colorized) == sorted(expected)
+    for name, tile in expected.items():
+        assert tile.shape == colorized[name].shape == (2, 256, 256), name
+        assert numpy.array_equal(colorized[name][1], tile[1]), name
+        inside = tile[1] > 0
+        # (scaling before or after resampling only changes the rounding)
+        assert numpy.abs(colorized[name][0] - tile[0])[inside].max() <= 2, name
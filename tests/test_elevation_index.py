@@ -0,0 +1,135 @@
+import os
+
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from powerlibs.gdal.utils import elevation_index  # noqa: E402
+from powerlibs.gdal.utils.elevation_index import ElevationIndex, get_index_path  # noqa: E402
+
+
+NODATA = -9999.0
+
+
+def create_dsm(path, width, height, seed=0):
+    random = numpy.random.RandomState(seed)
+    y, x = numpy.mgrid[0:height, 0:width]
+    data = (100 + 20 * numpy.sin(x / 37.0) * numpy.cos(y / 23.0)).astype(numpy.float32)
+    data += random.normal(0, 2, data.shape).astype(numpy.float32)
+    data[random.rand(height, width) < 0.05] = NODATA
+    data[:40, :60] = NODATA
+
+    ds = gdal.GetDriverByName('GTiff').Create(str(path), width, height, 1, gdal.GDT_Float32)
+    band = ds.GetRasterBand(1)
+    band.WriteArray(data)
+    band.SetNoDataValue(NODATA)
+    ds.FlushCache()
+    return data
+
+
+def expected_statistics(data, xoff, yoff, xsize, ysize):
+    x0, y0 = max(0, xoff), max(0, yoff)
+    window = data[y0:max(y0, yoff + ysize), x0:max(x0, xoff + xsize)]
+    values = window[window != NODATA].astype(numpy.float64)
+    if not values.size:
+        return None
+    return values.min(), values.max(), values.mean(), values.size
+
+
+@pytest.fixture
+def dsm(tmp_path):
+    path = tmp_path / 'dsm.tif'
+    return path, create_dsm(path, 1000, 700)
+
+
+def test_query_matches_numpy(dsm):
+    path, data = dsm
+    index = ElevationIndex.open(path, block_size=64)
+    height, width = data.shape
+
+    random = numpy.random.RandomState(1)
+    windows = [
+        (0, 0, width, height),
+        (-50, -30, 200, 150),
+        (width - 90, height - 70, 300, 300),
+        (0, 0, 60, 40),
+        (64, 128, 64, 64),
+    ]
+    for _ in range(50):
+        xoff = int(random.randint(-100, width))
+        yoff = int(random.randint(-100, height))
+        windows.append((xoff, yoff, int(random.randint(1, 600)), int(random.randint(1, 600))))
+
+    for window in windows:
+        statistics = index.query(*window)
+        expected = expected_statistics(data, *window)
+        if expected is None:
+            assert statistics.count == 0, window
+            assert statistics.minimum is None, window
+            continue
+
+        minimum, maximum, mean, count = expected
+        assert statistics.count == count, window
+        assert statistics.minimum == pytest.approx(minimum), window
+        assert statistics.maximum == pytest.approx(maximum), window
+        assert statistics.mean == pytest.approx(mean), window
+
+
+def test_sidecar_is_reused_while_the_source_is_unchanged(dsm):
+    path, data = dsm
+    index = ElevationIndex.open(path, block_size=64)
+    index_mtime = os.stat(get_index_path(path)).st_mtime_ns
+
+    reopened = ElevationIndex.open(path, block_size=64)
+
+    assert reopened.signature == index.signature
+    assert os.stat(get_index_path(path)).st_mtime_ns == index_mtime
+
+
+def test_sidecar_is_rebuilt_when_the_mtime_changes(dsm):
+    path, data = dsm
+    index = ElevationIndex.open(path, block_size=64)
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert index.is_stale()
+    rebuilt = ElevationIndex.open(path, block_size=64)
+
+    assert rebuilt.signature == (stat.st_mtime_ns + 10 ** 9, stat.st_size)
+    assert ElevationIndex.load(get_index_path(path)).signature == rebuilt.signature
+
+
+def test_sidecar_is_rebuilt_when_the_size_changes(dsm):
+    path, data = dsm
+    ElevationIndex.open(path, block_size=64)
+    stat = os.stat(str(path))
+
+    data = create_dsm(path, 500, 300, seed=2)
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(str(path)).st_size != stat.st_size
+
+    rebuilt = ElevationIndex.open(path, block_size=64)
+
+    assert (rebuilt.width, rebuilt.height) == (500, 300)
+    assert rebuilt.query(0, 0, 500, 300).count == (data != NODATA).sum()
+
+
+def test_thin_strip_of_a_wide_raster_is_reduced_without_padding(tmp_path, monkeypatch):
+    path = tmp_path / 'wide.tif'
+    data = create_dsm(path, 5000, 200)
+    index = ElevationIndex.open(path, block_size=64)
+
+    # (the border strips must not be padded to blocks of their width)
+    def fail(*args):
+        raise AssertionError('block_statistics called by a query')
+    monkeypatch.setattr(elevation_index, 'block_statistics', fail)
+
+    for window in ((0, 10, 5000, 3), (7, 130, 4990, 50), (3, 0, 5, 200)):
+        statistics = index.query(*window)
+        minimum, maximum, mean, count = expected_statistics(data, *window)
+        assert statistics.count == count, window
+        assert statistics.minimum == pytest.approx(minimum), window
+        assert statistics.maximum == pytest.approx(maximum), window
+        assert statistics.mean == pytest.approx(mean), window
@@ -0,0 +1,22 @@
+import importlib.util
+from pathlib import PosixPath
+import sys
+
+import pytest
+
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+import import_time  # noqa: E402
+
+
+@pytest.mark.parametrize('statement, allowed', import_time.CHECKS)
+def test_import_loads_no_unexpected_heavy_modules(statement, allowed):
+    for name in allowed:
+        if importlib.util.find_spec(name) is None:
+            pytest.skip(f'{name} is not installed')
+
+    result = import_time.probe(statement)
+
+    unexpected = [name for name in result['loaded'] if name not in allowed]
+    assert not unexpected, f'{statement} loaded {", ".join(unexpected)}'
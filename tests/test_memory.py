@@ -0,0 +1,52 @@
+import asyncio
+from pathlib import PosixPath
+import sys
+
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator, memory  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def source_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('source') / 'source.tif'
+    return create_synthetic_raster(path, 2048, 2048, pixel_size=0.3)
+
+
+def test_degrading_lowers_the_async_concurrency(source_path, tmp_path, monkeypatch):
+    tiler = Mercator(source_path, tmp_path, memory_budget=4 * 1024 ** 3)
+
+    # (always over the threshold, so every check out of cooldown degrades)
+    monkeypatch.setattr(memory, 'get_rss', lambda: 8 * 1024 ** 3)
+    monkeypatch.setattr(memory, 'DEGRADE_COOLDOWN', 0)
+
+    loop = asyncio.new_event_loop()
+    try:
+        report = loop.run_until_complete(tiler.process_async(concurrency=4))
+    finally:
+        loop.close()
+
+    assert report['workers'] == 4
+    assert report['memory']['workers'] == 4
+    assert report['memory']['degradations'] > 0
+    assert report['memory']['current_workers'] < 4
+    assert report['memory']['queue_size'] == memory.MIN_QUEUE_SIZE
+
+
+def test_peak_rss_alone_never_degrades(source_path, tmp_path, monkeypatch):
+    tiler = Mercator(source_path, tmp_path, memory_budget=4 * 1024 ** 3)
+
+    monkeypatch.setattr(memory, 'get_rss', lambda: None)
+    monkeypatch.setattr(memory, 'get_peak_rss', lambda: 8 * 1024 ** 3)
+
+    report = tiler.process()
+
+    assert report['memory']['degradations'] == 0
+    assert report['memory']['peak_rss'] == 8 * 1024 ** 3
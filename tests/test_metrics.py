@@ -0,0 +1,60 @@
+import json
+from pathlib import PosixPath
+import sys
+
+import pytest
+
+from powerlibs.gdal.utils.gdal2tiles.metrics import Metrics
+
+
+def test_report_adds_up_the_zoom_levels_and_calls_the_hooks():
+    calls = []
+    metrics = Metrics([lambda *args: calls.append(args)])
+
+    metrics.add_time('read', 0.5, 3)
+    metrics.add_time('read', 0.25, 4)
+    metrics.add_time('open_input', 1.0)
+    metrics.count('tiles', 2, 3)
+    metrics.count('tiles', 5, 4)
+    report = metrics.report()
+
+    assert report['stages']['read'] == {'calls': 2, 'seconds': 0.75}
+    assert report['stages']['open_input'] == {'calls': 1, 'seconds': 1.0}
+    assert report['counters'] == {'tiles': 7}
+    assert report['zooms']['3'] == {
+        'stages': {'read': {'calls': 1, 'seconds': 0.5}}, 'counters': {'tiles': 2},
+    }
+    assert ('count', 'tiles', 5, 4) in calls and ('time', 'open_input', 1.0, None) in calls
+
+    metrics.reset()
+    assert metrics.report() == {'stages': {}, 'counters': {}, 'zooms': {}}
+
+
+def test_process_reports_the_tiles_it_wrote(tmp_path):
+    pytest.importorskip('osgeo.gdal')
+    sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+    from synthetic import create_synthetic_raster
+    from powerlibs.gdal.utils.gdal2tiles import Mercator
+
+    source = create_synthetic_raster(tmp_path / 'source.tif', 1200, 900, pixel_size=0.3)
+    output_dir = tmp_path / 'tiles'
+    counted = []
+
+    def hook(kind, name, value, zoom):
+        if (kind, name) == ('count', 'tiles'):
+            counted.append(zoom)
+
+    tiler = Mercator(source, output_dir, metrics_hooks=[hook], report_path=tmp_path / 'report.json')
+    report = tiler.process()
+
+    with open(str(tmp_path / 'report.json')) as f:
+        assert json.load(f) == json.loads(json.dumps(report))
+
+    paths = list(output_dir.rglob('*.png'))
+    assert report['counters']['tiles'] == len(paths) == len(counted)
+    assert report['counters']['bytes_written'] == sum(path.stat().st_size for path in paths)
+    for tz in range(tiler.min_zoom, tiler.max_zoom + 1):
+        written = len(list((output_dir / str(tz)).rglob('*.png')))
+        assert report['zooms'][str(tz)]['counters']['tiles'] == written == counted.count(tz)
+    assert report['stages']['base_tiles']['calls'] == 1
+    assert report['min_zoom'] == tiler.min_zoom and report['max_zoom'] == tiler.max_zoom
@@ -0,0 +1,47 @@
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from powerlibs.gdal.utils.gdal2tiles.mosaic import Mosaic, MosaicSource  # noqa: E402
+
+
+GEOTRANSFORM = (1000.0, 1.0, 0.0, 2000.0, 0.0, -1.0)
+
+
+def create_source(values, data_type=gdal.GDT_Byte):
+    values = numpy.asarray(values)
+    ds = gdal.GetDriverByName('MEM').Create(
+        '', values.shape[1], values.shape[0], 1, data_type
+    )
+    ds.SetGeoTransform(GEOTRANSFORM)
+    ds.GetRasterBand(1).WriteArray(values)
+    return ds
+
+
+def read_alpha(source, ds):
+    bounds = source.bounds[0], source.bounds[3], source.bounds[2], source.bounds[1]
+    _, _, alpha = source.read(ds, bounds, source.xsize, source.ysize, 1)
+    return alpha
+
+
+def test_sources_use_the_nodata_tolerance_and_rule():
+    ds = create_source([[0, 1, 2, 3], [10, 200, 255, 4]])
+
+    exact = MosaicSource('exact', 0, ds, nodata=0)
+    tolerant = MosaicSource('tolerant', 0, ds, nodata=0, tolerance=2)
+
+    assert read_alpha(exact, ds).tolist() == [[0, 255, 255, 255], [255, 255, 255, 255]]
+    assert read_alpha(tolerant, ds).tolist() == [[0, 0, 0, 255], [255, 255, 255, 255]]
+
+
+@pytest.mark.parametrize('data_type', (gdal.GDT_UInt16, gdal.GDT_Float32))
+def test_non_byte_sources_are_rejected(data_type):
+    byte_source = MosaicSource('byte', 0, create_source([[1, 2], [3, 4]]), nodata=0)
+    other_source = MosaicSource(
+        'other', 1, create_source([[1000, 2], [3, 4]], data_type), nodata=0
+    )
+
+    with pytest.raises(Exception, match='not a Byte'):
+        Mosaic([byte_source, other_source], GEOTRANSFORM)
@@ -0,0 +1,75 @@
+from pathlib import PosixPath
+import sys
+
+import numpy
+import pytest
+
+from powerlibs.gdal.utils.gdal2tiles.nodata import NodataMask, normalize_nodata
+
+
+def test_rules_and_tolerance():
+    bands = numpy.array([
+        [[0, 0, 3, 9]],
+        [[0, 5, 0, 9]],
+    ], numpy.uint8)
+
+    assert NodataMask(0, 2).get_valid(bands).tolist() == [[False, True, True, True]]
+    assert NodataMask(0, 2, rule='any').get_valid(bands).tolist() == [[False, False, False, True]]
+    assert NodataMask(0, 2, tolerance=3).get_valid(bands).tolist() == [[False, True, False, True]]
+    assert NodataMask(0, 2, tolerance=5, rule='any').get_valid(bands).tolist() == [[False, False, False, True]]
+    # (a band without nodata never matches)
+    assert NodataMask([None, 0], 2, rule='any').get_valid(bands).tolist() == [[False, True, False, True]]
+    assert NodataMask(None, 2).get_valid(bands).all()
+
+
+def test_nan_nodata():
+    bands = numpy.array([[[numpy.nan, 1.0, -1.0]]])
+
+    assert NodataMask(float('nan'), 1).get_valid(bands).tolist() == [[False, True, True]]
+
+
+def test_normalize_nodata():
+    assert normalize_nodata([None, None]) is None
+    assert normalize_nodata([0, 0, 0]) == 0
+    assert normalize_nodata([0, 1, 2]) == [0, 1, 2]
+    assert normalize_nodata([None, 7, 8]) == 7
+    assert normalize_nodata(5) == 5
+
+
+def test_nodata_tiles_match_the_tiles_with_an_explicit_alpha(tmp_path):
+    gdal = pytest.importorskip('osgeo.gdal')
+    sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+    from synthetic import create_synthetic_raster
+    from powerlibs.gdal.utils.gdal2tiles import Raster
+
+    source = create_synthetic_raster(tmp_path / 'source.tif', 900, 700, pixel_size=0.3, nodata=0)
+
+    # (the same pixels, transparent where every band is nodata)
+    src_ds = gdal.Open(str(source))
+    data = src_ds.ReadAsArray()
+    alpha = numpy.where((data == 0).all(axis=0), 0, 255).astype(numpy.uint8)
+    ds = gdal.GetDriverByName('GTiff').Create(str(tmp_path / 'alpha.tif'), 900, 700, 4, gdal.GDT_Byte)
+    ds.SetGeoTransform(src_ds.GetGeoTransform())
+    ds.SetProjection(src_ds.GetProjection())
+    for i, band in enumerate(list(data) + [alpha], 1):
+        ds.GetRasterBand(i).WriteArray(band)
+    ds.GetRasterBand(4).SetRasterColorInterpretation(gdal.GCI_AlphaBand)
+    ds = None
+
+    Raster(source, tmp_path / 'nodata').process()
+    Raster(tmp_path / 'alpha.tif', tmp_path / 'alpha').process()
+
+    def read_tiles(output_dir):
+        return {
+            str(path.relative_to(output_dir)): gdal.Open(str(path)).ReadAsArray()
+            for path in output_dir.rglob('*.png')
+        }
+
+    tiles = read_tiles(tmp_path / 'nodata')
+    expected = read_tiles(tmp_path / 'alpha')
+    assert expected
+    assert sorted(tiles) == sorted(expected)
+    for name, tile in expected.items():
+        assert numpy.array_equal(tiles[name][3], tile[3]), name
+        visible = tile[3] > 0
+        assert numpy.array_equal(tiles[name][:3, visible], tile[:3, visible]), name
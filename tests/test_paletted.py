@@ -0,0 +1,52 @@
+from pathlib import PosixPath
+
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from powerlibs.gdal.utils.gdal2tiles import Raster  # noqa: E402
+
+
+def read_tiles(output_dir):
+    output_dir = PosixPath(output_dir)
+    return {
+        str(path.relative_to(output_dir)): gdal.Open(str(path)).ReadAsArray()
+        for path in output_dir.rglob('*.png')
+    }
+
+
+def create_paletted_raster(path, width, height):
+    """Byte raster of 16 palette entries, the last one transparent."""
+    ds = gdal.GetDriverByName('GTiff').Create(str(path), width, height, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform((500000.0, 0.3, 0.0, 7500000.0, 0.0, -0.3))
+    y, x = numpy.mgrid[0:height, 0:width]
+    ds.GetRasterBand(1).WriteArray(((x // 7 + y // 5) % 16).astype(numpy.uint8))
+
+    color_table = gdal.ColorTable()
+    for i in range(16):
+        color_table.SetColorEntry(i, (i * 16, 255 - i * 16, (i * 40) % 256, 0 if i == 15 else 255))
+    ds.GetRasterBand(1).SetRasterColorTable(color_table)
+    ds.FlushCache()
+    return path
+
+
+def test_paletted_tiles_match_the_tiles_of_the_expanded_raster(tmp_path):
+    paletted = create_paletted_raster(tmp_path / 'paletted.tif', 900, 700)
+    expanded = str(tmp_path / 'expanded.tif')
+    gdal.Translate(expanded, str(paletted), options=gdal.TranslateOptions(rgbExpand='rgba'))
+
+    Raster(paletted, tmp_path / 'paletted').process()
+    Raster(expanded, tmp_path / 'expanded').process()
+
+    tiles = read_tiles(tmp_path / 'paletted')
+    expected = read_tiles(tmp_path / 'expanded')
+    assert expected
+    assert sorted(tiles) == sorted(expected)
+    for name, tile in expected.items():
+        assert tile.shape == (4, 256, 256), name
+        assert numpy.array_equal(tiles[name][3], tile[3]), name
+        # (the colours under transparent pixels don't matter)
+        visible = tile[3] > 0
+        assert numpy.array_equal(tiles[name][:3, visible], tile[:3, visible]), name
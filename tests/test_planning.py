@@ -0,0 +1,50 @@
+from pathlib import PosixPath
+import sys
+
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator  # noqa: E402
+from powerlibs.gdal.utils.gdal2tiles.planning import LevelPlan, TilingPlan  # noqa: E402
+
+
+@pytest.fixture
+def source(tmp_path):
+    return create_synthetic_raster(tmp_path / 'source.tif', 1500, 1000, pixel_size=0.3, nodata=0)
+
+
+def test_plan_writes_nothing_and_counts_the_tiles_of_process(source, tmp_path):
+    output_dir = tmp_path / 'tiles'
+
+    # (enough samples to render every base tile)
+    plan = Mercator(source, output_dir).plan(samples=1000)
+    assert not output_dir.exists()
+
+    tiler = Mercator(source, output_dir)
+    tiler.process()
+    paths = list(output_dir.rglob('*.png'))
+    assert plan.total_tiles == len(paths)
+    for tz, level in plan.levels.items():
+        assert level.tiles == len(list((output_dir / str(tz)).rglob('*.png'))), tz
+
+    base = plan.levels[tiler.max_zoom]
+    assert base.sampled == base.tiles
+    written = sum(path.stat().st_size for path in (output_dir / str(tiler.max_zoom)).rglob('*.png'))
+    assert 0.8 < base.tiles * base.mean_bytes / written < 1.25
+
+
+def test_projected_time_only_divides_the_parallel_levels():
+    levels = {}
+    for tz in (3, 4):
+        levels[tz] = LevelPlan(tz, 10)
+        levels[tz].add_sample(b'x' * 100, False, 2.0)
+
+    assert TilingPlan(levels, 4, False, 4).projected_seconds == 20 / 4 + 20
+    assert TilingPlan(levels, 4, True, 4).projected_seconds == 20 / 4 + 20 / 4
+    assert TilingPlan(levels, 4, False, 4).projected_bytes == 2000
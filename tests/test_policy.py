@@ -0,0 +1,82 @@
+import math
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+
+pytest.importorskip('osgeo.gdal')
+
+from powerlibs.gdal.utils.gdal2tiles.policy import (  # noqa: E402
+    ResamplingPolicy, ZoomPolicy, get_psnr
+)
+
+
+def test_psnr_of_identical_and_different_pixels():
+    a = numpy.full(100, 100.0)
+
+    assert get_psnr(a, a.copy()) == math.inf
+    # (an error of 1 on every pixel: 20 * log10(255))
+    assert get_psnr(a, a + 1) == pytest.approx(48.13, abs=0.01)
+    assert get_psnr(a, a + 10) < get_psnr(a, a + 1)
+
+
+def test_choose_gives_the_fastest_candidate_within_the_threshold():
+    policy = ResamplingPolicy(threshold=40)
+    candidates = [ZoomPolicy(name) for name in ('lanczos', 'near', 'bilinear', 'average')]
+    results = [
+        [4.0, math.inf],
+        [1.0, 25.0],  # (fastest, but too far from the reference)
+        [2.0, 45.0],
+        [3.0, 60.0],
+    ]
+
+    assert policy.choose(candidates, results).resampling == 'bilinear'
+
+
+def test_choose_falls_back_to_the_reference():
+    policy = ResamplingPolicy(threshold=40)
+    candidates = [ZoomPolicy('lanczos'), ZoomPolicy('near')]
+
+    assert policy.choose(candidates, [[4.0, math.inf], [1.0, 20.0]]).resampling == 'lanczos'
+
+
+def test_tune_restores_the_tiler_policy_on_error(monkeypatch):
+    policy = ResamplingPolicy.auto_tune()
+    tiler = SimpleNamespace(
+        image_output=SimpleNamespace(terrain=None), resampling_method='average',
+        resampling_policy=policy, tile_size=256, min_zoom=0, max_zoom=3,
+    )
+
+    def measure_direct(tiler, output, tz, candidates, sampler):
+        tiler.resampling_policy = ResamplingPolicy(default=candidates[0])
+        raise RuntimeError('read error')
+
+    monkeypatch.setattr(policy, 'measure_direct', measure_direct)
+    with pytest.raises(RuntimeError):
+        policy.tune(tiler)
+
+    assert tiler.resampling_policy is policy
+    assert policy.auto
+
+
+def test_tune_measures_every_candidate_on_the_reference_query(monkeypatch):
+    policy = ResamplingPolicy.auto_tune(candidates=('near', 'bilinear'))
+    tiler = SimpleNamespace(
+        image_output=SimpleNamespace(terrain=None), resampling_method='lanczos',
+        resampling_policy=policy, tile_size=256, min_zoom=3, max_zoom=3,
+    )
+    measured = []
+
+    def measure_direct(tiler, output, tz, candidates, sampler):
+        measured.extend(candidates)
+        return [[1.0, math.inf], [0.5, 50.0], [0.8, 60.0]]
+
+    monkeypatch.setattr(policy, 'measure_direct', measure_direct)
+    policy.tune(tiler)
+
+    assert [candidate.get_querysize(256) for candidate in measured] == [1024] * 3
+    # (the chosen method keeps the querysize it was measured with)
+    assert policy.get(3).resampling == 'near'
+    assert policy.get(3).get_querysize(256) == 1024
+    assert policy.tuning['querysize'] == 1024
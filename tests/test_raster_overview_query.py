@@ -0,0 +1,50 @@
+from pathlib import PosixPath
+import sys
+
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Raster  # noqa: E402
+
+
+def read_tiles(output_dir):
+    output_dir = PosixPath(output_dir)
+    return {
+        str(path.relative_to(output_dir)): gdal.Open(str(path)).ReadAsArray().astype(numpy.float64)
+        for path in output_dir.rglob('*.png')
+    }
+
+
+def test_raster_overview_query_matches_the_composed_pyramid(tmp_path):
+    source = create_synthetic_raster(tmp_path / 'source.tif', 3000, 2000, pixel_size=0.3)
+    # (internal overviews, so the queries read them)
+    ds = gdal.Open(str(source), gdal.GA_Update)
+    ds.BuildOverviews('AVERAGE', [2, 4, 8, 16])
+    ds = None
+
+    composed_dir = tmp_path / 'composed'
+    query_dir = tmp_path / 'query'
+    tiler = Raster(source, composed_dir)
+    tiler.process()
+    Raster(source, query_dir, overview_query=True).process()
+
+    composed = read_tiles(composed_dir)
+    queried = read_tiles(query_dir)
+    assert sorted(queried) == sorted(composed)
+
+    for tz in range(tiler.min_zoom, tiler.max_zoom):
+        names = [name for name in composed if name.startswith(f'{tz}/')]
+        assert names, tz
+        for name in names:
+            a, b = composed[name], queried[name]
+            assert a.shape == b.shape, name
+            # (the alpha of both covers the same pixels)
+            assert numpy.abs(a[-1] - b[-1]).mean() < 8, name
+            assert numpy.abs(a - b).mean() < 8, name
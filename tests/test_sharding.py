@@ -0,0 +1,63 @@
+from pathlib import PosixPath
+import sys
+
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator  # noqa: E402
+from powerlibs.gdal.utils.gdal2tiles.sharding import process_locally  # noqa: E402
+
+
+def read_tiles(output_dir):
+    output_dir = PosixPath(output_dir)
+    return {
+        str(path.relative_to(output_dir)): gdal.Open(str(path)).ReadRaster()
+        for path in output_dir.rglob('*.png')
+    }
+
+
+@pytest.fixture(scope='module')
+def source_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('source') / 'source.tif'
+    return create_synthetic_raster(path, 2048, 2048, pixel_size=0.3)
+
+
+@pytest.fixture(scope='module')
+def single_tiles(source_path, tmp_path_factory):
+    output_dir = tmp_path_factory.mktemp('single')
+    Mercator(source_path, output_dir).process()
+    return read_tiles(output_dir)
+
+
+@pytest.mark.parametrize('shards', (2, 3))
+def test_sharded_pyramid_matches_a_single_run(source_path, single_tiles, tmp_path, shards):
+    process_locally(Mercator, source_path, tmp_path, shards)
+
+    sharded_tiles = read_tiles(tmp_path)
+    assert sorted(sharded_tiles) == sorted(single_tiles)
+    for name, data in single_tiles.items():
+        assert sharded_tiles[name] == data, name
+    assert not list(tmp_path.glob('shard-*'))
+
+
+def test_shard_requires_the_number_of_shards(source_path, tmp_path):
+    with pytest.raises(Exception, match='number of shards'):
+        Mercator(source_path, tmp_path).process(shard=0)
+
+
+def test_a_plain_run_after_a_sharded_one_generates_every_tile(source_path, single_tiles, tmp_path):
+    tiler = Mercator(source_path, tmp_path / 'shard')
+    tiler.process(shard=0, of=2)
+
+    tiler.output_dir = tmp_path / 'full'
+    tiler.process()
+
+    assert tiler.shard is None
+    assert tiler.shard_plan is None
+    assert sorted(read_tiles(tmp_path / 'full')) == sorted(single_tiles)
@@ -0,0 +1,95 @@
+import asyncio
+from pathlib import PosixPath
+import sys
+import uuid
+
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator  # noqa: E402
+
+
+def decode(data):
+    path = f'/vsimem/test-{uuid.uuid4().hex}.png'
+    gdal.FileFromMemBuffer(path, bytes(data))
+    try:
+        return gdal.Open(path).ReadAsArray()
+    finally:
+        gdal.Unlink(path)
+
+
+def read_tiles(output_dir):
+    """(tz, tx, ty) -> pixels of every tile written by process()."""
+    output_dir = PosixPath(output_dir)
+    tiles = {}
+    for path in output_dir.rglob('*.png'):
+        tz, tx = path.relative_to(output_dir).parts[:2]
+        tiles[int(tz), int(tx), int(path.stem)] = gdal.Open(str(path)).ReadAsArray()
+    return tiles
+
+
+def assert_same_tiles(tiles, expected):
+    assert expected
+    assert sorted(tiles) == sorted(expected)
+    for key, pixels in expected.items():
+        assert numpy.array_equal(tiles[key], pixels), key
+
+
+@pytest.fixture
+def source(tmp_path):
+    return create_synthetic_raster(tmp_path / 'source.tif', 1500, 1000, pixel_size=0.3, nodata=0)
+
+
+@pytest.fixture
+def processed(source, tmp_path):
+    Mercator(source, tmp_path / 'processed').process()
+    return read_tiles(tmp_path / 'processed')
+
+
+def test_iter_tiles_yields_the_tiles_of_process(source, processed, tmp_path):
+    output_dir = tmp_path / 'streamed'
+
+    streamed = list(Mercator(source, output_dir).iter_tiles())
+    tiles = {(tz, tx, ty): decode(data) for tz, tx, ty, data in streamed}
+
+    assert len(tiles) == len(streamed)
+    assert_same_tiles(tiles, processed)
+    assert not output_dir.exists()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_process_async_writes_the_tiles_of_process(source, processed, tmp_path):
+    output_dir = tmp_path / 'async'
+    events = []
+
+    run(Mercator(source, output_dir).process_async(concurrency=3, on_progress=events.append))
+
+    assert_same_tiles(read_tiles(output_dir), processed)
+    assert events[-1].done == events[-1].total == len(processed)
+
+
+def test_process_async_sends_every_tile_to_the_sink_once(source, processed, tmp_path):
+    received = []
+
+    async def sink(tz, tx, ty, data):
+        received.append((tz, tx, ty, data))
+
+    run(Mercator(source, tmp_path / 'unused').process_async(concurrency=2, sink=sink))
+
+    tiles = {(tz, tx, ty): decode(data) for tz, tx, ty, data in received}
+    assert len(tiles) == len(received)
+    assert_same_tiles(tiles, processed)
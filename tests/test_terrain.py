@@ -0,0 +1,62 @@
+from pathlib import PosixPath
+import sys
+
+import numpy
+import pytest
+
+from powerlibs.gdal.utils.gdal2tiles.terrain import TerrainRGB
+
+
+def test_encoded_heights_decode_within_the_encoding_step():
+    terrain = TerrainRGB()
+    heights = numpy.random.RandomState(0).uniform(-500, 9000, (64, 64))
+    valid = numpy.ones(heights.shape, bool)
+    valid[:8] = False
+
+    rgb, alpha = terrain.encode(heights, valid)
+    decoded, decoded_valid = terrain.decode(rgb, alpha)
+
+    assert numpy.array_equal(decoded_valid, valid)
+    assert numpy.abs(decoded - heights)[valid].max() <= terrain.interval / 2 + 1e-9
+
+
+def test_reduce_ignores_the_invalid_pixels():
+    heights = numpy.array([
+        [1.0, 3.0, 5.0, 5.0],
+        [9.0, 0.0, 5.0, 5.0],
+    ])
+    valid = numpy.array([
+        [True, True, False, False],
+        [True, False, False, False],
+    ])
+
+    mean, mean_valid = TerrainRGB('mean').reduce(heights, valid, 2)
+    assert mean.tolist() == [[13 / 3, 0]]
+    assert mean_valid.tolist() == [[True, False]]
+
+    highest, _ = TerrainRGB('max').reduce(heights, valid, 2)
+    assert highest.tolist() == [[9, 0]]
+
+
+def test_terrain_tiles_decode_back_to_the_source_heights(tmp_path):
+    gdal = pytest.importorskip('osgeo.gdal')
+    sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+    from synthetic import create_synthetic_raster
+    from powerlibs.gdal.utils.gdal2tiles import Raster
+
+    dsm = create_synthetic_raster(
+        tmp_path / 'dsm.tif', 700, 600, bands=1, pixel_size=0.3, data_type=gdal.GDT_Float32
+    )
+    tiler = Raster(dsm, tmp_path / 'tiles', products=('visual', 'terrain'))
+    tiler.process()
+
+    heights = gdal.Open(str(dsm)).ReadAsArray().astype(numpy.float64)
+    tz = tiler.max_zoom
+    # (the bottom left tile: the raster profile counts rows from the bottom)
+    tile = gdal.Open(str(tmp_path / 'tiles' / 'terrain' / str(tz) / '0' / '0.png')).ReadAsArray()
+    decoded, valid = TerrainRGB().decode(tile[:3], tile[3])
+
+    assert valid.all()
+    expected = heights[600 - 256:, :256]
+    assert numpy.abs(decoded - expected).max() <= 0.05 + 1e-6
+    assert (tmp_path / 'tiles' / 'visual' / str(tz) / '0' / '0.png').exists()
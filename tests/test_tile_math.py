@@ -0,0 +1,74 @@
+import numpy
+import pytest
+
+from powerlibs.gdal.utils.gdal2tiles.global_geodetic import GlobalGeodetic
+from powerlibs.gdal.utils.gdal2tiles.global_mercator import GlobalMercator
+
+
+def random_tiles(count=400, max_zoom=20, seed=0):
+    random = numpy.random.RandomState(seed)
+    zoom = random.randint(0, max_zoom + 1, count)
+    tx = (random.rand(count) * 2.0 ** zoom).astype(numpy.int64)
+    ty = (random.rand(count) * 2.0 ** zoom).astype(numpy.int64)
+    return tx, ty, zoom
+
+
+def scalar_results(function, *arrays):
+    return [function(*values) for values in zip(*(array.tolist() for array in arrays))]
+
+
+def test_quad_keys_of_many_zoom_levels_match_the_scalar_version():
+    mercator = GlobalMercator()
+    tx, ty, zoom = random_tiles()
+
+    keys = mercator.quad_tree_array(tx, ty, zoom)
+
+    assert keys.tolist() == scalar_results(mercator.QuadTree, tx, ty, zoom)
+
+
+@pytest.mark.parametrize('zoom', (0, 1, 12))
+def test_quad_keys_of_one_zoom_level_match_the_scalar_version(zoom):
+    mercator = GlobalMercator()
+    tx = numpy.arange(200) % 2 ** zoom
+    ty = numpy.arange(200) // 3 % 2 ** zoom
+
+    keys = mercator.quad_tree_array(tx, ty, zoom)
+
+    assert keys.tolist() == scalar_results(
+        lambda x, y: mercator.QuadTree(x, y, zoom), tx, ty
+    )
+
+
+def test_mercator_arrays_match_the_scalar_version():
+    mercator = GlobalMercator()
+    tx, ty, zoom = random_tiles()
+
+    bounds = numpy.stack(mercator.tile_bounds_array(tx, ty, zoom), axis=1)
+    assert numpy.allclose(bounds, scalar_results(mercator.TileBounds, tx, ty, zoom))
+
+    lat_lon_bounds = numpy.stack(mercator.tile_lat_lon_bounds_array(tx, ty, zoom), axis=1)
+    assert numpy.allclose(
+        lat_lon_bounds, scalar_results(mercator.TileLatLonBounds, tx, ty, zoom)
+    )
+
+    mx = (bounds[:, 0] + bounds[:, 2]) / 2
+    my = (bounds[:, 1] + bounds[:, 3]) / 2
+    tiles = numpy.stack(mercator.meters_to_tile_array(mx, my, zoom), axis=1)
+    assert tiles.tolist() == [list(tile) for tile in scalar_results(mercator.MetersToTile, mx, my, zoom)]
+
+    google = numpy.stack(mercator.google_tile_array(tx, ty, zoom), axis=1)
+    assert google.tolist() == [list(tile) for tile in scalar_results(mercator.GoogleTile, tx, ty, zoom)]
+
+
+def test_geodetic_arrays_match_the_scalar_version():
+    geodetic = GlobalGeodetic()
+    tx, ty, zoom = random_tiles(max_zoom=18)
+
+    bounds = numpy.stack(geodetic.tile_bounds_array(tx, ty, zoom), axis=1)
+    assert numpy.allclose(bounds, scalar_results(geodetic.TileBounds, tx, ty, zoom))
+
+    # (LatLonToTile takes x first, despite its name)
+    x = (bounds[:, 0] + bounds[:, 2]) / 2
+    y = (bounds[:, 1] + bounds[:, 3]) / 2
+    tiles = numpy.stack(geodetic.lat_lon_to_tile_array(x, y, zoom), axis=1)
+    assert tiles.tolist() == [list(tile) for tile in scalar_results(geodetic.LatLonToTile, x, y, zoom)]
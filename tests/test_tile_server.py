@@ -0,0 +1,99 @@
+import os
+from pathlib import PosixPath
+import sys
+
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator, Raster  # noqa: E402
+from powerlibs.gdal.utils.gdal2tiles.resampler import get_resampler  # noqa: E402
+from powerlibs.gdal.utils.gdal2tiles.tile_server import TileRenderer, get_cache_namespace  # noqa: E402
+from powerlibs.gdal.utils.gdal2tiles.utils import gdal_write  # noqa: E402
+
+
+def create_tile(bands, size=256):
+    """MEM dataset of `bands` ((size, size) arrays)."""
+    ds = gdal.GetDriverByName('MEM').Create('', size, size, len(bands))
+    for i, band in enumerate(bands, 1):
+        ds.GetRasterBand(i).WriteArray(numpy.asarray(band, numpy.uint8))
+    return ds
+
+
+@pytest.fixture
+def sources(tmp_path):
+    first = create_synthetic_raster(tmp_path / 'first.tif', 1024, 1024, pixel_size=0.3)
+    second = create_synthetic_raster(tmp_path / 'second.tif', 1024, 1024, pixel_size=0.3, seed=1)
+    return first, second
+
+
+def key_of(source):
+    tiler = Mercator(source, None)
+    tiler.open_input()
+    tz = tiler.max_zoom
+    tminx, tminy, tmaxx, tmaxy = tiler.tminmax[tz]
+    return tz, tminx, tminy
+
+
+def test_cache_namespace_changes_with_the_source_and_options(sources):
+    first, second = sources
+    namespace = get_cache_namespace(Mercator(first, None))
+
+    assert get_cache_namespace(Mercator(first, None)) == namespace
+    assert get_cache_namespace(Mercator(second, None)) != namespace
+    assert get_cache_namespace(Raster(first, None)) != namespace
+    assert get_cache_namespace(Mercator(first, None, resampling_method='near')) != namespace
+
+    stat = os.stat(str(first))
+    os.utime(str(first), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert get_cache_namespace(Mercator(first, None)) != namespace
+
+
+def test_shared_disk_cache_doesnt_serve_the_tiles_of_another_source(sources, tmp_path):
+    first, second = sources
+    cache_dir = tmp_path / 'cache'
+
+    first_tile = TileRenderer(Mercator(first, None), disk_cache_dir=cache_dir).get_tile(*key_of(first))
+    renderer = TileRenderer(Mercator(second, None), disk_cache_dir=cache_dir)
+    second_tile = renderer.get_tile(*key_of(first))
+
+    assert second_tile != first_tile
+    assert renderer.tiler.metrics.report()['counters'].get('disk_cache_hits') is None
+
+
+def test_antialias_keeps_the_colours_of_tiles_without_alpha():
+    query = create_tile([numpy.full((1024, 1024), value) for value in (10, 120, 250)], 1024)
+    tile = create_tile([numpy.zeros((256, 256))] * 3)
+
+    get_resampler('antialias')(query, tile)
+
+    assert [tile.GetRasterBand(i).ReadAsArray().mean() for i in (1, 2, 3)] == [10, 120, 250]
+
+
+def test_antialias_tiles_are_drawn_over_the_existing_ones(sources, tmp_path):
+    first, _ = sources
+    output_dir = tmp_path / 'tiles'
+    tiler = Mercator(first, output_dir, resampling_method='antialias')
+    tiler.open_input()
+    image_output = tiler.image_output
+    image_output.zoom = tiler.max_zoom
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / 'tile.png'
+    gdal_write(path, create_tile([numpy.full((256, 256), 200)] * 3 + [numpy.full((256, 256), 255)]))
+
+    # (left half transparent, right half opaque black)
+    alpha = numpy.zeros((256, 256))
+    alpha[:, 128:] = 255
+    image_output.write_tile(path, create_tile([numpy.zeros((256, 256))] * 3 + [alpha]))
+
+    written = gdal.Open(str(path)).ReadAsArray()
+    assert (written[:3, :, :128] == 200).all()
+    assert (written[:3, :, 128:] == 0).all()
+    assert (written[3] == 255).all()
@@ -0,0 +1,41 @@
+from pathlib import PosixPath
+import sys
+
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator  # noqa: E402
+
+
+def read_tiles(output_dir):
+    output_dir = PosixPath(output_dir)
+    return {
+        str(path.relative_to(output_dir)): gdal.Open(str(path)).ReadAsArray()
+        for path in output_dir.rglob('*.png')
+    }
+
+
+def test_smallest_size_matches_the_single_size_output(tmp_path):
+    source = create_synthetic_raster(tmp_path / 'source.tif', 1500, 1000, pixel_size=0.3)
+    Mercator(source, tmp_path / 'single').process()
+    Mercator(source, tmp_path / 'multi', tile_sizes=(512, 256)).process()
+
+    single = read_tiles(tmp_path / 'single')
+    small = read_tiles(tmp_path / 'multi' / '256')
+    large = read_tiles(tmp_path / 'multi' / '512')
+
+    assert single
+    assert sorted(small) == sorted(single) == sorted(large)
+    for name, tile in single.items():
+        assert numpy.array_equal(small[name], tile), name
+        assert large[name].shape == (4, 512, 512), name
+        # (the same area, twice the pixels)
+        downsampled = large[name].reshape(4, 256, 2, 256, 2).astype(numpy.float64).mean(axis=(2, 4))
+        assert numpy.abs(downsampled[3] - tile[3]).mean() < 8, name
@@ -0,0 +1,127 @@
+from pathlib import PosixPath
+import sys
+
+import numpy
+import pytest
+
+
+gdal = pytest.importorskip('osgeo.gdal')
+osr = pytest.importorskip('osgeo.osr')
+
+sys.path.insert(0, str(PosixPath(__file__).parent.parent / 'benchmarks'))
+
+from synthetic import create_synthetic_raster  # noqa: E402
+
+from powerlibs.gdal.utils.gdal2tiles import Mercator, Raster  # noqa: E402
+from powerlibs.gdal.utils.gdal2tiles.warp import (  # noqa: E402
+    create_warped_vrt, get_overview_factors, is_rotated, materialize_warped, release_vsimem
+)
+
+
+def read_tiles(output_dir):
+    output_dir = PosixPath(output_dir)
+    return {
+        str(path.relative_to(output_dir)): gdal.Open(str(path)).ReadAsArray()
+        for path in output_dir.rglob('*.png')
+    }
+
+
+def get_wkt(epsg):
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    return srs.ExportToWkt()
+
+
+@pytest.fixture
+def source(tmp_path):
+    return create_synthetic_raster(tmp_path / 'source.tif', 1500, 1000, pixel_size=0.3)
+
+
+def test_warped_vrt_matches_gdalwarp(source):
+    src_ds = gdal.Open(str(source))
+    path, ds = create_warped_vrt(
+        src_ds, src_ds.GetProjection(), get_wkt(3857), add_alpha=True, threads=2
+    )
+    expected = gdal.Warp('', src_ds, options=gdal.WarpOptions(
+        format='MEM', dstSRS='EPSG:3857', dstAlpha=True, resampleAlg='near'
+    ))
+
+    assert path.startswith('/vsimem/')
+    assert ds.RasterCount == 4
+    assert (ds.RasterXSize, ds.RasterYSize) == (expected.RasterXSize, expected.RasterYSize)
+    assert numpy.array_equal(ds.ReadAsArray(), expected.ReadAsArray())
+
+    ds = None
+    release_vsimem(path)
+    assert gdal.VSIStatL(path) is None
+
+
+def test_tiles_dont_depend_on_the_warper_threads(source, tmp_path):
+    single = Mercator(source, tmp_path / 'single', warp_threads=1)
+    single.process()
+    Mercator(source, tmp_path / 'threaded', warp_threads='ALL_CPUS', workers=2).process()
+
+    single_tiles = read_tiles(tmp_path / 'single')
+    threaded_tiles = read_tiles(tmp_path / 'threaded')
+    assert single_tiles
+    assert sorted(single_tiles) == sorted(threaded_tiles)
+    for name, tile in single_tiles.items():
+        assert numpy.array_equal(tile, threaded_tiles[name]), name
+    # (the warped VRT is released after the run)
+    assert single.warped_vrt_path is None
+
+
+def test_materialized_intermediate_matches_the_warped_vrt(source, tmp_path):
+    src_ds = gdal.Open(str(source))
+    path, ds = create_warped_vrt(src_ds, src_ds.GetProjection(), get_wkt(3857), add_alpha=True)
+    try:
+        # (small chunks, so some overviews are written in-pass and some after)
+        materialized = materialize_warped(path, str(tmp_path / 'warped.tif'), workers=2, chunk_size=512)
+        expected = ds.ReadAsArray()
+    finally:
+        ds = None
+        release_vsimem(path)
+
+    assert numpy.array_equal(materialized.ReadAsArray(), expected)
+
+    band = materialized.GetRasterBand(1)
+    factors = get_overview_factors(materialized.RasterXSize, materialized.RasterYSize)
+    assert band.GetOverviewCount() == len(factors) > 1
+    data = expected[0].astype(numpy.float64)
+    for level, factor in enumerate(factors):
+        # (the full blocks only: GDAL averages the partial ones differently)
+        h, w = data.shape[0] // factor, data.shape[1] // factor
+        averaged = data[:h * factor, :w * factor].reshape(h, factor, w, factor).mean(axis=(1, 3))
+        overview = band.GetOverview(level).ReadAsArray()[:h, :w]
+        assert numpy.abs(overview - averaged).mean() < 2, factor
+
+
+def test_tiles_of_the_materialized_intermediate_match_the_warped_ones(source, tmp_path):
+    Mercator(source, tmp_path / 'warped').process()
+    tiler = Mercator(source, tmp_path / 'materialized', materialize_warp=True)
+    tiler.process()
+
+    warped = read_tiles(tmp_path / 'warped')
+    materialized = read_tiles(tmp_path / 'materialized')
+    assert sorted(materialized) == sorted(warped)
+    for name, tile in warped.items():
+        assert numpy.array_equal(tile, materialized[name]), name
+    # (the temporary intermediate is removed after the run)
+    assert tiler.intermediate_path is None
+
+
+def test_rotated_rasters_are_tiled_like_the_prewarped_ones(tmp_path):
+    rotated = create_synthetic_raster(tmp_path / 'rotated.tif', 900, 700, pixel_size=0.3, rotation=15)
+    assert is_rotated(gdal.Open(str(rotated)))
+    prewarped = str(tmp_path / 'prewarped.tif')
+    gdal.Warp(prewarped, str(rotated), options=gdal.WarpOptions(dstAlpha=True, resampleAlg='near'))
+
+    Raster(rotated, tmp_path / 'rotated').process()
+    Raster(prewarped, tmp_path / 'prewarped').process()
+
+    tiles = read_tiles(tmp_path / 'rotated')
+    expected = read_tiles(tmp_path / 'prewarped')
+    assert expected
+    assert sorted(tiles) == sorted(expected)
+    for name, tile in expected.items():
+        assert numpy.array_equal(tiles[name], tile), name
@@ -0,0 +1,92 @@
+import numpy
+import pytest
+
+from powerlibs.gdal.utils.gdal2tiles.windows import (
+    build_window_table, geo_query_array, iter_windows, split_columns, tile_grid
+)
+
+
+def geo_query(geotran, raster_xsize, raster_ysize, ulx, uly, lrx, lry, querysize=0):
+    """The per-tile computation the window tables replaced."""
+    rx = int((ulx - geotran[0]) / geotran[1] + 0.001)
+    ry = int((uly - geotran[3]) / geotran[5] + 0.001)
+    rxsize = int((lrx - ulx) / geotran[1] + 0.5)
+    rysize = int((lry - uly) / geotran[5] + 0.5)
+
+    if not querysize:
+        wxsize, wysize = rxsize, rysize
+    else:
+        wxsize, wysize = querysize, querysize
+
+    wx = 0
+    if rx < 0:
+        rxshift = abs(rx)
+        wx = int(wxsize * (float(rxshift) / rxsize))
+        wxsize = wxsize - wx
+        rxsize = rxsize - int(rxsize * (float(rxshift) / rxsize))
+        rx = 0
+    if rx + rxsize > raster_xsize:
+        wxsize = int(wxsize * (float(raster_xsize - rx) / rxsize))
+        rxsize = raster_xsize - rx
+
+    wy = 0
+    if ry < 0:
+        ryshift = abs(ry)
+        wy = int(wysize * (float(ryshift) / rysize))
+        wysize = wysize - wy
+        rysize = rysize - int(rysize * (float(ryshift) / rysize))
+        ry = 0
+    if ry + rysize > raster_ysize:
+        wysize = int(wysize * (float(raster_ysize - ry) / rysize))
+        rysize = raster_ysize - ry
+
+    return (rx, ry, rxsize, rysize), (wx, wy, wxsize, wysize)
+
+
+def tile_queries(geotransform, tile_extent, x_range, y_range):
+    """Bounds (ulx, uly, lrx, lry arrays) of a grid of square tiles."""
+    tx, ty = tile_grid(x_range, y_range)
+    ulx = geotransform[0] + tx * tile_extent
+    uly = geotransform[3] - ty * tile_extent
+    return tx, ty, ulx, uly, ulx + tile_extent, uly - tile_extent
+
+
+@pytest.mark.parametrize('querysize', (0, 256, 1024))
+def test_window_table_matches_the_per_tile_computation(querysize):
+    # (a 3000x2000 raster, with tiles overlapping all of its borders)
+    geotransform = (1000.0, 0.3, 0.0, 5000.0, 0.0, -0.3)
+    tx, ty, ulx, uly, lrx, lry = tile_queries(
+        geotransform, 0.3 * 311.7, range(-2, 12), range(-2, 9)
+    )
+    ulx, uly = ulx - 0.3 * 50.4, uly + 0.3 * 50.4
+    lrx, lry = lrx - 0.3 * 50.4, lry + 0.3 * 50.4
+
+    rb, wb = geo_query_array(geotransform, 3000, 2000, ulx, uly, lrx, lry, querysize)
+    table = build_window_table(tx, ty, querysize, rb, wb)
+
+    expected = [
+        geo_query(geotransform, 3000, 2000, *bounds, querysize=querysize)
+        for bounds in zip(ulx.tolist(), uly.tolist(), lrx.tolist(), lry.tolist())
+    ]
+    windows = [(xyzzy[1:5], xyzzy[5:]) for _, _, xyzzy in iter_windows(table)]
+    assert windows == expected
+
+
+def test_window_table_keeps_the_tile_loop_order():
+    tx, ty = tile_grid(range(3, 6), range(9, 6, -1))
+    rb = wb = [numpy.zeros(len(tx))] * 4
+    table = build_window_table(tx, ty, 256, rb, wb)
+
+    assert [(x, y) for x, y, _ in iter_windows(table)] == [
+        (x, y) for x in range(3, 6) for y in range(9, 6, -1)
+    ]
+    assert [column['tx'].tolist() for column in split_columns(table)] == [[3] * 3, [4] * 3, [5] * 3]
+    assert split_columns(table[:0]) == []
+
+
+def test_window_table_rejects_tiles_smaller_than_a_pixel():
+    geotransform = (0.0, 10.0, 0.0, 0.0, 0.0, -10.0)
+    ulx, uly = numpy.array([0.0]), numpy.array([0.0])
+
+    with pytest.raises(Exception, match='smaller than a pixel'):
+        geo_query_array(geotransform, 100, 100, ulx, uly, ulx + 1, uly - 1, 256)